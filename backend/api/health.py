@@ -0,0 +1,40 @@
+from flask import Blueprint, current_app, jsonify
+from services.health import check_database, get_stats
+
+health_bp = Blueprint('health', __name__)
+
+@health_bp.route('/live', methods=['GET'])
+def live():
+    """Liveness probe: the worker is serving requests (no database access)"""
+    return jsonify({'status': 'alive'}), 200
+
+@health_bp.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: the database answers a SELECT 1 within HEALTH_READY_TIMEOUT"""
+    error = check_database(current_app._get_current_object(), current_app.config['HEALTH_READY_TIMEOUT'])
+    if error:
+        return jsonify({'status': 'unavailable', 'error': error}), 503
+    return jsonify({'status': 'ready'}), 200
+
+@health_bp.route('', methods=['GET'])
+@health_bp.route('/stats', methods=['GET'])
+def stats():
+    """Row counts from a cache refreshed every HEALTH_STATS_INTERVAL seconds"""
+    try:
+        counts, age = get_stats(current_app._get_current_object())
+    except Exception as e:
+        return jsonify({
+            "status": "unhealthy",
+            "error": str(e)
+        }), 500
+
+    return jsonify({
+        "status": "healthy",
+        **counts,
+        "stats_age_seconds": round(age, 1),
+        "jwt_config": {
+            "token_location": current_app.config['JWT_TOKEN_LOCATION'],
+            "header_name": current_app.config['JWT_HEADER_NAME'],
+            "header_type": current_app.config['JWT_HEADER_TYPE'],
+        }
+    }), 200
@@ -1,17 +1,29 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from flask_jwt_extended import jwt_required
 from models import db, Location
+from services.compression import send_catalog_snapshot
+from services.db_routing import read_replica
+from services.dialect import nearest_locations_sql, use_database_nearby
+from services.geo_index import get_location_index
 
 locations_bp = Blueprint('locations', __name__)
 
 @locations_bp.route('/', methods=['GET'])
+@read_replica
 def get_all_locations():
+    # Serve the precompressed snapshot when one has been built
+    if current_app.config.get('CATALOG_SNAPSHOT_ENABLED', True):
+        snapshot = send_catalog_snapshot(current_app)
+        if snapshot is not None:
+            return snapshot
+    
     locations = Location.query.all()
     return jsonify({
         'locations': [location.to_dict() for location in locations]
     }), 200
 
 @locations_bp.route('/<int:location_id>', methods=['GET'])
+@read_replica
 def get_location(location_id):
     location = Location.query.get(location_id)
     
@@ -21,6 +33,7 @@ def get_location(location_id):
     return jsonify(location.to_dict()), 200
 
 @locations_bp.route('/search', methods=['GET'])
+@read_replica
 def search_locations():
     query = request.args.get('q', '')
     location_type = request.args.get('type', None)
@@ -44,4 +57,57 @@ def search_locations():
     
     return jsonify({
         'locations': [location.to_dict() for location in locations]
-    }), 200
\ No newline at end of file
+    }), 200
+
+@locations_bp.route('/nearby', methods=['GET'])
+@read_replica
+def get_nearby_locations():
+    """Get the k locations closest to a coordinate, sorted by distance"""
+    try:
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+    except (KeyError, ValueError):
+        return jsonify({'message': 'lat and lon are required numbers'}), 400
+    
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return jsonify({'message': 'lat must be within [-90, 90] and lon within [-180, 180]'}), 400
+    
+    try:
+        k = int(request.args.get('k', 20))
+        radius_km = request.args.get('radius_km')
+        radius_km = float(radius_km) if radius_km else None
+    except ValueError:
+        return jsonify({'message': 'k must be an integer and radius_km a number'}), 400
+    
+    max_k = current_app.config.get('NEARBY_MAX_K', 100)
+    if k < 1 or k > max_k:
+        return jsonify({'message': f'k must be between 1 and {max_k}'}), 400
+    if radius_km is not None and radius_km <= 0:
+        return jsonify({'message': 'radius_km must be positive'}), 400
+    
+    # Accept ?type=food&type=culture as well as ?type=food,culture
+    types = [t for value in request.args.getlist('type') for t in value.split(',') if t]
+    
+    # GiST KNN query on PostgreSQL with earthdistance, the in-memory grid index elsewhere
+    if use_database_nearby(current_app, db.session.get_bind()):
+        nearest = nearest_locations_sql(lat, lon, k=k, radius_km=radius_km, types=types)
+    else:
+        nearest = get_location_index(current_app).query(lat, lon, k=k, radius_km=radius_km, types=types)
+    
+    # Load the matching rows in one query and keep the distance order
+    locations = {
+        location.id: location
+        for location in Location.query.filter(Location.id.in_([loc_id for loc_id, _ in nearest])).all()
+    } if nearest else {}
+    
+    results = []
+    for loc_id, distance in nearest:
+        location = locations.get(loc_id)
+        if location:
+            location_data = location.to_dict()
+            location_data['distance_km'] = round(distance, 3)
+            results.append(location_data)
+    
+    return jsonify({
+        'locations': results
+    }), 200
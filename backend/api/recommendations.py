@@ -1,11 +1,15 @@
 from flask import Blueprint, jsonify, request
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from models import Location, Visit, User
+from auth.identity import current_user_id
+from services.db_routing import read_replica
 from services.recommendation_engine import get_recommendations, get_personalized_recommendations
+from services.tracing import span
 
 recommendations_bp = Blueprint('recommendations', __name__)
 
 @recommendations_bp.route('/', methods=['GET'])
+@read_replica
 def get_general_recommendations():
     """Get general recommendations for non-logged in users"""
     recommendations = get_recommendations()
@@ -17,18 +21,25 @@ def get_general_recommendations():
 @jwt_required()
 def get_user_recommendations():
     """Get personalized recommendations for logged in users"""
-    user_id = get_jwt_identity()
+    user_id = current_user_id()
     
     # Check if personalization is turned off
     use_personalization = request.args.get('personalized', 'true').lower() == 'true'
     
+    # 'content' ranks by preferred types, 'geo' also favours places near the user's visits
+    mode = request.args.get('mode', 'content').lower()
+    if mode not in ('content', 'geo'):
+        return jsonify({'message': "mode must be 'content' or 'geo'"}), 400
+    
     if use_personalization:
-        recommendations = get_personalized_recommendations(user_id)
+        recommendations = get_personalized_recommendations(user_id, mode=mode)
     else:
         # Fall back to general recommendations if personalization is off
         recommendations = get_recommendations()
         
-    return jsonify({
-        'recommendations': recommendations,
-        'personalized': use_personalization
-    }), 200
\ No newline at end of file
+    with span('recommendations.serialize'):
+        return jsonify({
+            'recommendations': recommendations,
+            'personalized': use_personalization,
+            'mode': mode if use_personalization else None
+        }), 200
\ No newline at end of file
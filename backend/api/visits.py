@@ -1,84 +1,229 @@
-from flask import Blueprint, jsonify, request
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Visit, Location, User
+import base64
+import json
+import logging
+
+from datetime import datetime, timedelta
+
+from flask import Blueprint, current_app, jsonify, request, stream_with_context
+from flask_jwt_extended import jwt_required
+from sqlalchemy import func, or_
+from models import db, Visit, Location
+from auth.identity import current_user, current_user_id
+from services.compression import choose_encoding, compress_stream
+from services.db_routing import sticky_writes
+from services.idempotency import idempotent
+from services.ratings import apply_rating_change
+from services.tracing import span
+from services.user_stats import get_user_stats, record_rating_change, record_visit_added, record_visit_removed
+from services.visit_export import FORMATS, export_chunks
+from services.visit_journal import get_applier
 
 visits_bp = Blueprint('visits', __name__)
+logger = logging.getLogger(__name__)
 
 @visits_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_user_visits():
-    """Get all visits for the current user with location details"""
+    """
+    Get the current user's visits with location details, newest first
+    
+    Filters: type, country, min_rating, max_rating, from, to (ISO dates; a
+    date-only `to` includes that day). With `limit` or `cursor` the list is
+    paginated: pass the returned next_cursor to get the following page.
+    Upserts still waiting in the write-behind journal are merged into the
+    full, unfiltered list only; pages and filtered lists show them once applied.
+    """
     try:
-        # Get user ID - convert string to int if needed
-        current_user_id = get_jwt_identity()
-        print(f"Identity from token: {current_user_id}, type: {type(current_user_id)}")
-        
-        # Convert to integer if it's a string
-        try:
-            user_id = int(current_user_id)
-        except (ValueError, TypeError):
-            user_id = current_user_id
-            
-        print(f"Fetching visits for user ID: {user_id}")
-            
-        # Verify user exists
-        user = User.query.get(user_id)
+        # Verify user exists (cached identity lookup)
+        user = current_user()
         if not user:
-            print(f"User with ID {user_id} not found")
+            logger.info("User not found", extra={'user_id': current_user_id()})
             return jsonify({'message': 'User not found'}), 404
         
-        print(f"User found: {user.username}")
-        visits = Visit.query.filter_by(user_id=user_id).all()
-        print(f"Found {len(visits)} visits")
+        user_id = user.id
+        try:
+            filters = _visit_filters(request.args)
+            cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+            limit = _int_arg(request.args, 'limit')
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        
+        paginated = limit is not None or cursor is not None
+        if paginated:
+            max_limit = current_app.config.get('VISITS_MAX_PAGE_SIZE', 500)
+            if limit is None:
+                limit = current_app.config.get('VISITS_PAGE_SIZE', 50)
+            if not 1 <= limit <= max_limit:
+                return jsonify({'message': f'limit must be between 1 and {max_limit}'}), 400
+        
+        # One query for the visits and their locations, keyset-paginated on (visit_date, id)
+        # so every page is a range scan of ix_visits_user_id_visit_date
+        with span('visits.query'):
+            query = (db.session.query(Visit, Location)
+                     .outerjoin(Location, Location.id == Visit.location_id)
+                     .filter(Visit.user_id == user_id, *filters))
+            if cursor is not None:
+                cursor_date, cursor_id = cursor
+                # The <= bound lets the index range scan start at the cursor; the OR breaks date ties by id
+                query = query.filter(Visit.visit_date <= cursor_date,
+                                     or_(Visit.visit_date < cursor_date, Visit.id < cursor_id))
+            query = query.order_by(Visit.visit_date.desc(), Visit.id.desc())
+            rows = query.limit(limit + 1).all() if paginated else query.all()
+        
+        next_cursor = None
+        if paginated and len(rows) > limit:
+            rows = rows[:limit]
+            last_visit = rows[-1][0]
+            next_cursor = encode_cursor(last_visit.visit_date, last_visit.id)
+        logger.debug("Fetched visits", extra={'user_id': user_id, 'visit_count': len(rows)})
         
         # Include location details for each visit
         result = []
-        for visit in visits:
+        for visit, location in rows:
             visit_data = visit.to_dict()
-            location = Location.query.get(visit.location_id)
             if location:
                 visit_data['location'] = location.to_dict()
-                print(f"Added location data for visit to {location.name}")
             else:
                 visit_data['location'] = {'id': visit.location_id, 'name': 'Unknown Location'}
-                print(f"Warning: Location with ID {visit.location_id} not found")
+                logger.warning("Visit references a missing location",
+                               extra={'visit_id': visit.id, 'location_id': visit.location_id})
             result.append(visit_data)
         
-        print(f"Returning {len(result)} visit records with location data")
-        return jsonify({
-            'visits': result
-        }), 200
+        applier = get_applier(current_app)
+        if applier is not None and not paginated and not filters:
+            # Read your own writes: upserts still waiting in the write-behind journal
+            # (never on a page, where they'd break its size and the next cursor)
+            result = _with_pending_visits(result, applier.journal.pending(user_id=user_id))
+        
+        with span('visits.serialize'):
+            return jsonify({
+                'visits': result,
+                'next_cursor': next_cursor
+            }), 200
+    except Exception as e:
+        logger.exception("Error in get_user_visits")
+        return jsonify({'message': f'Error processing request: {str(e)}'}), 500
+
+@visits_bp.route('/stats', methods=['GET'])
+@jwt_required()
+def get_visit_stats():
+    """
+    Travel statistics of the current user: visit count, countries, visits by
+    type and rating, average rating and distance travelled
+
+    Read from per-user aggregates kept up to date on every visit write, so
+    the cost doesn't grow with the number of visits. Upserts still waiting in
+    the write-behind journal are counted once applied.
+    """
+    try:
+        user_id = current_user_id()
+        with span('visits.stats'):
+            stats = get_user_stats(user_id)
+        return jsonify(stats), 200
     except Exception as e:
-        print(f"Error in get_user_visits: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in get_visit_stats")
         return jsonify({'message': f'Error processing request: {str(e)}'}), 500
 
+@visits_bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_visits():
+    """
+    Download the current user's visit history as CSV or GeoJSON (?format=)
+
+    The body is streamed batch by batch from a single joined query and
+    compressed on the fly when the client accepts gzip or br.
+    """
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in FORMATS:
+        return jsonify({'message': f"format must be one of: {', '.join(FORMATS)}"}), 400
+    mimetype, extension = FORMATS[export_format]
+    
+    user_id = current_user_id()
+    config = current_app.config
+    chunks = export_chunks(user_id, export_format, config.get('VISITS_EXPORT_BATCH_SIZE', 1000))
+    encoding = choose_encoding(request.headers.get('Accept-Encoding')) if config.get('COMPRESSION_ENABLED', True) else None
+    if encoding:
+        chunks = compress_stream(chunks, encoding, gzip_level=config.get('COMPRESSION_GZIP_LEVEL', 6),
+                                 brotli_quality=config.get('COMPRESSION_BROTLI_QUALITY', 4))
+    logger.info("Visit export started", extra={'user_id': user_id, 'format': export_format, 'encoding': encoding})
+    
+    response = current_app.response_class(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="chillquest-visits.{extension}"'
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+def encode_cursor(visit_date, visit_id):
+    """Opaque cursor pointing just past a visit in (visit_date, id) descending order"""
+    payload = json.dumps([visit_date.isoformat(), visit_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        visit_date, visit_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(visit_date), int(visit_id)
+    except (ValueError, TypeError, UnicodeEncodeError):
+        raise ValueError('Invalid cursor')
+
+def _int_arg(args, name):
+    if not args.get(name):
+        return None
+    try:
+        return int(args[name])
+    except ValueError:
+        raise ValueError(f'{name} must be an integer')
+
+def _parse_date(value, name, end_of_day=False):
+    """datetime from an ISO date or datetime; end_of_day moves a bare date to the next midnight"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an ISO date, e.g. 2024-05-31')
+    if end_of_day and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+def _visit_filters(args):
+    """SQL filters for the visit list query string; raises ValueError on bad input"""
+    filters = []
+    if args.get('type'):
+        filters.append(Location.type == args['type'])
+    if args.get('country'):
+        filters.append(func.lower(Location.country) == args['country'].lower())
+    min_rating = _int_arg(args, 'min_rating')
+    if min_rating is not None:
+        filters.append(Visit.rating >= min_rating)
+    max_rating = _int_arg(args, 'max_rating')
+    if max_rating is not None:
+        filters.append(Visit.rating <= max_rating)
+    if args.get('from'):
+        filters.append(Visit.visit_date >= _parse_date(args['from'], 'from'))
+    if args.get('to'):
+        to = args['to']
+        date_to = _parse_date(to, 'to', end_of_day=True)
+        filters.append(Visit.visit_date < date_to if len(to) == 10 else Visit.visit_date <= date_to)
+    return filters
+
 @visits_bp.route('/', methods=['POST'])
 @jwt_required()
+@idempotent
+@sticky_writes
 def add_visit():
     """Add or update a visit for the current user"""
     try:
-        # Get user ID from token and convert to int if needed
-        current_user_id = get_jwt_identity()
-        try:
-            user_id = int(current_user_id)
-        except (ValueError, TypeError):
-            user_id = current_user_id
-            
-        print(f"Adding visit for user ID: {user_id}")
+        # Get user ID from token
+        user_id = current_user_id()
         
         # Get JSON data
         data = request.get_json(force=True)
-        print(f"Visit data received: {data}")
             
         if not data:
-            print("No JSON data provided")
             return jsonify({'message': 'No JSON data provided'}), 400
             
         # Validate location_id
         if 'location_id' not in data:
-            print("Missing location_id in request")
             return jsonify({'message': 'location_id is required'}), 400
         
         # Ensure location_id is an integer
@@ -86,33 +231,34 @@ def add_visit():
             location_id = int(data['location_id'])
             data['location_id'] = location_id
         except (ValueError, TypeError):
-            print(f"Invalid location_id format: {data.get('location_id')}")
             return jsonify({'message': 'location_id must be an integer'}), 400
         
         # Check for rating (required for new visits)
+        applier = get_applier(current_app)
         is_new_visit = not Visit.query.filter_by(user_id=user_id, location_id=location_id).first()
+        if is_new_visit and applier is not None:
+            is_new_visit = not applier.journal.pending(user_id=user_id, location_id=location_id)
         if is_new_visit and ('rating' not in data or data['rating'] is None):
-            print("Missing required rating for new visit")
             return jsonify({'message': 'Rating is required when adding a new visit'}), 400
             
-        if is_new_visit and data.get('rating') is not None:
+        # Parsed once: the visit row, the location aggregates and the user's stats all take this int
+        rating = None
+        if data.get('rating') is not None:
             try:
                 rating = int(data['rating'])
-                if rating < 1 or rating > 5:
-                    print(f"Invalid rating value: {rating}")
-                    return jsonify({'message': 'Rating must be between 1 and 5'}), 400
             except (ValueError, TypeError):
-                print(f"Invalid rating format: {data['rating']}")
                 return jsonify({'message': 'Rating must be a number between 1 and 5'}), 400
-        
-        print(f"Processing visit - User: {user_id}, Location: {data['location_id']}")
+            if rating < 1 or rating > 5:
+                return jsonify({'message': 'Rating must be between 1 and 5'}), 400
         
         # Check if location exists
         location = Location.query.get(data['location_id'])
         if not location:
-            print(f"Location {data['location_id']} not found")
             return jsonify({'message': 'Location not found'}), 404
         
+        if applier is not None:
+            return _queue_visit(applier, user_id, location, data, rating, is_new_visit)
+        
         # Check if visit already exists
         existing_visit = Visit.query.filter_by(
             user_id=user_id, 
@@ -121,21 +267,18 @@ def add_visit():
         
         if existing_visit:
             # Update existing visit
-            print(f"Updating existing visit ID: {existing_visit.id}")
-            if 'rating' in data and data['rating'] is not None:
-                try:
-                    rating = int(data['rating'])
-                    if 1 <= rating <= 5:
-                        existing_visit.rating = rating
-                    else:
-                        print(f"Invalid rating value for update: {rating}")
-                except (ValueError, TypeError):
-                    print(f"Invalid rating format for update: {data['rating']}")
+            old_rating = existing_visit.rating
+            if rating is not None:
+                existing_visit.rating = rating
             
             if 'notes' in data:
                 existing_visit.notes = data['notes']
             
-            db.session.commit()
+            with span('visits.commit'):
+                apply_rating_change(location.id, old_rating, existing_visit.rating)
+                record_rating_change(user_id, old_rating, existing_visit.rating)
+                db.session.commit()
+            logger.info("Visit updated", extra={'user_id': user_id, 'visit_id': existing_visit.id})
             
             # Get the location data to include in response
             location_data = location.to_dict()
@@ -148,19 +291,23 @@ def add_visit():
             }), 200
         
         # Create new visit - ensure rating is provided
-        if 'rating' not in data or data['rating'] is None:
+        if rating is None:
             return jsonify({'message': 'Rating is required for new visits'}), 400
             
         visit = Visit(
             user_id=user_id,
             location_id=data['location_id'],
-            rating=data['rating'],
+            rating=rating,
             notes=data.get('notes', '')
         )
         
-        db.session.add(visit)
-        db.session.commit()
-        print(f"Created new visit ID: {visit.id}")
+        with span('visits.commit'):
+            db.session.add(visit)
+            apply_rating_change(location.id, None, rating)
+            db.session.flush()
+            record_visit_added(visit, location)
+            db.session.commit()
+        logger.info("Visit added", extra={'user_id': user_id, 'visit_id': visit.id})
         
         # Get the location data to include in response
         location_data = location.to_dict()
@@ -172,36 +319,95 @@ def add_visit():
             'visit': visit_data
         }), 201
     except Exception as e:
-        print(f"Error in add_visit: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in add_visit")
         db.session.rollback()
         return jsonify({'message': f'Error processing request: {str(e)}'}), 500
 
+def _queue_visit(applier, user_id, location, data, rating, is_new_visit):
+    """Write-behind: journal the validated upsert and acknowledge it before it reaches the database"""
+    has_notes = is_new_visit or 'notes' in data
+    notes = data.get('notes', '') if has_notes else None
+    
+    # @idempotent replays retries while it remembers the key; the journal dedupes beyond that
+    idempotency_key = request.headers.get('Idempotency-Key')
+    key, journaled = applier.journal.append(
+        user_id, location.id, rating, notes, has_notes,
+        key=f'{user_id}:{idempotency_key}' if idempotency_key else None,
+    )
+    applier.notify()
+    logger.info("Visit queued", extra={'user_id': user_id, 'location_id': location.id, 'duplicate': not journaled})
+    
+    visit_data = {
+        'id': None,
+        'user_id': user_id,
+        'location_id': location.id,
+        'visit_date': datetime.utcnow().isoformat(),
+        'rating': rating,
+        'notes': notes,
+        'pending': True,
+        'location': location.to_dict(),
+    }
+    return jsonify({
+        'message': 'Visit queued',
+        'journal_key': key,
+        'visit': visit_data
+    }), 202
+
+def _with_pending_visits(result, pending):
+    """Apply a user's journaled upserts on top of their stored visits, in journal order"""
+    by_location = {visit_data['location_id']: visit_data for visit_data in result}
+    for entry in pending:
+        visit_data = by_location.get(entry['location_id'])
+        if visit_data is None:
+            if entry['rating'] is None:
+                continue
+            location = Location.query.get(entry['location_id'])
+            visit_data = {
+                'id': None,
+                'user_id': entry['user_id'],
+                'location_id': entry['location_id'],
+                'visit_date': datetime.utcfromtimestamp(entry['created_at']).isoformat(),
+                'rating': entry['rating'],
+                'notes': '',
+                'location': location.to_dict() if location else {'id': entry['location_id'], 'name': 'Unknown Location'},
+            }
+            by_location[entry['location_id']] = visit_data
+            result.append(visit_data)
+        if entry['rating'] is not None:
+            visit_data['rating'] = entry['rating']
+        if entry['has_notes']:
+            visit_data['notes'] = entry['notes']
+        visit_data['pending'] = True
+    return result
+
 @visits_bp.route('/<int:visit_id>', methods=['DELETE'])
 @jwt_required()
+@sticky_writes
 def delete_visit(visit_id):
     """Delete a specific visit belonging to the current user"""
     try:
-        # Get user ID from token and convert to int if needed
-        current_user_id = get_jwt_identity()
-        try:
-            user_id = int(current_user_id)
-        except (ValueError, TypeError):
-            user_id = current_user_id
-            
-        print(f"Delete visit - User: {user_id}, Visit ID: {visit_id}")
+        # Get user ID from token
+        user_id = current_user_id()
+        
         visit = Visit.query.filter_by(id=visit_id, user_id=user_id).first()
         
         if not visit:
             return jsonify({'message': 'Visit not found or unauthorized'}), 404
         
-        db.session.delete(visit)
-        db.session.commit()
-        print(f"Deleted visit ID: {visit_id}")
+        applier = get_applier(current_app)
+        if applier is not None:
+            # A queued upsert applied after the delete would bring the visit back
+            applier.apply_pending(user_id, visit.location_id)
+        
+        with span('visits.commit'):
+            apply_rating_change(visit.location_id, visit.rating, None)
+            record_visit_removed(visit, db.session.get(Location, visit.location_id))
+            db.session.delete(visit)
+            db.session.commit()
+        logger.info("Visit deleted", extra={'user_id': user_id, 'visit_id': visit_id})
         
         return jsonify({'message': 'Visit deleted'}), 200
     except Exception as e:
-        print(f"Error in delete_visit: {str(e)}")
+        logger.exception("Error in delete_visit")
         db.session.rollback()
         return jsonify({'message': f'Error processing request: {str(e)}'}), 500
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+Resolve the JWT identity to a user without a database round trip on every request
+
+Authenticated endpoints only need to know the user exists (and sometimes their
+name/email), so a minimal record is kept in a small per-process TTL cache.
+It is filled at login/registration and dropped whenever a User row is
+committed as changed or deleted; the TTL bounds staleness across workers.
+"""
+import time
+from collections import namedtuple
+
+from flask import current_app, has_app_context
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event
+
+from services.lru import BoundedLRU
+from services.metrics import register_collector
+from services.tracing import span
+
+CachedUser = namedtuple('CachedUser', ['id', 'username', 'email', 'created_at'])
+
+
+class IdentityCache:
+    """Bounded LRU of user id -> CachedUser with a per-entry TTL"""
+
+    def __init__(self, max_size=10000):
+        self.entries = BoundedLRU(max_size)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id, ttl):
+        with self.entries.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and time.monotonic() - entry[1] < ttl:
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self.entries.pop(user_id)
+            self.misses += 1
+            return None
+
+    def put(self, user):
+        self.entries.put(user.id, (user, time.monotonic()))
+
+    def invalidate(self, user_id):
+        self.entries.pop(user_id)
+
+    def clear(self):
+        self.entries.clear()
+
+
+cache = IdentityCache()
+_watch_installed = False
+
+
+def identity_cache_metrics():
+    return [
+        ('identity_cache_hits_total', 'counter', {}, cache.hits),
+        ('identity_cache_misses_total', 'counter', {}, cache.misses),
+        ('identity_cache_entries', 'gauge', {}, len(cache.entries)),
+    ]
+
+
+register_collector(identity_cache_metrics, {
+    'identity_cache_hits_total': 'JWT identities resolved from the per-worker cache',
+    'identity_cache_misses_total': 'JWT identities that needed a database lookup',
+    'identity_cache_entries': 'Users currently held in the identity cache',
+})
+
+
+def _ttl():
+    return current_app.config.get('IDENTITY_CACHE_TTL', 60) if has_app_context() else 0
+
+
+def remember_user(user):
+    """Cache a User row (e.g. right after login) and return its CachedUser"""
+    record = CachedUser(user.id, user.username, user.email, user.created_at)
+    if _ttl() > 0:
+        cache.put(record)
+    return record
+
+
+def load_user(user_id):
+    """CachedUser for user_id, from the cache when fresh, otherwise from the database"""
+    from models import User
+
+    try:
+        user_id = int(user_id)
+    except (ValueError, TypeError):
+        return None
+
+    ttl = _ttl()
+    if ttl > 0:
+        record = cache.get(user_id, ttl)
+        if record is not None:
+            return record
+
+    with span('auth.load_user', **{'enduser.id': user_id}):
+        user = User.query.get(user_id)
+    return remember_user(user) if user else None
+
+
+def current_user_id():
+    """The JWT identity as an int (tokens carry it as a string), or None if malformed"""
+    try:
+        return int(get_jwt_identity())
+    except (ValueError, TypeError):
+        return None
+
+
+def current_user():
+    """CachedUser for the request's JWT identity, or None if that user no longer exists"""
+    user_id = current_user_id()
+    return load_user(user_id) if user_id is not None else None
+
+
+def watch_user_changes(session):
+    """Drop cached identities for users changed or deleted in a committed transaction"""
+    global _watch_installed
+    from models import User
+
+    if _watch_installed:
+        return
+    _watch_installed = True
+
+    @event.listens_for(session, 'before_flush')
+    def track_user_changes(session, flush_context, instances):
+        changed = session.info.setdefault('changed_user_ids', set())
+        for obj in list(session.dirty) + list(session.deleted):
+            if isinstance(obj, User) and obj.id is not None:
+                changed.add(obj.id)
+
+    @event.listens_for(session, 'after_commit')
+    def invalidate_changed_users(session):
+        for user_id in session.info.pop('changed_user_ids', ()):
+            cache.invalidate(user_id)
+
+    @event.listens_for(session, 'after_rollback')
+    def discard_changes(session):
+        session.info.pop('changed_user_ids', None)
@@ -1,27 +1,39 @@
+import logging
+
 from flask import request, jsonify
-from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
+from flask_jwt_extended import create_access_token, jwt_required
 from models import db, User
+from .identity import current_user, remember_user
+from services.db_routing import sticky_writes
+from services.password_hasher import PasswordHasherBusy
+from services.rate_limit import json_field, rate_limit
 from . import auth_bp
 
+logger = logging.getLogger(__name__)
+
+@auth_bp.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(error):
+    """Too many logins/registrations are hashing at once, ask the client to retry"""
+    response = jsonify({'message': 'Server is busy, please try again shortly'})
+    response.headers['Retry-After'] = str(error.retry_after)
+    logger.warning("Password hashing queue full, rejecting request")
+    return response, 503
+
 @auth_bp.route('/register', methods=['POST'])
+@rate_limit('ip', 'AUTH_RATE_LIMIT_REGISTER_IP')
+@sticky_writes
 def register():
     data = request.get_json()
     
-    # Debug for registration
-    print(f"Registration attempt with username: {data.get('username', 'unknown')}")
-    
     # Check if required fields are present
     if not all(k in data for k in ('username', 'email', 'password')):
-        print("Missing required fields for registration")
         return jsonify({'message': 'Missing required fields'}), 400
     
     # Check if user already exists
     if User.query.filter_by(username=data['username']).first():
-        print(f"Username already exists: {data['username']}")
         return jsonify({'message': 'Username already exists'}), 400
     
     if User.query.filter_by(email=data['email']).first():
-        print(f"Email already exists: {data['email']}")
         return jsonify({'message': 'Email already exists'}), 400
     
     # Create new user
@@ -33,7 +45,8 @@ def register():
     
     db.session.add(user)
     db.session.commit()
-    print(f"User registered successfully: {user.username}, ID: {user.id}")
+    logger.info("User registered", extra={'user_id': user.id})
+    remember_user(user)
     
     # Create access token - IMPORTANT: Convert user.id to string
     access_token = create_access_token(identity=str(user.id))
@@ -49,36 +62,34 @@ def register():
     }), 201
 
 @auth_bp.route('/login', methods=['POST'])
+@rate_limit('ip', 'AUTH_RATE_LIMIT_IP')
+@rate_limit('account', 'AUTH_RATE_LIMIT_ACCOUNT', key=json_field('username'))
 def login():
     data = request.get_json()
     
-    print(f"Login request received: {data}")
-    
     # Check if required fields are present
     if not all(k in data for k in ('username', 'password')):
-        print("Missing required fields in login data")
         return jsonify({'message': 'Missing required fields'}), 400
     
     # Find user
     user = User.query.filter_by(username=data['username']).first()
     
-    # Debug user info
+    valid_password = False
     if user:
-        print(f"User found: {user.username}, ID: {user.id}")
+        # Hash once - every check costs a full password hash
         valid_password = user.check_password(data['password'])
-        print(f"Password valid: {valid_password}")
-    else:
-        print(f"User not found: {data['username']}")
-        all_users = User.query.all()
-        print(f"Available users: {[u.username for u in all_users]}")
     
     # Check if user exists and password is correct
-    if not user or not user.check_password(data['password']):
+    if not valid_password:
+        logger.info("Login failed", extra={'user_found': user is not None})
         return jsonify({'message': 'Invalid credentials'}), 401
     
+    # Authenticated requests that follow will find the user in the identity cache
+    remember_user(user)
+    
     # Create access token - IMPORTANT: Convert user.id to string
     access_token = create_access_token(identity=str(user.id))
-    print(f"Login successful, token created for user: {user.username}")
+    logger.info("Login succeeded", extra={'user_id': user.id})
     
     response = {
         'message': 'Login successful',
@@ -89,21 +100,13 @@ def login():
         },
         'access_token': access_token
     }
-    print(f"Sending response: {response}")
-    
     return jsonify(response), 200
 
 @auth_bp.route('/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
-    # Get identity as string and convert to int if needed
-    current_user_id = get_jwt_identity()
-    try:
-        user_id = int(current_user_id)
-    except (ValueError, TypeError):
-        user_id = current_user_id
-        
-    user = User.query.get(user_id)
+    # Cached identity lookup instead of a User query per request
+    user = current_user()
     
     if not user:
         return jsonify({'message': 'User not found'}), 404
@@ -0,0 +1,85 @@
+"""
+CPU cost vs bandwidth saved for API response compression
+
+    python -m benchmarks.bench_compression
+
+Part 1 compresses the /api/locations/ payload (and larger synthetic catalogs made
+by repeating it) at several gzip levels / brotli qualities.
+Part 2 times the full request path: uncompressed, compressed per request by the
+middleware, and served from the precompressed snapshot.
+"""
+import json
+
+from services.compression import brotli, compress, write_catalog_snapshot
+from benchmarks.common import make_app, time_call, format_summary
+
+# Link speed used to translate bytes saved into transfer time saved
+LINK_MBIT = 10
+
+
+def catalog_payload(app):
+    client = app.test_client()
+    return client.get('/api/locations/').get_data()
+
+
+def bench_codecs(payload, label):
+    codecs = [('gzip', level) for level in (1, 6, 9)]
+    if brotli:
+        codecs += [('br', quality) for quality in (1, 4, 11)]
+
+    print(f"\nPayload {len(payload) / 1024:.1f} KiB ({label})")
+    print(f"{'codec':<10}{'size KiB':>10}{'ratio':>8}{'cpu ms':>10}{'MB/s':>9}{'saved ms @' + str(LINK_MBIT) + 'Mbit':>20}")
+    for encoding, level in codecs:
+        kwargs = {'gzip_level': level} if encoding == 'gzip' else {'brotli_quality': level}
+        compressed = compress(payload, encoding, **kwargs)
+        repeat = 20 if len(payload) > 1_000_000 or level >= 9 else 100
+        timings = time_call(lambda: compress(payload, encoding, **kwargs), repeat=repeat)
+        cpu_ms = sum(timings) / len(timings)
+        saved_bytes = len(payload) - len(compressed)
+        saved_ms = saved_bytes * 8 / (LINK_MBIT * 1_000_000) * 1000
+        print(f"{encoding + '-' + str(level):<10}{len(compressed) / 1024:>10.1f}"
+              f"{len(payload) / len(compressed):>8.2f}{cpu_ms:>10.3f}"
+              f"{len(payload) / 1e6 / (cpu_ms / 1000):>9.1f}{saved_ms:>20.1f}")
+
+
+def bench_request_path():
+    print("\nGET /api/locations/ end to end (Flask test client)")
+    encodings = 'br, gzip' if brotli else 'gzip'
+
+    plain_app = make_app(COMPRESSION_ENABLED=False, CATALOG_SNAPSHOT_ENABLED=False)
+    dynamic_app = make_app(CATALOG_SNAPSHOT_ENABLED=False)
+    snapshot_app = make_app()
+    with snapshot_app.app_context():
+        write_catalog_snapshot(snapshot_app)
+
+    for label, app, headers in (
+        ('uncompressed', plain_app, {}),
+        (f'middleware ({encodings})', dynamic_app, {'Accept-Encoding': encodings}),
+        (f'precompressed snapshot ({encodings})', snapshot_app, {'Accept-Encoding': encodings}),
+    ):
+        client = app.test_client()
+        response = client.get('/api/locations/', headers=headers)
+        body = len(response.get_data())
+        response.close()
+
+        def request():
+            client.get('/api/locations/', headers=headers).close()
+
+        timings = time_call(request, repeat=300)
+        print(format_summary(f"{label} [{body} B]", timings))
+
+
+def main():
+    app = make_app(COMPRESSION_ENABLED=False, CATALOG_SNAPSHOT_ENABLED=False)
+    payload = catalog_payload(app)
+    locations = json.loads(payload)['locations']
+
+    for factor in (1, 10, 100):
+        synthetic = json.dumps({'locations': locations * factor}).encode('utf-8')
+        bench_codecs(synthetic, f"catalog x{factor}")
+
+    bench_request_path()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""
+Cost of MMR diversity re-ranking over large candidate pools
+
+    python -m benchmarks.bench_diversity
+"""
+import numpy as np
+
+from services.diversity import mmr_order
+from benchmarks.common import LOCATION_TYPES, format_summary, time_call
+
+
+def main():
+    rng = np.random.default_rng(7)
+    for pool in (100, 1000, 5000):
+        scores = rng.uniform(3, 5, pool)
+        types = rng.choice(LOCATION_TYPES, pool)
+        prices = rng.integers(1, 6, pool)
+        lats = np.degrees(np.arcsin(rng.uniform(-0.8, 0.9, pool)))
+        lons = rng.uniform(-180, 180, pool)
+        for limit in (10, 50):
+            timings = time_call(
+                lambda: mmr_order(scores, types, prices, lats, lons, limit, diversity=0.3), repeat=200
+            )
+            print(format_summary(f"pool {pool} -> top {limit}", timings))
+
+    # How much the type mix changes for a nightlife-heavy pool
+    pool = 100
+    types = np.array(['nightlife'] * 70 + list(rng.choice(LOCATION_TYPES, 30)))
+    scores = np.concatenate((rng.uniform(4.5, 5, 70), rng.uniform(3.5, 4.5, 30)))
+    lats = rng.uniform(40, 55, pool)
+    lons = rng.uniform(-5, 20, pool)
+    prices = rng.integers(1, 6, pool)
+    for diversity in (0.0, 0.3, 0.5):
+        order = mmr_order(scores, types, prices, lats, lons, 10, diversity=diversity)
+        print(f"diversity {diversity}: {[str(types[i]) for i in order]}")
+
+
+if __name__ == '__main__':
+    main()
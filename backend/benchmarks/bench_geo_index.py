@@ -0,0 +1,97 @@
+"""
+k-nearest-neighbour queries: grid index vs brute-force haversine in NumPy
+
+    python -m benchmarks.bench_geo_index [--points 1000000] [--queries 1000]
+
+Points are a mix of city-like clusters and a uniform background so cell
+occupancy is as uneven as a real catalog. Every index result is checked
+against the brute-force answer.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from services.geo_index import GeoIndex, brute_force_nearest
+from benchmarks.common import format_summary
+
+TYPES = np.array(['nature', 'recreational', 'nightlife', 'culture', 'food'])
+
+
+def make_points(n, rng):
+    n_clustered = n * 7 // 10
+    centres_lat = np.degrees(np.arcsin(rng.uniform(-0.8, 0.9, 2000)))
+    centres_lon = rng.uniform(-180, 180, 2000)
+    which = rng.integers(0, 2000, n_clustered)
+    lats = np.concatenate((
+        np.clip(centres_lat[which] + rng.normal(0, 0.3, n_clustered), -90, 90),
+        np.degrees(np.arcsin(rng.uniform(-1, 1, n - n_clustered))),
+    ))
+    lons = np.concatenate((
+        (centres_lon[which] + rng.normal(0, 0.3, n_clustered) + 180) % 360 - 180,
+        rng.uniform(-180, 180, n - n_clustered),
+    ))
+    return np.arange(n), lats, lons, TYPES[rng.integers(0, len(TYPES), n)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--points', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--k', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    ids, lats, lons, types = make_points(args.points, rng)
+
+    start = time.perf_counter()
+    index = GeoIndex(ids, lats, lons, types)
+    print(f"Built index over {args.points} points in {(time.perf_counter() - start) * 1000:.0f} ms "
+          f"(cell {index.cell_deg:.3f} deg)")
+
+    # Query near real points most of the time, like users standing in a city
+    picks = rng.integers(0, args.points, args.queries)
+    q_lats = np.clip(lats[picks] + rng.normal(0, 0.05, args.queries), -90, 90)
+    q_lons = lons[picks] + rng.normal(0, 0.05, args.queries)
+
+    scenarios = [
+        ('index k=%d' % args.k, {}),
+        ('index k=%d radius 50km' % args.k, {'radius_km': 50}),
+        ('index k=%d type=nightlife' % args.k, {'types': ['nightlife']}),
+    ]
+    for label, kwargs in scenarios:
+        timings = []
+        for lat, lon in zip(q_lats, q_lons):
+            start = time.perf_counter()
+            index.query(lat, lon, k=args.k, **kwargs)
+            timings.append((time.perf_counter() - start) * 1000)
+        print(format_summary(label, timings))
+
+    # Points in Europe only, queried from empty parts of the globe (ring scan falls back to brute force)
+    europe = (lats > 36) & (lats < 70) & (lons > -10) & (lons < 40)
+    regional = GeoIndex(ids[europe], lats[europe], lons[europe], types[europe])
+    far = [(0.0, -150.0), (-60.0, -100.0), (89.9, 0.0), (-89.9, 179.9), (0.0, 179.99)]
+    timings = []
+    for lat, lon in far * 20:
+        start = time.perf_counter()
+        regional.query(lat, lon, k=args.k)
+        timings.append((time.perf_counter() - start) * 1000)
+    print(format_summary(f'index k={args.k}, {int(europe.sum())} points in Europe, far queries', timings))
+
+    # Brute force is slow, so use fewer queries and verify the index against it
+    brute_timings = []
+    mismatches = 0
+    sample = min(args.queries, 100)
+    for lat, lon in zip(q_lats[:sample], q_lons[:sample]):
+        start = time.perf_counter()
+        expected = brute_force_nearest(ids, lats, lons, lat, lon, k=args.k)
+        brute_timings.append((time.perf_counter() - start) * 1000)
+        got = index.query(lat, lon, k=args.k)
+        if [i for i, _ in got] != [i for i, _ in expected]:
+            mismatches += 1
+    print(format_summary('brute-force numpy k=%d' % args.k, brute_timings))
+    print(f"Index vs brute force mismatches: {mismatches}/{sample}")
+
+
+if __name__ == '__main__':
+    main()
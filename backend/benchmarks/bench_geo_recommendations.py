@@ -0,0 +1,66 @@
+"""
+Latency of personalized recommendations: content-only vs geo-aware mode
+
+    python -m benchmarks.bench_geo_recommendations [--locations 100000]
+
+Uses the seeded demo user (nightlife visits worldwide) and a Berlin-only user
+against catalogs grown with synthetic locations.
+"""
+import argparse
+import random
+
+from models import db, Location, User, Visit
+from services.geo_index import get_location_index
+from services.recommendation_engine import get_personalized_recommendations
+from benchmarks.common import add_synthetic_locations, format_summary, make_app, time_call
+
+
+def make_berlin_user():
+    user = User(username='berliner', email='berliner@example.com', password='password123')
+    db.session.add(user)
+    db.session.flush()
+    near_berlin = Location.query.filter(
+        Location.latitude.between(52.3, 52.7),
+        Location.longitude.between(13.1, 13.7)
+    ).limit(15).all()
+    for location in near_berlin:
+        db.session.add(Visit(user_id=user.id, location_id=location.id, rating=random.choice([4, 5])))
+    db.session.commit()
+    return user.id
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--locations', type=int, nargs='+', default=[0, 10000, 100000])
+    args = parser.parse_args()
+
+    for extra in args.locations:
+        app = make_app()
+        with app.app_context():
+            if extra:
+                add_synthetic_locations(extra)
+                # Guarantee some Berlin places for the Berlin user
+                for i in range(20):
+                    db.session.add(Location(name=f'Berlin spot {i}', city='Berlin', country='Germany',
+                                            type='nightlife', rating=4.5, price_level=2,
+                                            latitude=52.5 + i * 0.005, longitude=13.4 - i * 0.005))
+                db.session.commit()
+            berlin_id = make_berlin_user()
+            demo_id = User.query.filter_by(username='demouser').first().id
+            get_location_index(app)  # build outside the timed loop
+
+            total = Location.query.count()
+            print(f"\nCatalog of {total} locations")
+            for label, user_id in (('demo user', demo_id), ('berlin user', berlin_id)):
+                for mode in ('content', 'geo'):
+                    timings = time_call(
+                        lambda: get_personalized_recommendations(user_id, mode=mode), repeat=50
+                    )
+                    print(format_summary(f"{label} mode={mode}", timings))
+
+            top = get_personalized_recommendations(berlin_id, mode='geo')[:3]
+            print("berlin user geo top 3:", [(r['name'], r['city'], r['distance_km']) for r in top])
+
+
+if __name__ == '__main__':
+    main()
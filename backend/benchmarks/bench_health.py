@@ -0,0 +1,52 @@
+"""
+Health endpoint cost as the visits table grows
+
+    python -m benchmarks.bench_health [--visits 2000000]
+
+Compares the uncached row counts the old /api/health ran on every call with
+the probes and the cached stats endpoint.
+"""
+import argparse
+import random
+
+from sqlalchemy import func, select
+
+from models import db, Location, User, Visit
+from benchmarks.common import format_summary, make_app, time_call
+
+
+def add_synthetic_visits(count, seed=0, batch=50000):
+    rng = random.Random(seed)
+    user_id = db.session.scalar(select(User.id))
+    location_ids = db.session.scalars(select(Location.id)).all()
+    for start in range(0, count, batch):
+        db.session.execute(Visit.__table__.insert(), [
+            {'user_id': user_id, 'location_id': rng.choice(location_ids), 'rating': rng.randint(1, 5)}
+            for _ in range(min(batch, count - start))
+        ])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--visits', type=int, default=2000000, help='synthetic visits to add')
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        add_synthetic_visits(args.visits)
+
+        def uncached_counts():
+            for model in (User, Location, Visit):
+                db.session.scalar(select(func.count(model.id)))
+
+        print(format_summary(f'uncached counts ({args.visits} visits)', time_call(uncached_counts, repeat=20)))
+
+    client = app.test_client()
+    for path in ('/api/health/live', '/api/health/ready', '/api/health'):
+        client.get(path)  # first stats call counts synchronously
+        print(format_summary(f'GET {path}', time_call(lambda: client.get(path), repeat=200)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Idempotency-Key handling on POST /api/visits/
+
+    python -m benchmarks.bench_idempotency [--retries 300] [--concurrency 16]
+
+1. Latency of the first POST vs. replayed retries, per key store backend.
+2. Concurrent duplicates across gunicorn workers: `--concurrency` clients
+   send the same new visit at once, with and without a shared key, and the
+   rows created for it are counted.
+"""
+import argparse
+import json
+import sqlite3
+import threading
+import uuid
+from collections import Counter
+
+from benchmarks.common import (
+    format_summary, gunicorn_server, http_request, make_app, make_seeded_database, time_call,
+)
+
+PASSWORD_HASH_WORKERS = 0  # hash the demo login inline
+
+
+def login_headers(client):
+    response = client.post('/api/auth/login', json={'username': 'demouser', 'password': 'password123'})
+    return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+
+def replay_latency(retries):
+    for backend in ('memory', 'sqlite'):
+        app = make_app(IDEMPOTENCY_BACKEND=backend, PASSWORD_HASH_WORKERS=PASSWORD_HASH_WORKERS, LOG_LEVEL='WARNING')
+        client = app.test_client()
+        headers = login_headers(client)
+        locations = iter(range(1, 10**6))
+
+        def first_post():
+            key_headers = {**headers, 'Idempotency-Key': uuid.uuid4().hex}
+            client.post('/api/visits/', json={'location_id': next(locations) % 60 + 1, 'rating': 4}, headers=key_headers)
+
+        retry_headers = {**headers, 'Idempotency-Key': 'retried'}
+        client.post('/api/visits/', json={'location_id': 1, 'rating': 5}, headers=retry_headers)
+        print(format_summary(f'{backend}: POST with a new key', time_call(first_post, repeat=retries)))
+        print(format_summary(f'{backend}: retried POST (replayed)', time_call(
+            lambda: client.post('/api/visits/', json={'location_id': 1, 'rating': 5}, headers=retry_headers),
+            repeat=retries,
+        )))
+
+
+def concurrent_duplicates(concurrency):
+    env = make_seeded_database()
+    env.update({'IDEMPOTENCY_BACKEND': 'sqlite', 'PASSWORD_HASH_WORKERS': str(PASSWORD_HASH_WORKERS), 'LOG_LEVEL': 'WARNING',
+                'RATE_LIMIT_ENABLED': 'false'})
+    database = env['DATABASE_URL'].replace('sqlite:///', '', 1)
+    with gunicorn_server(env, '--workers', '4', '--worker-class', 'gthread', '--threads', '4') as base_url:
+        _, body, _ = http_request(f'{base_url}/api/auth/login', 'POST',
+                                  {'username': 'demouser', 'password': 'password123'})
+        headers = {'Authorization': f"Bearer {json.loads(body)['access_token']}"}
+
+        with sqlite3.connect(database) as connection:
+            unvisited = [location_id for (location_id,) in connection.execute(
+                'SELECT id FROM locations WHERE id NOT IN (SELECT location_id FROM visits) ORDER BY id LIMIT 2')]
+        for label, location_id, key in (('no Idempotency-Key', unvisited[0], None),
+                                        ('shared Idempotency-Key', unvisited[1], 'same')):
+            barrier = threading.Barrier(concurrency)
+            statuses = Counter()
+
+            def client():
+                request_headers = dict(headers)
+                if key:
+                    request_headers['Idempotency-Key'] = key
+                barrier.wait()
+                status, _, response_headers = http_request(
+                    f'{base_url}/api/visits/', 'POST', {'location_id': location_id, 'rating': 3}, request_headers,
+                )
+                replayed = ' replayed' if response_headers.get('Idempotent-Replayed') else ''
+                statuses[f'{status}{replayed}'] += 1
+
+            threads = [threading.Thread(target=client) for _ in range(concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            with sqlite3.connect(database) as connection:
+                rows = connection.execute('SELECT COUNT(*) FROM visits WHERE location_id = ?', (location_id,)).fetchone()[0]
+            print(f"{concurrency} concurrent POSTs, {label:<24} rows created: {rows:<3} responses: {dict(statuses)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--retries', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+    replay_latency(args.retries)
+    concurrent_duplicates(args.concurrency)
+
+
+if __name__ == '__main__':
+    main()
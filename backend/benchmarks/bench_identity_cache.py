@@ -0,0 +1,57 @@
+"""
+Database statements per authenticated request with and without the identity cache
+
+    python -m benchmarks.bench_identity_cache
+"""
+import contextlib
+import io
+
+from sqlalchemy import event
+
+from models import db
+from benchmarks.common import format_summary, make_app, time_call
+
+ENDPOINTS = (
+    '/api/auth/profile',
+    '/api/visits/',
+    '/api/recommendations/personalized',
+)
+
+
+def main():
+    results = {}
+    for ttl in (0, 60):
+        app = make_app(IDENTITY_CACHE_TTL=ttl, PASSWORD_HASH_WORKERS=0)
+        client = app.test_client()
+        with contextlib.redirect_stdout(io.StringIO()):
+            token = client.post('/api/auth/login', json={
+                'username': 'demouser', 'password': 'password123'
+            }).json['access_token']
+        headers = {'Authorization': f'Bearer {token}'}
+
+        statements = []
+        with app.app_context():
+            engine = db.engine
+
+        def count(*args):
+            statements.append(1)
+
+        event.listen(engine, 'before_cursor_execute', count)
+        print(f"\nIDENTITY_CACHE_TTL={ttl}")
+        for path in ENDPOINTS:
+            with contextlib.redirect_stdout(io.StringIO()):
+                statements.clear()
+                client.get(path, headers=headers)
+                per_request = len(statements)
+                timings = time_call(lambda: client.get(path, headers=headers), repeat=100)
+            results[(ttl, path)] = per_request
+            print(format_summary(f"{path} [{per_request} statements]", timings))
+        event.remove(engine, 'before_cursor_execute', count)
+
+    print("\nStatements saved per request:")
+    for path in ENDPOINTS:
+        print(f"  {path:<40} {results[(0, path)] - results[(60, path)]}")
+
+
+if __name__ == '__main__':
+    main()
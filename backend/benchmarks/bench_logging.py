@@ -0,0 +1,72 @@
+"""
+Request latency with synchronous vs queued logging, logs written to a temp file
+
+Logging is configured once per process, so each mode runs in its own child
+process with stdout redirected to a file:
+
+    sync-debug    every record formatted and written in the request thread
+                  (what the print() debugging used to cost)
+    async-debug   same records, formatted and written by the listener thread
+    async-info    production default: INFO and above, queued
+
+    python -m benchmarks.bench_logging
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+MODES = {
+    'sync-debug': {'LOG_LEVEL': 'DEBUG', 'LOG_ASYNC': False},
+    'async-debug': {'LOG_LEVEL': 'DEBUG', 'LOG_ASYNC': True},
+    'async-info': {'LOG_LEVEL': 'INFO', 'LOG_ASYNC': True},
+}
+
+REQUESTS = 500
+
+
+def run_mode(mode):
+    """Child process: time visit reads/writes and report the timings on stderr"""
+    from benchmarks.common import make_app, time_call
+    from services.logging_config import dropped_log_records, flush_logging
+
+    app = make_app(PASSWORD_HASH_WORKERS=0, RATE_LIMIT_ENABLED=False, **MODES[mode])
+    client = app.test_client()
+    token = client.post('/api/auth/login', json={
+        'username': 'demouser', 'password': 'password123'
+    }).json['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+    location_id = client.get('/api/visits/', headers=headers).json['visits'][0]['location_id']
+
+    def request_pair():
+        client.get('/api/visits/', headers=headers)
+        client.post('/api/visits/', headers=headers, json={'location_id': location_id, 'rating': 4})
+
+    timings = time_call(request_pair, repeat=REQUESTS)
+    flush_logging()
+    json.dump({'timings': timings, 'dropped': dropped_log_records()}, sys.stderr)
+
+
+def main():
+    from benchmarks.common import format_summary
+
+    print(f"{REQUESTS} x (GET + POST /api/visits/), logs to a temp file")
+    for mode in MODES:
+        with tempfile.NamedTemporaryFile('w+', suffix='.log') as log_file:
+            child = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_logging', mode],
+                stdout=log_file, stderr=subprocess.PIPE, text=True, check=True,
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            )
+            result = json.loads(child.stderr.strip().splitlines()[-1])
+            log_file.seek(0, os.SEEK_END)
+            size_kb = log_file.tell() / 1024
+        print(format_summary(f"{mode} [{size_kb:.0f} KiB, {result['dropped']} dropped]", result['timings']))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run_mode(sys.argv[1])
+    else:
+        main()
@@ -0,0 +1,76 @@
+"""
+Cost of the request/SQL instrumentation behind /metrics
+
+    python -m benchmarks.bench_metrics
+
+1. Per-call cost of the registry operations a request performs
+2. Per-request overhead of the before/after request hooks
+3. Multi-process aggregation: gunicorn with 3 workers sharing METRICS_DIR,
+   checking the scraped request count and timing the scrape itself
+"""
+import re
+import tempfile
+import timeit
+
+from benchmarks.common import format_summary, gunicorn_server, http_request, make_app, make_seeded_database, time_call
+
+
+def registry_cost():
+    from services.metrics import LATENCY_BUCKETS, Registry
+
+    registry = Registry()
+    labels = (('endpoint', 'visits.get_user_visits'),)
+    counter_labels = labels + (('method', 'GET'), ('status', '200'))
+    number = 200000
+    inc = min(timeit.repeat(lambda: registry.inc('http_requests_total', counter_labels),
+                            number=number, repeat=5)) / number
+    observe = min(timeit.repeat(lambda: registry.observe('http_request_duration_seconds', labels, 0.004,
+                                                         LATENCY_BUCKETS), number=number, repeat=5)) / number
+    print(f"Registry.inc      {inc * 1e6:6.2f} us")
+    print(f"Registry.observe  {observe * 1e6:6.2f} us")
+
+
+def request_overhead():
+    """Time the before/after request hooks themselves; whole-request timings are too noisy"""
+    app = make_app(seed=False)
+    start_timer = next(f for f in app.before_request_funcs[None] if f.__name__ == 'start_timer')
+    record_request = next(f for f in app.after_request_funcs[None] if f.__name__ == 'record_request')
+    response = app.response_class('ok')
+    number = 20000
+    with app.test_request_context('/api/test'):
+        def hooks():
+            start_timer()
+            record_request(response)
+        per_request = min(timeit.repeat(hooks, number=number, repeat=5)) / number
+    print(f"Instrumentation per request     {per_request * 1e6:6.2f} us (before + after hook)")
+
+
+def multiprocess_aggregation():
+    env = make_seeded_database()
+    env.update({
+        'METRICS_DIR': tempfile.mkdtemp(prefix='chillquest-metrics-'),
+        'METRICS_FLUSH_INTERVAL': '0',  # flush on every request so the count is exact
+        'WEB_CONCURRENCY': '3',
+    })
+    with gunicorn_server(env) as base_url:
+        for _ in range(300):
+            http_request(f'{base_url}/api/locations/1')
+        _, body, _ = http_request(f'{base_url}/metrics')
+        text = body.decode()
+        served = sum(float(value) for value in re.findall(
+            r'http_requests_total\{endpoint="locations.get_location".*\} (\S+)', text))
+        workers = re.search(r'^gunicorn_workers (\S+)', text, re.M)
+        print(f"locations.get_location counted across workers: {served:.0f} of 300, "
+              f"workers reporting: {workers.group(1) if workers else '?'}")
+        print(format_summary('GET /metrics (aggregating 3 workers)',
+                             time_call(lambda: http_request(f'{base_url}/metrics'), repeat=50)))
+
+
+def main():
+    registry_cost()
+    request_overhead()
+    multiprocess_aggregation()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Read latency while the auth endpoints are under a login storm
+
+    python -m benchmarks.bench_password_pool [--duration 10] [--login-clients 16]
+
+Starts gunicorn (gthread workers) on a seeded throwaway database and measures
+GET /api/locations/<id> latency alone, then alongside a login storm, with
+password hashing inline (PASSWORD_HASH_WORKERS=0) and in the bounded pool.
+"""
+import argparse
+import threading
+import time
+from collections import Counter
+
+from benchmarks.common import format_summary, gunicorn_server, http_request, make_seeded_database
+
+GUNICORN_ARGS = ('--workers', '2', '--worker-class', 'gthread', '--threads', '8')
+
+
+def run(base_url, duration, login_clients):
+    stop = threading.Event()
+    outcomes = Counter()
+
+    def login_loop():
+        while not stop.is_set():
+            status, _, _ = http_request(
+                f'{base_url}/api/auth/login', 'POST',
+                {'username': 'demouser', 'password': 'password123'}
+            )
+            outcomes[status] += 1
+
+    threads = [threading.Thread(target=login_loop) for _ in range(login_clients)]
+    for thread in threads:
+        thread.start()
+
+    read_timings = []
+    deadline = time.monotonic() + duration
+    location_id = 1
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        http_request(f'{base_url}/api/locations/{location_id}')
+        read_timings.append((time.perf_counter() - start) * 1000)
+        location_id = location_id % 100 + 1
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return read_timings, outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--login-clients', type=int, default=16)
+    args = parser.parse_args()
+
+    env = make_seeded_database()
+    for label, extra_env in (
+        ('inline hashing', {'PASSWORD_HASH_WORKERS': '0'}),
+        ('pool (1 proc/worker, queue 4)', {'PASSWORD_HASH_WORKERS': '1', 'PASSWORD_HASH_MAX_QUEUE': '4'}),
+    ):
+        with gunicorn_server({**env, **extra_env}, *GUNICORN_ARGS) as base_url:
+            idle, _ = run(base_url, args.duration / 2, 0)
+            print(format_summary(f"{label}: reads, no logins", idle))
+            busy, outcomes = run(base_url, args.duration, args.login_clients)
+            print(format_summary(f"{label}: reads during storm", busy))
+            logins_per_s = outcomes[200] / args.duration
+            print(f"  login outcomes {dict(outcomes)} ({logins_per_s:.1f} successful logins/s)")
+
+
+if __name__ == '__main__':
+    main()
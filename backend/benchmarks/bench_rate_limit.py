@@ -0,0 +1,58 @@
+"""
+Per-request overhead of the token-bucket rate limiter
+
+    python -m benchmarks.bench_rate_limit
+"""
+import os
+import tempfile
+
+from flask import jsonify
+
+from services.rate_limit import MemoryBackend, SQLiteBackend, parse_limit, rate_limit
+from benchmarks.common import format_summary, make_app, time_call
+
+
+def bench_backends():
+    capacity, rate = parse_limit('1000000/second')
+    backends = (
+        ('memory', MemoryBackend()),
+        ('sqlite (shared file)', SQLiteBackend(os.path.join(tempfile.mkdtemp(), 'rate_limits.db'))),
+    )
+    for label, backend in backends:
+        print(format_summary(f"{label}: same key", time_call(
+            lambda: backend.take('login:ip:127.0.0.1', capacity, rate), repeat=5000)))
+        counter = iter(range(10 ** 9))
+        print(format_summary(f"{label}: new key each call", time_call(
+            lambda: backend.take(f'login:ip:{next(counter)}', capacity, rate), repeat=5000)))
+
+
+def bench_request_path():
+    for backend in ('memory', 'sqlite'):
+        app = make_app(seed=False, RATE_LIMIT_BACKEND=backend, BENCH_LIMIT='1000000/second')
+
+        def plain():
+            return jsonify({'ok': True})
+
+        @rate_limit('ip', 'BENCH_LIMIT')
+        def limited():
+            return jsonify({'ok': True})
+
+        app.add_url_rule('/bench/plain', 'bench_plain', plain)
+        app.add_url_rule('/bench/limited', 'bench_limited', limited)
+        client = app.test_client()
+
+        base = time_call(lambda: client.get('/bench/plain'), repeat=3000)
+        with_limit = time_call(lambda: client.get('/bench/limited'), repeat=3000)
+        print(format_summary("request without limiter", base))
+        print(format_summary(f"request with {backend} limiter", with_limit))
+        overhead_us = (sum(with_limit) / len(with_limit) - sum(base) / len(base)) * 1000
+        print(f"  mean overhead per request: {overhead_us:.1f} us")
+
+
+def main():
+    bench_backends()
+    bench_request_path()
+
+
+if __name__ == '__main__':
+    main()
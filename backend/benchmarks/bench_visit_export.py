@@ -0,0 +1,65 @@
+"""
+Exporting a long visit history
+
+    python -m benchmarks.bench_visit_export [--visits 100000]
+
+Streams GET /api/visits/export (CSV and GeoJSON, plain and gzip) for a user
+with --visits visits and reports time, bytes sent and peak Python memory
+(tracemalloc, on a second run) while the body is consumed, next to
+building the same history with the unpaginated GET /api/visits/.
+"""
+import argparse
+import time
+import tracemalloc
+
+from models import db, User
+from benchmarks.bench_visit_pagination import add_history
+from benchmarks.common import make_app
+
+
+def measure(label, fetch):
+    # Timed without tracemalloc, which slows allocation-heavy code down severalfold
+    start = time.perf_counter()
+    size = fetch()
+    elapsed = (time.perf_counter() - start) * 1000
+    tracemalloc.start()
+    fetch()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<42} {elapsed:9.1f} ms  {size / 2**20:8.1f} MiB sent  peak {peak / 2**20:7.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--visits', type=int, default=100000)
+    args = parser.parse_args()
+
+    app = make_app(PASSWORD_HASH_WORKERS=0, LOG_LEVEL='WARNING')
+    with app.app_context():
+        user = User(username='exporter', email='exporter@example.com', password='password123')
+        db.session.add(user)
+        db.session.commit()
+        add_history(user.id, args.visits)
+
+    client = app.test_client()
+    token = client.post('/api/auth/login', json={'username': 'exporter', 'password': 'password123'}).get_json()
+    headers = {'Authorization': f"Bearer {token['access_token']}"}
+
+    def streamed(query, encoding):
+        def fetch():
+            response = client.get(query, headers={**headers, 'Accept-Encoding': encoding}, buffered=False)
+            size = sum(len(chunk) for chunk in response.response)  # consume without keeping the body
+            response.close()
+            return size
+        return fetch
+
+    print(f"{args.visits} visits")
+    for export_format in ('csv', 'geojson'):
+        for encoding in ('identity', 'gzip'):
+            measure(f'export {export_format}, {encoding}', streamed(f'/api/visits/export?format={export_format}', encoding))
+    measure('GET /api/visits/ (whole history), identity',
+            lambda: len(client.get('/api/visits/', headers=headers).get_data()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Write-behind visit journal: request latency, apply throughput and crash recovery
+
+    python -m benchmarks.bench_visit_journal [--posts 500] [--entries 5000]
+
+1. POST /api/visits/ latency with synchronous commits vs. write-behind
+   (journal synchronous=FULL and NORMAL), and how long the applier takes
+   to catch up.
+2. Entries applied per second by batch size.
+3. Crash recovery: a child process posts visits until it is SIGKILLed; the
+   journal is then replayed and every acknowledged upsert must be in the
+   database. The whole journal is replayed a second time to check that
+   applying entries twice leaves the visits and rating aggregates unchanged.
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+
+from sqlalchemy import func
+
+from models import db, Location, Visit
+from benchmarks.common import format_summary, make_app, make_config
+from services.visit_journal import JournalApplier, VisitJournal, replay_journal
+
+PASSWORD_HASH_WORKERS = 0  # hash the demo login inline
+
+
+def login(client):
+    response = client.post('/api/auth/login', json={'username': 'demouser', 'password': 'password123'})
+    return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+
+def post_visits(client, headers, location_ids, count, seed=0):
+    rng = random.Random(seed)
+    timings = []
+    for _ in range(count):
+        body = {'location_id': rng.choice(location_ids), 'rating': rng.randint(1, 5), 'notes': 'bench'}
+        start = time.perf_counter()
+        response = client.post('/api/visits/', json=body, headers=headers)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code in (200, 201, 202), response.get_json()
+    return timings
+
+
+def request_latency(posts):
+    for label, overrides in (
+        ('synchronous commit', {}),
+        ('write-behind, journal FULL', {'VISIT_WRITE_BEHIND': True, 'VISIT_JOURNAL_SYNCHRONOUS': 'FULL'}),
+        ('write-behind, journal NORMAL', {'VISIT_WRITE_BEHIND': True, 'VISIT_JOURNAL_SYNCHRONOUS': 'NORMAL'}),
+    ):
+        app = make_app(PASSWORD_HASH_WORKERS=PASSWORD_HASH_WORKERS, LOG_LEVEL='WARNING', **overrides)
+        client = app.test_client()
+        headers = login(client)
+        with app.app_context():
+            location_ids = [location_id for (location_id,) in db.session.query(Location.id)]
+        start = time.perf_counter()
+        print(format_summary(f'POST /api/visits/ ({label})', post_visits(client, headers, location_ids, posts)))
+        applier = app.extensions.get('visit_journal')
+        if applier is not None:
+            while applier.journal.pending_count():
+                time.sleep(0.005)
+            print(f"{'':<50} all {posts} applied {(time.perf_counter() - start) * 1000:.0f} ms after the first POST")
+
+
+def apply_throughput(entries):
+    for batch_size in (1, 50, 500):
+        app = make_app(VISIT_WRITE_BEHIND=True, VISIT_JOURNAL_BATCH_SIZE=batch_size, LOG_LEVEL='WARNING')
+        applier = app.extensions['visit_journal']
+        rng = random.Random(batch_size)
+        with app.app_context():
+            location_ids = [location_id for (location_id,) in db.session.query(Location.id)]
+        for i in range(entries):
+            # Spread over many users so most entries insert a new visit
+            applier.journal.append(1 + i % 1000, rng.choice(location_ids), rng.randint(1, 5), '', True)
+        start = time.perf_counter()
+        applier.drain()
+        elapsed = time.perf_counter() - start
+        print(f"apply {entries} entries, batch size {batch_size:<4}       {entries / elapsed:10.0f} entries/s")
+
+
+def crash_child(config_json):
+    """Post visits forever, printing each acknowledged body; the parent kills us"""
+    config = make_config(**json.loads(config_json))
+    from app import create_app
+    app = create_app(config)
+    client = app.test_client()
+    headers = login(client)
+    with app.app_context():
+        location_ids = [location_id for (location_id,) in db.session.query(Location.id)]
+    rng = random.Random(os.getpid())
+    while True:
+        body = {'location_id': rng.choice(location_ids), 'rating': rng.randint(1, 5), 'notes': f'note {rng.random()}'}
+        response = client.post('/api/visits/', json=body, headers=headers)
+        if response.status_code == 202:
+            print(json.dumps(body), flush=True)
+
+
+def aggregates():
+    return sorted(db.session.query(Location.id, Location.rating_count, Location.rating_sum))
+
+
+def expected_aggregates():
+    totals = dict((location_id, (count, total)) for location_id, count, total in db.session.query(
+        Visit.location_id, func.count(Visit.rating), func.coalesce(func.sum(Visit.rating), 0)
+    ).filter(Visit.rating.isnot(None)).group_by(Visit.location_id))
+    return sorted((location_id, *totals.get(location_id, (0, 0))) for (location_id,) in db.session.query(Location.id))
+
+
+def crash_recovery(seconds):
+    app = make_app(VISIT_WRITE_BEHIND=True, VISIT_JOURNAL_POLL_INTERVAL=3600, LOG_LEVEL='WARNING')
+    overrides = {
+        'SQLALCHEMY_DATABASE_URI': app.config['SQLALCHEMY_DATABASE_URI'],
+        'CATALOG_SNAPSHOT_DIR': app.config['CATALOG_SNAPSHOT_DIR'],
+        'VISIT_WRITE_BEHIND': True,
+        'VISIT_JOURNAL_PATH': app.config['VISIT_JOURNAL_PATH'],
+        'PASSWORD_HASH_WORKERS': PASSWORD_HASH_WORKERS,
+        'LOG_LEVEL': 'WARNING',
+        'WARMUP_ON_START': False,
+    }
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    child = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.bench_visit_journal', '--crash-child', json.dumps(overrides)],
+        cwd=backend_dir, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    time.sleep(seconds)
+    child.send_signal(signal.SIGKILL)
+    output, _ = child.communicate()
+    acknowledged = [json.loads(line) for line in output.splitlines() if line.startswith('{')]
+
+    journal = VisitJournal(overrides['VISIT_JOURNAL_PATH'])
+    pending = journal.pending_count()
+    start = time.perf_counter()
+    replayed = replay_journal(app)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"crash after {len(acknowledged)} acknowledged POSTs: {pending} pending, replayed {replayed} in {elapsed:.1f} ms")
+
+    # Every acknowledged POST is in the journal, in order (the child may have
+    # been killed between journaling one more and printing it)
+    entries = journal._connection().execute('SELECT location_id, rating, notes FROM journal ORDER BY seq').fetchall()
+    assert [tuple(body.values()) for body in acknowledged] == entries[:len(acknowledged)], 'acknowledged POST lost'
+    # The last journaled write per location wins
+    expected = {location_id: (rating, notes) for location_id, rating, notes in entries}
+    with app.app_context():
+        stored = {visit.location_id: (visit.rating, visit.notes) for visit in Visit.query.filter_by(user_id=1)}
+        missing = [location_id for location_id, value in expected.items() if stored.get(location_id) != value]
+        print(f"journaled upserts missing after replay: {len(missing)}")
+        assert not missing, missing
+        assert aggregates() == expected_aggregates(), 'rating aggregates drifted'
+
+        # Replay everything again: entries are idempotent
+        before = (sorted(stored.items()), aggregates())
+        journal._connection().execute('UPDATE journal SET applied_at = NULL')
+        JournalApplier(app, journal).drain()
+        stored = {visit.location_id: (visit.rating, visit.notes) for visit in Visit.query.filter_by(user_id=1)}
+        assert (sorted(stored.items()), aggregates()) == before, 'second replay changed the data'
+        print("second replay of the whole journal: visits and aggregates unchanged")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=500, help='POSTs per mode')
+    parser.add_argument('--entries', type=int, default=5000, help='journal entries for the apply benchmark')
+    parser.add_argument('--crash-after', type=float, default=3, help='seconds before the child is killed')
+    parser.add_argument('--crash-child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.crash_child:
+        crash_child(args.crash_child)
+        return
+
+    request_latency(args.posts)
+    apply_throughput(args.entries)
+    crash_recovery(args.crash_after)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Visit history pages for a user with many visits
+
+    python -m benchmarks.bench_visit_pagination [--visits 100000] [--page-size 50]
+
+Times GET /api/visits/ pages at increasing depth when following next_cursor
+(keyset pagination on the (user_id, visit_date) index), the same pages
+fetched with OFFSET for comparison, a filtered page, and the old behaviour
+of returning every visit in one response.
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, text
+
+from models import db, Location, User, Visit
+from benchmarks.common import format_summary, make_app, time_call
+
+
+def add_history(user_id, count, seed=0, batch=50000):
+    """count visits for user_id, one every ten minutes going back from now"""
+    rng = random.Random(seed)
+    location_ids = db.session.scalars(select(Location.id)).all()
+    now = datetime.utcnow()
+    for start in range(0, count, batch):
+        db.session.execute(Visit.__table__.insert(), [
+            {'user_id': user_id, 'location_id': rng.choice(location_ids), 'rating': rng.randint(1, 5),
+             'notes': '', 'visit_date': now - timedelta(minutes=10 * i)}
+            for i in range(start, min(count, start + batch))
+        ])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--visits', type=int, default=100000, help='visits of the benchmark user')
+    parser.add_argument('--page-size', type=int, default=50)
+    args = parser.parse_args()
+
+    app = make_app(PASSWORD_HASH_WORKERS=0, LOG_LEVEL='WARNING')
+    with app.app_context():
+        user = User(username='historian', email='historian@example.com', password='password123')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        add_history(user_id, args.visits)
+        # Other users' visits, so the index has to separate them
+        add_history(1, args.visits, seed=1)
+        plan = db.session.execute(text(
+            'EXPLAIN QUERY PLAN SELECT * FROM visits LEFT OUTER JOIN locations ON locations.id = visits.location_id '
+            'WHERE visits.user_id = :user_id AND visits.visit_date <= :date AND (visits.visit_date < :date OR visits.id < :id) '
+            'ORDER BY visits.visit_date DESC, visits.id DESC LIMIT 51'
+        ), {'user_id': user_id, 'date': datetime.utcnow(), 'id': 0}).fetchall()
+        print('keyset page plan:', '; '.join(row[-1] for row in plan))
+
+    client = app.test_client()
+    token = client.post('/api/auth/login', json={'username': 'historian', 'password': 'password123'}).get_json()
+    headers = {'Authorization': f"Bearer {token['access_token']}"}
+
+    # Walk every page once, keeping the cursors of a few depths
+    pages = args.visits // args.page_size
+    depths = sorted({1, 10, pages // 10, pages // 2, pages})
+    cursors = {1: None}
+    cursor, page = None, 1
+    while True:
+        query = f'/api/visits/?limit={args.page_size}' + (f'&cursor={cursor}' if cursor else '')
+        body = client.get(query, headers=headers).get_json()
+        cursor = body['next_cursor']
+        if not cursor:
+            break
+        page += 1
+        if page in depths:
+            cursors[page] = cursor
+    print(f'walked {page} pages of {args.page_size}')
+
+    for depth in depths:
+        cursor = cursors.get(depth)
+        query = f'/api/visits/?limit={args.page_size}' + (f'&cursor={cursor}' if cursor else '')
+        print(format_summary(f'cursor page {depth}', time_call(lambda: client.get(query, headers=headers), repeat=50)))
+
+    with app.app_context():
+        for depth in depths:
+            offset_query = (db.session.query(Visit, Location)
+                            .outerjoin(Location, Location.id == Visit.location_id)
+                            .filter(Visit.user_id == user_id)
+                            .order_by(Visit.visit_date.desc(), Visit.id.desc())
+                            .offset((depth - 1) * args.page_size).limit(args.page_size))
+            print(format_summary(f'OFFSET page {depth} (query only)', time_call(offset_query.all, repeat=20)))
+
+    query = f'/api/visits/?limit={args.page_size}&type=food&min_rating=4'
+    print(format_summary('cursor page 1, type=food&min_rating=4', time_call(lambda: client.get(query, headers=headers), repeat=50)))
+    print(format_summary(f'all {args.visits} visits in one response', time_call(lambda: client.get('/api/visits/', headers=headers), repeat=3)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Travel statistics for users with few and many visits
+
+    python -m benchmarks.bench_visit_stats [--sizes 100,10000,100000] [--writes 300]
+
+1. GET /api/visits/stats latency per history size, next to computing the
+   same numbers from the full GET /api/visits/ list (what the profile page
+   did before), and the time of a full `flask rebuild-user-stats`.
+2. Random adds, rating changes and deletes through the API, then the
+   incrementally maintained statistics are compared with a rebuild.
+"""
+import argparse
+import math
+import random
+
+from sqlalchemy import select
+
+from models import db, Location, User, Visit
+from benchmarks.bench_visit_pagination import add_history
+from benchmarks.common import format_summary, make_app, time_call
+from services.user_stats import get_user_stats, rebuild_user_stats
+
+
+def login_headers(client, username):
+    response = client.post('/api/auth/login', json={'username': username, 'password': 'password123'})
+    return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+
+def stats_latency(sizes):
+    app = make_app(PASSWORD_HASH_WORKERS=0, LOG_LEVEL='WARNING')
+    client = app.test_client()
+    users = {}
+    with app.app_context():
+        for size in sizes:
+            user = User(username=f'traveller{size}', email=f'traveller{size}@example.com', password='password123')
+            db.session.add(user)
+            db.session.commit()
+            add_history(user.id, size, seed=size)
+            users[size] = user.username
+        print(format_summary('rebuild-user-stats (all users)', time_call(rebuild_user_stats, repeat=3)))
+
+    for size in sizes:
+        headers = login_headers(client, users[size])
+        print(format_summary(f'{size} visits: GET /api/visits/stats',
+                             time_call(lambda: client.get('/api/visits/stats', headers=headers), repeat=50)))
+        if size <= 10000:
+            print(format_summary(f'{size} visits: stats from the full visit list',
+                                 time_call(lambda: client.get('/api/visits/', headers=headers), repeat=5)))
+
+
+def same_stats(incremental, rebuilt):
+    return all(
+        math.isclose(incremental[name], rebuilt[name], rel_tol=1e-6, abs_tol=0.2) if name == 'distance_km'
+        else incremental[name] == rebuilt[name]
+        for name in rebuilt
+    )
+
+
+def incremental_check(writes, seed=0):
+    rng = random.Random(seed)
+    app = make_app(PASSWORD_HASH_WORKERS=0, LOG_LEVEL='WARNING')
+    client = app.test_client()
+    headers = login_headers(client, 'demouser')
+    with app.app_context():
+        location_ids = db.session.scalars(select(Location.id)).all()
+
+    for _ in range(writes):
+        action = rng.random()
+        if action < 0.6:
+            client.post('/api/visits/', json={'location_id': rng.choice(location_ids), 'rating': rng.randint(1, 5)},
+                        headers=headers)
+        else:
+            visits = client.get('/api/visits/', headers=headers).get_json()['visits']
+            if not visits:
+                continue
+            visit = rng.choice(visits)
+            if action < 0.8:
+                client.post('/api/visits/', json={'location_id': visit['location_id'], 'rating': rng.randint(1, 5)},
+                            headers=headers)
+            else:
+                client.delete(f"/api/visits/{visit['id']}", headers=headers)
+
+    with app.app_context():
+        incremental = get_user_stats(1)
+        rebuild_user_stats()
+        rebuilt = get_user_stats(1)
+        visit_count = Visit.query.filter_by(user_id=1).count()
+    print(f"{writes} random writes, {visit_count} visits: incremental stats "
+          f"{'match' if same_stats(incremental, rebuilt) else 'DIFFER FROM'} a rebuild "
+          f"(distance {incremental['distance_km']} vs {rebuilt['distance_km']} km)")
+    if not same_stats(incremental, rebuilt):
+        print('  incremental:', incremental)
+        print('  rebuilt:    ', rebuilt)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='100,10000,100000', help='visit counts of the benchmark users')
+    parser.add_argument('--writes', type=int, default=300)
+    args = parser.parse_args()
+    stats_latency([int(size) for size in args.sizes.split(',')])
+    incremental_check(args.writes)
+
+
+if __name__ == '__main__':
+    main()
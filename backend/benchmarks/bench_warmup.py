@@ -0,0 +1,100 @@
+"""
+First-request latency and per-worker memory with and without preload + warmup
+
+    python -m benchmarks.bench_warmup [--workers 4] [--locations 50000]
+
+Starts gunicorn (sync profile) on a seeded throwaway database twice: cold
+(each worker imports and warms up lazily) and warm (GUNICORN_PRELOAD with
+WARMUP_ON_START). Times the first few requests to the hot endpoints, then
+reads each worker's RSS, PSS and private memory from /proc (Linux only).
+"""
+import argparse
+import os
+import time
+
+from benchmarks.common import gunicorn_server, http_request, make_seeded_database
+
+PORT = 8765
+ENDPOINTS = (
+    '/api/recommendations/',
+    '/api/locations/nearby?lat=48.85&lon=2.35&k=20',
+    '/api/locations/1',
+    '/api/locations/search?q=park',
+)
+MODES = {
+    'cold': {'GUNICORN_PRELOAD': 'false', 'WARMUP_ON_START': 'false'},
+    'preload+warmup': {'GUNICORN_PRELOAD': 'true', 'WARMUP_ON_START': 'true'},
+}
+
+
+def gunicorn_pids(port):
+    """(master pid, worker pids) of the gunicorn bound to port"""
+    processes = {}
+    for pid in filter(str.isdigit, os.listdir('/proc')):
+        try:
+            with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                cmdline = f.read().replace(b'\0', b' ').decode(errors='replace')
+            with open(f'/proc/{pid}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except OSError:
+            continue
+        if 'gunicorn' in cmdline and f'127.0.0.1:{port}' in cmdline:
+            processes[int(pid)] = ppid
+    master = next(pid for pid, ppid in processes.items() if ppid not in processes)
+    return master, [pid for pid, ppid in processes.items() if ppid == master]
+
+
+def memory_kb(pid):
+    """Rss, Pss and private (clean + dirty) memory of a process in KiB"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                fields[name] = int(value.split()[0])
+    return {
+        'rss': fields['Rss'],
+        'pss': fields['Pss'],
+        'private': fields['Private_Clean'] + fields['Private_Dirty'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--locations', type=int, default=50000, help='synthetic locations to add')
+    args = parser.parse_args()
+
+    env = make_seeded_database(extra_locations=args.locations)
+    env.update({'GUNICORN_PROFILE': 'sync', 'WEB_CONCURRENCY': str(args.workers)})
+
+    for mode, settings in MODES.items():
+        start = time.perf_counter()
+        with gunicorn_server({**env, **settings}, port=PORT) as base_url:
+            startup = time.perf_counter() - start
+            print(f"\n{mode}: ready in {startup:.2f} s")
+
+            # Requests spread over the workers, so the first ones tend to hit cold workers
+            for path in ENDPOINTS:
+                timings = []
+                for _ in range(args.workers):
+                    begin = time.perf_counter()
+                    http_request(base_url + path)
+                    timings.append((time.perf_counter() - begin) * 1000)
+                first = ', '.join(f'{t:.1f}' for t in timings)
+                print(f"  {path:<48} first {args.workers} requests (ms): {first}")
+
+            # Memory once every worker has served some traffic
+            for _ in range(10 * args.workers):
+                for path in ENDPOINTS:
+                    http_request(base_url + path)
+            master, workers = gunicorn_pids(PORT)
+            usage = [memory_kb(pid) for pid in workers]
+            for key in ('rss', 'pss', 'private'):
+                per_worker = sum(u[key] for u in usage) / len(usage) / 1024
+                print(f"  worker {key:<8} {per_worker:8.1f} MiB (mean of {len(usage)})")
+            print(f"  master rss     {memory_kb(master)['rss'] / 1024:8.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Throughput and tail latency of the gunicorn worker profiles (gunicorn.conf.py)
+at 50, 200 and 1000 concurrent keep-alive clients
+
+Each client loops over authenticated visit reads and the occasional visit
+write for a fixed time; read and write latencies are reported separately,
+since on SQLite a write holds the database lock (and, under gevent, the
+whole worker). Profiles whose worker class isn't installed (e.g. gevent)
+are skipped.
+
+    python -m benchmarks.bench_worker_modes [seconds per run]
+"""
+import asyncio
+import importlib.util
+import json
+import sys
+import time
+
+from benchmarks.common import gunicorn_server, http_request, make_seeded_database, summarize
+
+PROFILES = ('sync', 'gthread', 'gevent')
+CONCURRENCY = (50, 200, 1000)
+PORT = 8765
+WRITE_EVERY = 5  # every 5th request from a client is a visit update
+
+
+def build_requests(token, location_id):
+    auth = f'Authorization: Bearer {token}\r\n'
+    read = (f'GET /api/visits/ HTTP/1.1\r\nHost: 127.0.0.1\r\n{auth}\r\n').encode()
+    body = f'{{"location_id": {location_id}, "rating": 4}}'.encode()
+    write = (
+        f'POST /api/visits/ HTTP/1.1\r\nHost: 127.0.0.1\r\n{auth}'
+        f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n'
+    ).encode() + body
+    return read, write
+
+
+async def send(reader, writer, raw):
+    """Send one request, return (status, keep connection open)"""
+    writer.write(raw)
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = dict(line.split(': ', 1) for line in lines[1:] if ': ' in line)
+    headers = {name.lower(): value for name, value in headers.items()}
+    await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+async def client(requests, deadline, latencies, failures):
+    reader = writer = None
+    count = 0
+    while time.perf_counter() < deadline:
+        kind = 'write' if count % WRITE_EVERY == WRITE_EVERY - 1 else 'read'
+        raw = requests[1] if kind == 'write' else requests[0]
+        count += 1
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', PORT, limit=1 << 20)
+            status, keep_alive = await asyncio.wait_for(send(reader, writer, raw), timeout=30)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            failures.append(1)
+            keep_alive = False
+        else:
+            latencies[kind].append((time.perf_counter() - start) * 1000)
+            if status >= 400:
+                failures.append(1)
+        if not keep_alive and writer is not None:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(requests, concurrency, seconds):
+    latencies, failures = {'read': [], 'write': []}, []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(client(requests, deadline, latencies, failures) for _ in range(concurrency)))
+    return latencies, len(failures)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+    env = make_seeded_database()
+
+    for profile in PROFILES:
+        if profile == 'gevent' and importlib.util.find_spec('gevent') is None:
+            print(f"\n{profile}: skipped (gevent is not installed)")
+            continue
+
+        with gunicorn_server({**env, 'GUNICORN_PROFILE': profile}, port=PORT) as base_url:
+            _, body, _ = http_request(f'{base_url}/api/auth/login', 'POST', {
+                'username': 'demouser', 'password': 'password123'
+            })
+            token = json.loads(body)['access_token']
+            _, body, _ = http_request(f'{base_url}/api/visits/', headers={'Authorization': f'Bearer {token}'})
+            location_id = json.loads(body)['visits'][0]['location_id']
+            requests = build_requests(token, location_id)
+
+            print(f"\n{profile}:")
+            for concurrency in CONCURRENCY:
+                latencies, failures = asyncio.run(run_load(requests, concurrency, seconds))
+                total = sum(len(values) for values in latencies.values())
+                print(f"  {concurrency:>5} clients  {total / seconds:8.1f} req/s  errors {failures}")
+                for kind, values in latencies.items():
+                    if not values:
+                        print(f"        {kind:<5}  none completed")
+                        continue
+                    stats = summarize(values)
+                    print(f"        {kind:<5}  {len(values) / seconds:8.1f} req/s  "
+                          f"p50 {stats['p50']:8.1f} ms  p95 {stats['p95']:8.1f} ms  p99 {stats['p99']:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
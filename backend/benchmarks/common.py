@@ -0,0 +1,181 @@
+"""
+Shared helpers for the benchmark scripts
+Run benchmarks from the backend directory, e.g. `python -m benchmarks.bench_compression`
+"""
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+
+from config import Config
+
+
+def make_config(**overrides):
+    """Build a Config subclass backed by a throwaway SQLite file"""
+    tmp_dir = tempfile.mkdtemp(prefix='chillquest-bench-')
+    attrs = {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}",
+        'CATALOG_SNAPSHOT_DIR': os.path.join(tmp_dir, 'catalog'),
+        'RATE_LIMIT_SQLITE_PATH': os.path.join(tmp_dir, 'rate_limits.db'),
+        'VISIT_JOURNAL_PATH': os.path.join(tmp_dir, 'visit_journal.db'),
+        'IDEMPOTENCY_SQLITE_PATH': os.path.join(tmp_dir, 'idempotency.db'),
+    }
+    attrs.update(overrides)
+    return type('BenchConfig', (Config,), attrs)
+
+
+def make_app(seed=True, **overrides):
+    """Create an app on a fresh database, optionally seeded with the demo catalog"""
+    from app import create_app
+    from seeding import seed_locations
+    from models import db
+    from services.ratings import rebuild_rating_aggregates
+    from services.user_stats import rebuild_user_stats
+
+    app = create_app(make_config(**overrides))
+    with app.app_context():
+        db.create_all()
+        if seed:
+            # Seeding is chatty, keep the benchmark output readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                seed_locations()
+            rebuild_rating_aggregates()
+            rebuild_user_stats()
+    return app
+
+
+def time_call(fn, repeat=200):
+    """Run fn repeatedly and return per-call timings in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summarize(timings):
+    """Return mean/p50/p95/p99 (ms) for a list of timings"""
+    ordered = sorted(timings)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+    return {
+        'mean': statistics.fmean(ordered),
+        'p50': pct(0.50),
+        'p95': pct(0.95),
+        'p99': pct(0.99),
+    }
+
+
+def format_summary(label, timings):
+    stats = summarize(timings)
+    return (f"{label:<50} mean {stats['mean']:8.3f} ms  p50 {stats['p50']:8.3f} ms  "
+            f"p95 {stats['p95']:8.3f} ms  p99 {stats['p99']:8.3f} ms")
+
+
+LOCATION_TYPES = ('nature', 'recreational', 'nightlife', 'culture', 'food')
+
+
+def add_synthetic_locations(count, seed=0):
+    """Bulk insert `count` random locations clustered around the seeded ones"""
+    import random
+    from models import db, Location
+
+    rng = random.Random(seed)
+    anchors = db.session.query(Location.latitude, Location.longitude).all() or [(0.0, 0.0)]
+    rows = []
+    for i in range(count):
+        lat, lon = rng.choice(anchors)
+        rows.append({
+            'name': f'Synthetic place {i}',
+            'city': f'City {i % 997}',
+            'country': f'Country {i % 89}',
+            'description': 'Generated for benchmarks.',
+            'price_level': rng.randint(1, 5),
+            'type': rng.choice(LOCATION_TYPES),
+            'rating': round(rng.uniform(3.0, 5.0), 1),
+            'latitude': max(-90.0, min(90.0, lat + rng.gauss(0, 1.5))),
+            'longitude': (lon + rng.gauss(0, 1.5) + 180) % 360 - 180,
+        })
+    db.session.execute(Location.__table__.insert(), rows)
+    db.session.commit()
+
+
+def make_seeded_database(extra_locations=0, **overrides):
+    """Seed a throwaway database and return the environment a server process needs to use it"""
+    config = make_config(**overrides)
+    from app import create_app
+    from seeding import seed_locations
+    from models import db
+    from services.ratings import rebuild_rating_aggregates
+    from services.user_stats import rebuild_user_stats
+
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        with contextlib.redirect_stdout(io.StringIO()):
+            seed_locations()
+        if extra_locations:
+            add_synthetic_locations(extra_locations)
+        rebuild_rating_aggregates()
+        rebuild_user_stats()
+    return {
+        'DATABASE_URL': config.SQLALCHEMY_DATABASE_URI,
+        'CATALOG_SNAPSHOT_DIR': config.CATALOG_SNAPSHOT_DIR,
+        'RATE_LIMIT_SQLITE_PATH': config.RATE_LIMIT_SQLITE_PATH,
+        'IDEMPOTENCY_SQLITE_PATH': config.IDEMPOTENCY_SQLITE_PATH,
+    }
+
+
+@contextlib.contextmanager
+def gunicorn_server(env, *args, port=8765):
+    """Run gunicorn on app:create_app() with extra CLI args, yield its base URL"""
+    import subprocess
+    import sys
+    import urllib.request
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', *args, 'app:create_app()'],
+        cwd=backend_dir,
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        for _ in range(200):
+            try:
+                urllib.request.urlopen(f'{base_url}/api/test', timeout=1).read()
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError('gunicorn did not start')
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def http_request(url, method='GET', json_body=None, headers=None, timeout=30):
+    """Small urllib wrapper returning (status, body bytes, headers); never raises on HTTP errors"""
+    import json
+    import urllib.error
+    import urllib.request
+
+    data = None
+    headers = dict(headers or {})
+    if json_body is not None:
+        data = json.dumps(json_body).encode('utf-8')
+        headers['Content-Type'] = 'application/json'
+    request = urllib.request.Request(url, data=data, headers=headers, method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, response.read(), response.headers
+    except urllib.error.HTTPError as error:
+        return error.code, error.read(), error.headers
@@ -0,0 +1,67 @@
+import click
+from services.compression import write_catalog_snapshot
+from services.ratings import rebuild_rating_aggregates
+from services.user_stats import rebuild_user_stats
+
+def register_commands(app):
+    """Register maintenance commands with the flask CLI"""
+
+    @app.cli.command('build-catalog-snapshot')
+    def build_catalog_snapshot():
+        """Write locations.json and its precompressed .gz/.br copies"""
+        sizes = write_catalog_snapshot(app)
+        for name, size in sizes.items():
+            click.echo(f"{name}: {size} bytes")
+
+    @app.cli.command('rebuild-ratings')
+    def rebuild_ratings():
+        """Recompute rating_count/rating_sum/bayesian_rating from all visits"""
+        rated = rebuild_rating_aggregates()
+        click.echo(f"Rebuilt rating aggregates for {rated} locations")
+
+    @app.cli.command('rebuild-user-stats')
+    def rebuild_user_stats_command():
+        """Recompute every user's visit statistics (GET /api/visits/stats) from all visits"""
+        users = rebuild_user_stats()
+        click.echo(f"Rebuilt visit statistics for {users} users")
+
+    @app.cli.command('profile-startup')
+    @click.option('--min-ms', default=5.0, help='Hide imports faster than this (cumulative ms)')
+    @click.option('--json', 'as_json', is_flag=True, help='Machine readable output')
+    @click.option('--budget-ms', type=float, help='Exit non-zero when start-up is slower than this')
+    def profile_startup(min_ms, as_json, budget_ms):
+        """Import tree and create_app() phases of a fresh backend process"""
+        from services.startup_profile import run
+        raise SystemExit(run(min_ms, as_json, budget_ms, echo=click.echo))
+
+    @app.cli.command('profile-collapse')
+    @click.option('--dir', 'directory', help='Profiles to read (defaults to REQUEST_PROFILE_DIR)')
+    @click.option('--endpoint', help='Only profiles of this endpoint, e.g. visits.get_user_visits')
+    @click.option('-o', '--output', help='Write to this file instead of stdout')
+    def profile_collapse(directory, endpoint, output):
+        """Merge sampled request profiles into flamegraph collapsed stacks"""
+        from services.request_profiler import profile_dir, run
+        raise SystemExit(run(directory or profile_dir(app), endpoint, output, echo=click.echo))
+
+    @app.cli.command('replicate-sqlite')
+    @click.option('--interval', type=float, help='Keep copying every this many seconds')
+    def replicate_sqlite_command(interval):
+        """Copy the primary SQLite database onto the SQLite files in SQLALCHEMY_REPLICA_URIS"""
+        import time
+        from services.db_routing import replica_uris, replicate_sqlite
+        replicas = replica_uris(app.config)
+        if not replicas:
+            raise click.ClickException('SQLALCHEMY_REPLICA_URIS is not set')
+        while True:
+            timings = replicate_sqlite(app.config['SQLALCHEMY_DATABASE_URI'], replicas)
+            for uri, elapsed in timings.items():
+                click.echo(f"{uri}: copied in {elapsed:.1f} ms")
+            if not interval:
+                break
+            time.sleep(interval)
+
+    @app.cli.command('apply-visit-journal')
+    def apply_visit_journal():
+        """Apply visit upserts still pending in the write-behind journal"""
+        from services.visit_journal import replay_journal
+        click.echo(f"Applied {replay_journal(app)} journaled visits")
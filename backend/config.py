@@ -21,4 +21,133 @@ class Config:
     JWT_ERROR_MESSAGE_KEY = "message"
     
     # CORS Settings
-    CORS_HEADERS = 'Content-Type,Authorization,X-Requested-With'
\ No newline at end of file
+    CORS_HEADERS = 'Content-Type,Authorization,X-Requested-With'
+    
+    # Response compression (gzip, plus brotli when the brotli package is installed)
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))  # bytes
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4))
+    
+    # Precompressed locations.json snapshots (defaults to <instance>/catalog)
+    CATALOG_SNAPSHOT_ENABLED = os.environ.get('CATALOG_SNAPSHOT_ENABLED', 'true').lower() == 'true'
+    CATALOG_SNAPSHOT_DIR = os.environ.get('CATALOG_SNAPSHOT_DIR')
+    
+    # Nearby search (in-memory grid index over location coordinates)
+    NEARBY_MAX_K = int(os.environ.get('NEARBY_MAX_K', 100))
+    GEO_INDEX_MAX_AGE = int(os.environ.get('GEO_INDEX_MAX_AGE', 300))  # seconds, 0 = until catalog changes
+    NEARBY_BACKEND = os.environ.get('NEARBY_BACKEND', 'auto')  # 'auto' (database if PostgreSQL has earthdistance), 'index' or 'database'
+    
+    # Geo-aware personalized recommendations (?mode=geo)
+    GEO_RECOMMENDATION_CENTROIDS = int(os.environ.get('GEO_RECOMMENDATION_CENTROIDS', 3))  # k-means clusters over visits
+    GEO_RECOMMENDATION_POOL = int(os.environ.get('GEO_RECOMMENDATION_POOL', 100))  # candidates per centroid
+    GEO_RECOMMENDATION_DECAY_KM = float(os.environ.get('GEO_RECOMMENDATION_DECAY_KM', 500))
+    GEO_RECOMMENDATION_WEIGHT = float(os.environ.get('GEO_RECOMMENDATION_WEIGHT', 0.5))  # 0 = ignore distance
+    
+    # Diversity re-ranking (Maximal Marginal Relevance) of recommendation lists
+    DIVERSITY_WEIGHT = float(os.environ.get('DIVERSITY_WEIGHT', 0.3))  # 0 = rank by relevance only
+    DIVERSITY_POOL_SIZE = int(os.environ.get('DIVERSITY_POOL_SIZE', 100))  # top candidates considered
+    DIVERSITY_TYPE_WEIGHT = 0.5
+    DIVERSITY_PRICE_WEIGHT = 0.2
+    DIVERSITY_DISTANCE_WEIGHT = 0.3
+    DIVERSITY_DISTANCE_SCALE_KM = 300.0
+    
+    # Bayesian-averaged location ratings (run `flask rebuild-ratings` after changing these)
+    RATING_PRIOR_WEIGHT = float(os.environ.get('RATING_PRIOR_WEIGHT', 5))  # visitor ratings the seeded rating is worth
+    RATING_PRIOR_MEAN = float(os.environ.get('RATING_PRIOR_MEAN', 3.5))  # prior for locations without a seeded rating
+    
+    # Password hashing pool (per gunicorn worker; 0 workers hashes inline)
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', 8))  # running + waiting hashes
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', 0.05))  # seconds
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))  # seconds
+    
+    # Token-bucket rate limits for the auth endpoints ("count/period", empty to disable a rule)
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')  # 'memory' (per worker) or 'sqlite' (shared)
+    RATE_LIMIT_SQLITE_PATH = os.environ.get('RATE_LIMIT_SQLITE_PATH')  # defaults to <instance>/rate_limits.db
+    RATE_LIMIT_PROXY_HOPS = int(os.environ.get('RATE_LIMIT_PROXY_HOPS', 0))  # trusted proxies setting X-Forwarded-For
+    AUTH_RATE_LIMIT_IP = os.environ.get('AUTH_RATE_LIMIT_IP', '20/minute')
+    AUTH_RATE_LIMIT_ACCOUNT = os.environ.get('AUTH_RATE_LIMIT_ACCOUNT', '5/minute')
+    AUTH_RATE_LIMIT_REGISTER_IP = os.environ.get('AUTH_RATE_LIMIT_REGISTER_IP', '5/hour')
+    
+    # Per-worker cache of JWT identity -> minimal user record (0 disables)
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', 60))  # seconds
+    
+    # Logging (see services/logging_config.py)
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_LEVELS = os.environ.get('LOG_LEVELS', '')  # per-module overrides, e.g. 'api.visits=DEBUG'
+    LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', '')  # e.g. 'api.visits=0.1' keeps 10% of INFO/DEBUG
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # 'json' or 'text'
+    LOG_ASYNC = os.environ.get('LOG_ASYNC', 'true').lower() == 'true'
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))  # records buffered before dropping
+    
+    # Warm mappers, hot queries and the location index in create_app (pair with GUNICORN_PRELOAD)
+    WARMUP_ON_START = os.environ.get('WARMUP_ON_START', 'false').lower() == 'true'
+    
+    # Register Flask-Migrate (the `flask db` commands); off by default because alembic is slow to import
+    MIGRATIONS_ENABLED = os.environ.get('MIGRATIONS_ENABLED', 'false').lower() == 'true'
+    
+    # Prometheus metrics on /metrics (see services/metrics.py)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_DIR = os.environ.get('METRICS_DIR')  # shared by gunicorn workers; unset = this process only
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))  # seconds between worker dumps
+    
+    # Health probes (/api/health/live, /api/health/ready) and cached row counts (/api/health)
+    HEALTH_READY_TIMEOUT = float(os.environ.get('HEALTH_READY_TIMEOUT', 2))  # seconds to wait for SELECT 1
+    HEALTH_STATS_INTERVAL = float(os.environ.get('HEALTH_STATS_INTERVAL', 60))  # seconds between background recounts
+    
+    # Per-request SQL profiling: Server-Timing header and slow-query log (see services/sql_profiler.py)
+    SQL_PROFILING_ENABLED = os.environ.get('SQL_PROFILING_ENABLED', 'false').lower() == 'true'
+    SQL_SLOW_QUERY_MS = float(os.environ.get('SQL_SLOW_QUERY_MS', 100))  # statements at least this slow are logged
+    SQL_SLOW_QUERY_LOG = os.environ.get('SQL_SLOW_QUERY_LOG')  # JSON lines file, in addition to the `sql.slow` logger
+    
+    # Sampled CPU profiles of live requests (see services/request_profiler.py)
+    REQUEST_PROFILE_RATE = float(os.environ.get('REQUEST_PROFILE_RATE', 0))  # fraction of requests, 0 = off
+    REQUEST_PROFILE_BLUEPRINTS = os.environ.get('REQUEST_PROFILE_BLUEPRINTS', '')  # e.g. 'visits,recommendations'; empty = all
+    REQUEST_PROFILE_MODE = os.environ.get('REQUEST_PROFILE_MODE', 'sampler')  # 'sampler' (stack sampling) or 'cprofile'
+    REQUEST_PROFILE_DIR = os.environ.get('REQUEST_PROFILE_DIR')  # defaults to <instance>/profiles
+    REQUEST_PROFILE_MAX_FILES = int(os.environ.get('REQUEST_PROFILE_MAX_FILES', 500))  # oldest deleted beyond this
+    REQUEST_PROFILE_INTERVAL_MS = float(os.environ.get('REQUEST_PROFILE_INTERVAL_MS', 2))  # sampler interval
+    
+    # Request tracing (see services/tracing.py)
+    TRACING_SAMPLE_RATE = float(os.environ.get('TRACING_SAMPLE_RATE', 0))  # fraction of requests traced, 0 = off
+    TRACING_EXPORT = os.environ.get('TRACING_EXPORT', 'stdout')  # 'stdout' or a file path (OTLP/JSON lines)
+    TRACING_SERVICE_NAME = os.environ.get('TRACING_SERVICE_NAME', 'chillquest-backend')
+    TRACING_HONOR_TRACEPARENT = os.environ.get('TRACING_HONOR_TRACEPARENT', 'false').lower() == 'true'  # trace when the caller's traceparent is sampled
+    
+    # Read replicas for @read_replica views (see services/db_routing.py)
+    SQLALCHEMY_REPLICA_URIS = os.environ.get('SQLALCHEMY_REPLICA_URIS', '')  # comma separated; empty = primary only
+    REPLICA_STICKY_SECONDS = float(os.environ.get('REPLICA_STICKY_SECONDS', 10))  # reads stay on the primary after a write
+    REPLICA_STICKY_BACKEND = os.environ.get('REPLICA_STICKY_BACKEND', 'memory')  # 'memory' (per worker) or 'sqlite' (shared)
+    REPLICA_STICKY_SQLITE_PATH = os.environ.get('REPLICA_STICKY_SQLITE_PATH')  # defaults to <instance>/replica_sticky.db
+    
+    # Connection pool for PostgreSQL and other server databases (see services/dialect.py; SQLite ignores these)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))  # per worker process
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))  # extra connections under bursts
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # seconds before a connection is replaced
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'  # test connections on checkout
+    
+    # Write-behind visit upserts (see services/visit_journal.py)
+    VISIT_WRITE_BEHIND = os.environ.get('VISIT_WRITE_BEHIND', 'false').lower() == 'true'  # acknowledge POST /api/visits/ once journaled
+    VISIT_JOURNAL_PATH = os.environ.get('VISIT_JOURNAL_PATH')  # defaults to <instance>/visit_journal.db
+    VISIT_JOURNAL_SYNCHRONOUS = os.environ.get('VISIT_JOURNAL_SYNCHRONOUS', 'FULL')  # SQLite synchronous; NORMAL may lose the last writes on power loss
+    VISIT_JOURNAL_BATCH_SIZE = int(os.environ.get('VISIT_JOURNAL_BATCH_SIZE', 500))  # entries per applied transaction
+    VISIT_JOURNAL_POLL_INTERVAL = float(os.environ.get('VISIT_JOURNAL_POLL_INTERVAL', 1))  # seconds between checks for other workers' entries
+    VISIT_JOURNAL_RETENTION = int(os.environ.get('VISIT_JOURNAL_RETENTION', 86400))  # seconds applied entries (and their keys) are kept
+    
+    # Idempotency-Key support for POST /api/visits/ (see services/idempotency.py)
+    IDEMPOTENCY_ENABLED = os.environ.get('IDEMPOTENCY_ENABLED', 'true').lower() == 'true'
+    IDEMPOTENCY_BACKEND = os.environ.get('IDEMPOTENCY_BACKEND', 'memory')  # 'memory' (per worker) or 'sqlite' (shared)
+    IDEMPOTENCY_SQLITE_PATH = os.environ.get('IDEMPOTENCY_SQLITE_PATH')  # defaults to <instance>/idempotency.db
+    IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 86400))  # seconds a stored response is replayed
+    IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', 30))  # seconds before an unfinished claim expires
+    IDEMPOTENCY_MAX_KEYS = int(os.environ.get('IDEMPOTENCY_MAX_KEYS', 10000))  # stored responses kept
+    
+    # Paginated visit history (GET /api/visits/?limit=...&cursor=...)
+    VISITS_PAGE_SIZE = int(os.environ.get('VISITS_PAGE_SIZE', 50))  # when only a cursor is given
+    VISITS_MAX_PAGE_SIZE = int(os.environ.get('VISITS_MAX_PAGE_SIZE', 500))
+    
+    # Visit history export (GET /api/visits/export, see services/visit_export.py)
+    VISITS_EXPORT_BATCH_SIZE = int(os.environ.get('VISITS_EXPORT_BATCH_SIZE', 1000))  # rows fetched and written per chunk
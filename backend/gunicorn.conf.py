@@ -0,0 +1,93 @@
+"""
+gunicorn settings, picked up automatically when gunicorn runs from this directory
+
+GUNICORN_PROFILE selects how workers serve requests:
+    sync     one request at a time per worker process (gunicorn's default)
+    gthread  a few processes with a thread pool each; the profile to use with SQLite
+    gevent   processes serving many concurrent requests on greenlets, for
+             PostgreSQL: socket waits (psycopg2 through psycogreen) yield to other
+             requests. sqlite3 isn't patched and its queries and busy-timeout waits
+             run in C, so under SQLite one slow write stalls every request on the
+             worker; a warning is logged at startup in that case.
+
+Every setting can be overridden from the environment, e.g. WEB_CONCURRENCY=4.
+"""
+import gc
+import glob
+import multiprocessing
+import os
+
+
+def _env(name, default, cast=str):
+    value = os.environ.get(name)
+    return default if value in (None, '') else cast(value)
+
+
+def _flag(value):
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+profile = _env('GUNICORN_PROFILE', 'sync')
+cpus = multiprocessing.cpu_count()
+
+PROFILES = {
+    'sync': {'worker_class': 'sync', 'workers': 2 * cpus + 1, 'threads': 1},
+    'gthread': {'worker_class': 'gthread', 'workers': cpus + 1, 'threads': 8},
+    'gevent': {'worker_class': 'gevent', 'workers': 2 * cpus + 1, 'threads': 1},
+}
+if profile not in PROFILES:
+    raise RuntimeError(f"GUNICORN_PROFILE must be one of {', '.join(PROFILES)}, not {profile!r}")
+
+if profile == 'gevent':
+    # Patch before the app (and its locks/threads) is imported, which preload does in the master
+    from gevent import monkey
+    monkey.patch_all()
+    try:
+        # Make psycopg2 wait on PostgreSQL through gevent instead of blocking the worker
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        pass
+
+bind = _env('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = PROFILES[profile]['worker_class']
+workers = _env('WEB_CONCURRENCY', PROFILES[profile]['workers'], int)
+threads = _env('GUNICORN_THREADS', PROFILES[profile]['threads'], int)
+worker_connections = _env('GUNICORN_WORKER_CONNECTIONS', 1000, int)  # gevent: concurrent requests per worker
+
+# Keep connections from the nginx proxy open between requests (ignored by sync workers)
+keepalive = _env('GUNICORN_KEEPALIVE', 5, int)
+timeout = _env('GUNICORN_TIMEOUT', 30, int)
+graceful_timeout = _env('GUNICORN_GRACEFUL_TIMEOUT', 30, int)
+
+# Recycle workers now and then so slow leaks can't build up; jitter keeps them
+# from all restarting at the same moment
+max_requests = _env('GUNICORN_MAX_REQUESTS', 2000, int)
+max_requests_jitter = _env('GUNICORN_MAX_REQUESTS_JITTER', 200, int)
+
+# Import (and, with WARMUP_ON_START, warm up) the app once in the master so
+# workers share its memory copy-on-write
+preload_app = _env('GUNICORN_PRELOAD', False, _flag)
+
+accesslog = _env('GUNICORN_ACCESS_LOG', None)
+
+
+def when_ready(server):
+    if profile == 'gevent' and _env('DATABASE_URL', 'sqlite://').startswith('sqlite'):
+        server.log.warning(
+            "GUNICORN_PROFILE=gevent with SQLite: database calls block the whole worker, "
+            "use GUNICORN_PROFILE=gthread unless DATABASE_URL points at PostgreSQL"
+        )
+    if preload_app:
+        # Move everything the master has built into the permanent generation so
+        # the workers' garbage collector never writes to (and un-shares) those pages
+        gc.freeze()
+
+
+def on_starting(server):
+    # Per-worker metric files from a previous run would be counted as live
+    # workers if their pids got reused
+    metrics_dir = os.environ.get('METRICS_DIR')
+    if metrics_dir:
+        for path in glob.glob(os.path.join(metrics_dir, '*.json')):
+            os.remove(path)
@@ -1,41 +1,138 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+
 from app import create_app
+from config import Config
 from models import db, Location, User
-from app import seed_locations, create_demo_user
+from seeding import seed_locations, seed_catalog_fingerprint
+from services.dialect import ensure_extensions
+from services.compression import snapshot_dir, write_catalog_snapshot, SNAPSHOT_NAME
+from services.ratings import rebuild_rating_aggregates
+from services.user_stats import rebuild_user_stats
+from services.visit_journal import replay_journal
+from services.schema import ensure_columns, ensure_indexes, get_state, schema_fingerprint, set_state
+
+# Reseed and re-check the schema even if the stored fingerprints match
+FORCE = '--force' in sys.argv[1:] or os.environ.get('INIT_DB_FORCE', 'false').lower() == 'true'
+
+class InitConfig(Config):
+    WARMUP_ON_START = False  # this process only initializes, it never serves
+
+timings = []
+
+@contextmanager
+def phase(name):
+    """Time one initialization step for the startup report"""
+    start = time.perf_counter()
+    outcome = {'note': ''}
+    try:
+        yield outcome
+    finally:
+        timings.append((name, (time.perf_counter() - start) * 1000, outcome['note']))
 
 print("Starting database initialization...")
-app = create_app()
+with phase('create_app'):
+    app = create_app(InitConfig)
 
 with app.app_context():
-    # Create all tables
-    db.create_all()
-    print("Tables created successfully.")
-    
-    # Check if locations exist
-    location_count = Location.query.count()
-    print(f"Found {location_count} existing locations.")
-    
-    # ALWAYS seed new locations, regardless of whether there are existing ones
-    print("Seeding or updating locations...")
-    seed_locations()
-    
-    new_location_count = Location.query.count()
-    print(f"Updated to {new_location_count} locations.")
-    
-    # Check if demo user exists
-    demo_user = User.query.filter_by(username='demouser').first()
-    if not demo_user:
-        print("Creating demo user...")
-        create_demo_user()
-        print("Demo user created successfully.")
-    else:
-        print("Demo user already exists.")
-    
-    # Verify locations and user
-    final_location_count = Location.query.count()
-    final_user_count = User.query.count()
-    print(f"Final database state: {final_location_count} locations, {final_user_count} users")
-    
-    if final_location_count == 0:
-        print("WARNING: No locations found after initialization!")
-    else:
-        print("Database initialized successfully.")
\ No newline at end of file
+    # Schema: only touch DDL when the models changed since the last run
+    with phase('schema') as outcome:
+        # PostgreSQL: pg_trgm/earthdistance back extra indexes when the server ships them
+        created_extensions = ensure_extensions(db)
+        if created_extensions:
+            print(f"Created PostgreSQL extensions: {', '.join(created_extensions)}")
+        schema_version = schema_fingerprint(db)
+        added_columns = []
+        if not FORCE and not created_extensions and get_state(db, 'schema_version') == schema_version:
+            outcome['note'] = 'unchanged, skipped'
+        else:
+            # Create all tables
+            db.create_all()
+            print("Tables created successfully.")
+
+            # Existing databases don't get columns/indexes added to the models later on
+            added_columns = ensure_columns(db)
+            if added_columns:
+                print(f"Added missing columns: {', '.join(added_columns)}")
+            created_indexes = ensure_indexes(db)
+            if created_indexes:
+                print(f"Created missing indexes: {', '.join(created_indexes)}")
+            set_state(db, 'schema_version', schema_version)
+            outcome['note'] = f"{len(added_columns)} columns, {len(created_indexes)} indexes added"
+
+    # Visit upserts a crashed write-behind worker acknowledged but never applied
+    with phase('journal') as outcome:
+        replayed = replay_journal(app)
+        outcome['note'] = f"{replayed} visits replayed" if replayed else 'nothing pending'
+
+    # Seed data: only when the built-in catalog changed since it was last seeded
+    with phase('seed') as outcome:
+        catalog_hash = seed_catalog_fingerprint()
+        seeded = FORCE or get_state(db, 'seed_catalog_hash') != catalog_hash
+        had_demo_user = True
+        if not seeded:
+            outcome['note'] = 'catalog unchanged, skipped'
+        else:
+            location_count = Location.query.count()
+            print(f"Found {location_count} existing locations.")
+            had_demo_user = User.query.filter_by(username='demouser').first() is not None
+
+            print("Seeding or updating locations...")
+            seed_locations()  # also creates the demo user if it's missing
+
+            new_location_count = Location.query.count()
+            print(f"Updated to {new_location_count} locations.")
+            if not had_demo_user:
+                print("Demo user created successfully.")
+            else:
+                print("Demo user already exists.")
+            set_state(db, 'seed_catalog_hash', catalog_hash)
+            outcome['note'] = f"{new_location_count - location_count} locations added"
+
+    # Seeded visits bypass the API, so backfill visit-derived ratings after
+    # creating the demo user or adding the rating columns
+    with phase('ratings') as outcome:
+        if not had_demo_user or any(column.startswith('locations.rating_') for column in added_columns):
+            rated = rebuild_rating_aggregates()
+            print(f"Rebuilt rating aggregates for {rated} locations.")
+            outcome['note'] = f"{rated} locations rebuilt"
+        else:
+            outcome['note'] = 'skipped'
+
+    # Same for the per-user statistics, also on databases that predate them
+    with phase('user_stats') as outcome:
+        if not had_demo_user or FORCE or get_state(db, 'user_stats_built') is None:
+            users = rebuild_user_stats()
+            set_state(db, 'user_stats_built', str(int(time.time())))
+            print(f"Rebuilt statistics for {users} users.")
+            outcome['note'] = f"{users} users rebuilt"
+        else:
+            outcome['note'] = 'skipped'
+
+    # Refresh the precompressed catalog when the data changed or the file is missing
+    with phase('snapshot') as outcome:
+        snapshot_path = os.path.join(snapshot_dir(app), SNAPSHOT_NAME)
+        if not app.config['CATALOG_SNAPSHOT_ENABLED']:
+            outcome['note'] = 'disabled'
+        elif seeded or added_columns or not os.path.exists(snapshot_path):
+            sizes = write_catalog_snapshot(app)
+            print(f"Catalog snapshot written: {sizes}")
+            outcome['note'] = 'written'
+        else:
+            outcome['note'] = 'up to date, skipped'
+
+    if seeded:
+        # Verify locations and user
+        final_location_count = Location.query.count()
+        final_user_count = User.query.count()
+        print(f"Final database state: {final_location_count} locations, {final_user_count} users")
+        if final_location_count == 0:
+            print("WARNING: No locations found after initialization!")
+
+print("Startup report:")
+for name, elapsed, note in timings:
+    print(f"  {name:<12} {elapsed:9.1f} ms  {note}")
+print(f"  {'total':<12} {sum(elapsed for _, elapsed, _ in timings):9.1f} ms")
+print("Database initialized successfully.")
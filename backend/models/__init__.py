@@ -1,12 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
-from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import func
+from services.db_routing import RoutingSession
+from services.dialect import requires_extension
+from services.password_hasher import hash_password, verify_password
 from datetime import datetime
 
-db = SQLAlchemy()
+# Reads of @read_replica views go to a replica when SQLALCHEMY_REPLICA_URIS is set
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # User model in the same file to avoid circular imports
-class User(db.Model, UserMixin):
+class User(db.Model):
     __tablename__ = 'users'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -22,26 +25,33 @@ class User(db.Model, UserMixin):
         self.username = username
         self.email = email
         self.set_password(password)
-        print(f"Creating user {username} with password hash: {self.password_hash[:20]}...")
     
     def set_password(self, password):
-        # Generate a password hash
-        self.password_hash = generate_password_hash(password)
+        # Generate a password hash (in the bounded hashing pool, may raise PasswordHasherBusy)
+        self.password_hash = hash_password(password)
         
     def check_password(self, password):
-        # Debug password checking
-        print(f"Checking password for {self.username}")
-        print(f"Stored hash: {self.password_hash[:20]}...")
-        result = check_password_hash(self.password_hash, password)
-        print(f"Password check result: {result}")
-        return result
+        return verify_password(self.password_hash, password)
     
     def __repr__(self):
         return f'<User {self.username}>'
 
+def _initial_bayesian_rating(context):
+    # With no visitor ratings yet the Bayesian average is just the seeded rating
+    return context.get_current_parameters().get('rating')
+
 # Location model
 class Location(db.Model):
     __tablename__ = 'locations'
+    __table_args__ = (
+        # Back "best rated places (of a type)" queries in the recommendation engine
+        db.Index('ix_locations_bayesian_rating', 'bayesian_rating'),
+        db.Index('ix_locations_type_bayesian_rating', 'type', 'bayesian_rating'),
+        # PostgreSQL with pg_trgm: serve the ILIKE '%q%' filters of /api/locations/search
+        *(requires_extension(db.Index(f'ix_locations_{column}_trgm', column, postgresql_using='gin',
+                                      postgresql_ops={column: 'gin_trgm_ops'}), 'pg_trgm')
+          for column in ('name', 'city', 'country')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -51,6 +61,10 @@ class Location(db.Model):
     price_level = db.Column(db.Integer)  # 1-5 for price range
     type = db.Column(db.String(50))  # nature, recreational, nightlife, culture, food
     rating = db.Column(db.Float)  # Average rating (0-5)
+    # Aggregates over Visit.rating, maintained incrementally (see services/ratings.py)
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    bayesian_rating = db.Column(db.Float, default=_initial_bayesian_rating)
     latitude = db.Column(db.Float, nullable=False)
     longitude = db.Column(db.Float, nullable=False)
     
@@ -74,9 +88,17 @@ class Location(db.Model):
             'longitude': self.longitude
         }
 
+# PostgreSQL with earthdistance: KNN and radius queries of /api/locations/nearby (see services/dialect.py)
+requires_extension(db.Index('ix_locations_earth', func.ll_to_earth(Location.latitude, Location.longitude),
+                            postgresql_using='gist'), 'earthdistance')
+
 # Visit model
 class Visit(db.Model):
     __tablename__ = 'visits'
+    __table_args__ = (
+        # Keyset-paginated visit history of one user, newest first (GET /api/visits/)
+        db.Index('ix_visits_user_id_visit_date', 'user_id', 'visit_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -96,4 +118,39 @@ class Visit(db.Model):
             'visit_date': self.visit_date.isoformat(),
             'rating': self.rating,
             'notes': self.notes
-        }
\ No newline at end of file
+        }
+# Per-user travel statistics, maintained incrementally (see services/user_stats.py)
+class UserStats(db.Model):
+    __tablename__ = 'user_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    visit_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    distance_km = db.Column(db.Float, nullable=False, default=0.0)  # between consecutive visits by date
+    
+    def __repr__(self):
+        return f'<UserStats User:{self.user_id}>'
+
+# Visit counts of one user per country, location type and rating given
+class UserVisitCount(db.Model):
+    __tablename__ = 'user_visit_counts'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    kind = db.Column(db.String(20), primary_key=True)  # country, type, rating
+    value = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<UserVisitCount User:{self.user_id} {self.kind}={self.value}>'
+
+# Key/value bookkeeping for maintenance scripts (e.g. what init_db.py last seeded)
+class AppState(db.Model):
+    __tablename__ = 'app_state'
+    
+    key = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<AppState {self.key}>'
@@ -1,14 +1,17 @@
 # backend/seed_data.py
 from app import create_app
+from config import Config
 from models import db, User, Location, Visit
 from werkzeug.security import generate_password_hash
+from services.ratings import rebuild_rating_aggregates
+from services.user_stats import rebuild_user_stats
 from datetime import datetime, timedelta
 import random
 
-def seed_all_data():
+def seed_all_data(config_class=Config):
     """Master function to seed all data for the application"""
     print("Starting comprehensive data seeding...")
-    app = create_app()
+    app = create_app(config_class)
     
     with app.app_context():
         # Check if we need to seed the database
@@ -21,6 +24,10 @@ def seed_all_data():
         # Create demo user with visits
         create_demo_user()
         
+        # Seeded visits bypass the API, so recompute visit-derived ratings and user stats
+        rebuild_rating_aggregates()
+        rebuild_user_stats()
+        
         # Print final state
         final_location_count = Location.query.count()
         final_user_count = User.query.count()
@@ -0,0 +1,94 @@
+"""
+Built-in demo data: the location catalog (data/seed_locations.json) and the demo user
+
+Only init_db.py and the benchmarks seed, so none of this is imported by the app itself.
+"""
+import hashlib
+import json
+import os
+
+from models import db, User, Location, Visit
+
+SEED_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'seed_locations.json')
+
+def seed_location_catalog():
+    """The built-in location catalog, as a list of Location column dicts"""
+    with open(SEED_CATALOG_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+def seed_catalog_fingerprint():
+    """Hash of the seed catalog (and demo user), stored by init_db.py to skip unchanged reseeds"""
+    payload = json.dumps({
+        'locations': seed_location_catalog(),
+        'demo_user': 'demouser',
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def seed_locations():
+    """Seed the database with some initial locations"""
+    # One query for what's already there instead of one per catalog entry
+    existing = set(db.session.query(Location.name, Location.city, Location.country))
+    
+    for loc_data in seed_location_catalog():
+        # Only add if it doesn't exist (the catalog itself lists a few places twice)
+        key = (loc_data['name'], loc_data['city'], loc_data['country'])
+        if key not in existing:
+            print(f"Adding new location: {loc_data['name']}")
+            db.session.add(Location(**loc_data))
+            existing.add(key)
+    
+    db.session.commit()
+    
+    # After locations are added, create a demo user with visits
+    create_demo_user()
+
+def create_demo_user():
+    """Create a demo user with predefined visits focused on nightlife"""
+    import random
+    from datetime import datetime, timedelta
+    
+    # Check if demo user already exists
+    if User.query.filter_by(username='demouser').first():
+        return
+    
+    # Create demo user
+    demo_user = User(
+        username='demouser',
+        email='demo@example.com',
+        password='password123'
+    )
+    db.session.add(demo_user)
+    db.session.flush()  # To get the user ID
+    
+    # Current date for reference
+    now = datetime.utcnow()
+    
+    # First, add visits to nightlife locations with high ratings
+    nightlife_locations = Location.query.filter_by(type='nightlife').all()
+    
+    for i, location in enumerate(nightlife_locations):
+        # Create a visit with a random date in the past year
+        days_ago = random.randint(1, 200)  # More recent visits
+        visit_date = now - timedelta(days=days_ago)
+        
+        # Assign a high rating (nightlife enthusiast)
+        rating = random.choice([4, 5])  # Prefers nightlife venues
+        
+        # Create enthusiastic notes for nightlife venues
+        notes = ""
+        if rating == 5:
+            notes = f"Amazing night at {location.name}! The music and atmosphere were incredible. Definitely coming back!"
+        elif rating == 4:
+            notes = f"Great experience at {location.name}. Good DJs and vibrant crowd."
+        
+        visit = Visit(
+            user_id=demo_user.id,
+            location_id=location.id,
+            visit_date=visit_date,
+            rating=rating,
+            notes=notes
+        )
+        db.session.add(visit)
+    
+    # Add visits for other location types as well
+    db.session.commit()
@@ -0,0 +1,48 @@
+from flask import current_app, has_app_context
+from sqlalchemy import event
+
+# Callbacks run with the app after any commit that added, changed or removed a Location
+_listeners = []
+_watch_installed = False
+
+
+def on_catalog_change(callback):
+    """Register callback(app) to run after the location catalog changes"""
+    if callback not in _listeners:
+        _listeners.append(callback)
+    return callback
+
+
+def notify_catalog_change(app):
+    for callback in _listeners:
+        callback(app)
+
+
+def watch_catalog_changes(session):
+    """Install session hooks that call the catalog listeners after Location commits"""
+    global _watch_installed
+    from models import Location
+
+    if _watch_installed:
+        return
+    _watch_installed = True
+
+    @event.listens_for(session, 'before_flush')
+    def track_location_changes(session, flush_context, instances):
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, Location):
+                session.info['catalog_changed'] = True
+                return
+
+    @event.listens_for(session, 'after_commit')
+    def catalog_committed(session):
+        if not session.info.pop('catalog_changed', False) or not has_app_context():
+            return
+        app = current_app._get_current_object()
+        # The committing session can't run queries here, so listeners get a fresh one
+        with app.app_context():
+            notify_catalog_change(app)
+
+    @event.listens_for(session, 'after_rollback')
+    def discard_changes(session):
+        session.info.pop('catalog_changed', None)
@@ -0,0 +1,196 @@
+import gzip
+import json
+import os
+import zlib
+
+from flask import request, send_file
+
+from services.catalog import on_catalog_change
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Encodings we can produce, in order of preference
+SUPPORTED_ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+SNAPSHOT_NAME = 'locations.json'
+
+
+def parse_accept_encoding(header):
+    """Return a dict of encoding -> q-value from an Accept-Encoding header"""
+    accepted = {}
+    for part in (header or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, params = part.partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(header):
+    """Pick the best encoding we support that the client accepts, or None"""
+    accepted = parse_accept_encoding(header)
+    best = None
+    best_q = 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        q = accepted.get(encoding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(data, encoding, gzip_level=6, brotli_quality=4):
+    """Compress bytes with the given encoding"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+    raise ValueError(f'Unsupported encoding: {encoding}')
+
+
+def compress_stream(chunks, encoding, gzip_level=6, brotli_quality=4):
+    """
+    Compress an iterable of bytes chunk by chunk, for streamed responses
+    Yields compressed data as the compressor emits it, so memory stays flat
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=brotli_quality)
+        process, finish = compressor.process, compressor.finish
+    elif encoding == 'gzip':
+        compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+        process, finish = compressor.compress, compressor.flush
+    else:
+        raise ValueError(f'Unsupported encoding: {encoding}')
+    for chunk in chunks:
+        data = process(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+def init_compression(app):
+    """Register an after_request hook that compresses large text responses"""
+    app.config.setdefault('COMPRESSION_ENABLED', True)
+    app.config.setdefault('COMPRESSION_MIN_SIZE', 1024)
+    app.config.setdefault('COMPRESSION_GZIP_LEVEL', 6)
+    app.config.setdefault('COMPRESSION_BROTLI_QUALITY', 4)
+    app.config.setdefault('COMPRESSION_MIMETYPES', [
+        'application/json',
+        'application/geo+json',
+        'text/csv',
+        'text/html',
+        'text/plain',
+    ])
+
+    if not app.config['COMPRESSION_ENABLED']:
+        return
+
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough
+                or response.is_streamed
+                or response.status_code < 200
+                or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in app.config['COMPRESSION_MIMETYPES']):
+            return response
+
+        response.vary.add('Accept-Encoding')
+
+        data = response.get_data()
+        if len(data) < app.config['COMPRESSION_MIN_SIZE']:
+            return response
+
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+        if not encoding:
+            return response
+
+        response.set_data(compress(
+            data,
+            encoding,
+            gzip_level=app.config['COMPRESSION_GZIP_LEVEL'],
+            brotli_quality=app.config['COMPRESSION_BROTLI_QUALITY'],
+        ))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+# Precompressed catalog snapshots
+
+def snapshot_dir(app):
+    """Directory holding locations.json and its .gz/.br siblings"""
+    return app.config.get('CATALOG_SNAPSHOT_DIR') or os.path.join(app.instance_path, 'catalog')
+
+
+def write_catalog_snapshot(app):
+    """
+    Write locations.json plus maximally compressed .gz/.br copies
+    Files are written to a temp name and renamed so readers never see a partial file
+    """
+    from models import Location
+
+    directory = snapshot_dir(app)
+    os.makedirs(directory, exist_ok=True)
+
+    locations = Location.query.order_by(Location.id).all()
+    payload = json.dumps(
+        {'locations': [location.to_dict() for location in locations]},
+        separators=(',', ':')
+    ).encode('utf-8')
+
+    variants = {SNAPSHOT_NAME: payload}
+    variants[SNAPSHOT_NAME + '.gz'] = gzip.compress(payload, compresslevel=9, mtime=0)
+    if brotli:
+        variants[SNAPSHOT_NAME + '.br'] = brotli.compress(payload, quality=11)
+    else:
+        # Don't leave a stale brotli file behind if brotli went away
+        stale = os.path.join(directory, SNAPSHOT_NAME + '.br')
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    for name, data in variants.items():
+        path = os.path.join(directory, name)
+        tmp_path = f'{path}.tmp{os.getpid()}'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    return {name: len(data) for name, data in variants.items()}
+
+
+def send_catalog_snapshot(app):
+    """Serve the precompressed snapshot that best matches the request, or None if missing"""
+    directory = snapshot_dir(app)
+    plain_path = os.path.join(directory, SNAPSHOT_NAME)
+    if not os.path.exists(plain_path):
+        return None
+
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    suffix = {'br': '.br', 'gzip': '.gz'}.get(encoding)
+    path = plain_path
+    if suffix and os.path.exists(plain_path + suffix):
+        path = plain_path + suffix
+    else:
+        encoding = None
+
+    response = send_file(path, mimetype='application/json', conditional=True, etag=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+@on_catalog_change
+def rebuild_catalog_snapshot(app):
+    if app.config.get('CATALOG_SNAPSHOT_ENABLED', True):
+        write_catalog_snapshot(app)
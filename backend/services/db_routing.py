@@ -0,0 +1,213 @@
+"""
+Read-replica routing
+
+SQLALCHEMY_REPLICA_URIS lists read replicas of the primary database. Views
+decorated with @read_replica run their queries on a replica (chosen at
+random per request); everything else, including any flush or DML statement
+issued from a routed view, uses the primary bound to SQLALCHEMY_DATABASE_URI.
+
+Read-your-writes: views decorated with @sticky_writes mark the writing user
+(and client address) after a successful response, and for
+REPLICA_STICKY_SECONDS afterwards that client's @read_replica views read
+from the primary too. The marks live in process memory, or in a shared
+SQLite file (REPLICA_STICKY_BACKEND = 'sqlite') so every gunicorn worker
+honours them. If a replica fails, the view is retried once on the primary.
+
+For local testing, replicas can be plain SQLite files refreshed from the
+primary by `flask replicate-sqlite [--interval 2]` (sqlite3 online backup).
+"""
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+
+from services.rate_limit import client_ip
+from services.sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+
+class RoutingSession(Session):
+    """Session sending reads to the request's replica (g.db_replica) and writes to the primary"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            replica = g.get('db_replica')
+            if replica is not None and not self._flushing and not getattr(clause, 'is_dml', False):
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_uris(config):
+    return [uri.strip() for uri in (config.get('SQLALCHEMY_REPLICA_URIS') or '').split(',') if uri.strip()]
+
+
+def configure_replica_binds(app):
+    """Register each replica as an extra bind so Flask-SQLAlchemy creates (and disposes) its engine"""
+    uris = replica_uris(app.config)
+    if uris:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds.update({f'{REPLICA_BIND_PREFIX}{i}': uri for i, uri in enumerate(uris)})
+        app.config['SQLALCHEMY_BINDS'] = binds
+    return uris
+
+
+def replica_engines(db):
+    return [engine for key, engine in db.engines.items() if key and key.startswith(REPLICA_BIND_PREFIX)]
+
+
+class MemoryStickiness:
+    """Per-process map of client key -> time until which its reads go to the primary"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self.until = {}
+        self.lock = threading.Lock()
+
+    def mark(self, keys, seconds):
+        until = time.time() + seconds
+        with self.lock:
+            for key in keys:
+                self.until[key] = until
+            if len(self.until) > self.max_keys:
+                now = time.time()
+                self.until = {key: value for key, value in self.until.items() if value > now}
+
+    def is_sticky(self, keys):
+        now = time.time()
+        return any(self.until.get(key, 0) > now for key in keys)
+
+
+class SQLiteStickiness(SQLiteStore):
+    """Stickiness marks shared between processes through a small SQLite file (WAL mode)"""
+
+    def __init__(self, path):
+        super().__init__(path, 'CREATE TABLE IF NOT EXISTS sticky (key TEXT PRIMARY KEY, until REAL NOT NULL)',
+                         synchronous='OFF')
+
+    def mark(self, keys, seconds):
+        now = time.time()
+        connection = self._connection()
+        connection.executemany('INSERT OR REPLACE INTO sticky (key, until) VALUES (?, ?)',
+                               [(key, now + seconds) for key in keys])
+        connection.execute('DELETE FROM sticky WHERE until < ?', (now,))
+
+    def is_sticky(self, keys):
+        placeholders = ','.join('?' * len(keys))
+        row = self._connection().execute(
+            f'SELECT 1 FROM sticky WHERE key IN ({placeholders}) AND until > ? LIMIT 1', (*keys, time.time())
+        ).fetchone()
+        return row is not None
+
+
+def _client_keys(identity=None):
+    keys = [f'ip:{client_ip()}']
+    if identity is not None:
+        keys.append(f'user:{identity}')
+    return keys
+
+
+def _verified_identity():
+    """Identity of a token already verified by @jwt_required, else None"""
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+
+def _request_identity():
+    """JWT identity if the request carries a valid token, without requiring one"""
+    if 'Authorization' not in request.headers:
+        return None
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity()
+    except Exception:
+        return None
+
+
+def read_replica(view):
+    """Run the view's queries on a replica unless the client wrote recently"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        from models import db
+
+        engines = replica_engines(db)
+        stickiness = current_app.extensions.get('replica_stickiness')
+        if not engines or (stickiness is not None and stickiness.is_sticky(_client_keys(_request_identity()))):
+            return view(*args, **kwargs)
+
+        g.db_replica = random.choice(engines)
+        try:
+            return view(*args, **kwargs)
+        except OperationalError as e:
+            logger.warning("Replica query failed, retrying on the primary",
+                           extra={'replica': g.db_replica.url.render_as_string(hide_password=True), 'error': str(e)})
+            db.session.rollback()
+            g.db_replica = None
+            return view(*args, **kwargs)
+        finally:
+            g.db_replica = None
+    return wrapper
+
+
+def sticky_writes(view):
+    """After a successful response, pin the writing client's reads to the primary for a while"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        response = view(*args, **kwargs)
+        stickiness = current_app.extensions.get('replica_stickiness')
+        status = response[1] if isinstance(response, tuple) else getattr(response, 'status_code', 200)
+        if stickiness is not None and status < 400:
+            stickiness.mark(_client_keys(_verified_identity()), current_app.config.get('REPLICA_STICKY_SECONDS', 10))
+        return response
+    return wrapper
+
+
+def init_db_routing(app):
+    """Create the stickiness store when replicas are configured (call after configure_replica_binds)"""
+    if not replica_uris(app.config):
+        return None
+    if app.config.get('REPLICA_STICKY_BACKEND', 'memory') == 'sqlite':
+        path = app.config.get('REPLICA_STICKY_SQLITE_PATH') or os.path.join(app.instance_path, 'replica_sticky.db')
+        stickiness = SQLiteStickiness(path)
+    else:
+        stickiness = MemoryStickiness()
+    app.extensions['replica_stickiness'] = stickiness
+    return stickiness
+
+
+def sqlite_path(uri):
+    url = make_url(uri)
+    if not url.drivername.startswith('sqlite') or not url.database or url.database == ':memory:':
+        raise ValueError(f'Not a SQLite file database: {url.render_as_string(hide_password=True)}')
+    return url.database
+
+
+def replicate_sqlite(primary_uri, replicas):
+    """Copy the primary SQLite file onto each replica with the online backup API; returns ms per replica"""
+    timings = {}
+    source = sqlite3.connect(sqlite_path(primary_uri))
+    try:
+        for uri in replicas:
+            start = time.perf_counter()
+            target = sqlite3.connect(sqlite_path(uri), timeout=30)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+            timings[uri] = (time.perf_counter() - start) * 1000
+    finally:
+        source.close()
+    return timings
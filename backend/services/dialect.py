@@ -0,0 +1,248 @@
+"""
+What the connected database can do natively
+
+The app runs on SQLite (one writer, no extensions) or PostgreSQL. On
+PostgreSQL, init_db.py installs the pg_trgm and earthdistance extensions
+when the server ships them, and the models declare indexes that only exist
+where their extension does:
+
+    ix_locations_*_trgm   GIN trigram indexes serving the ILIKE '%q%'
+                          filters of /api/locations/search
+    ix_locations_earth    GiST index on ll_to_earth(latitude, longitude)
+                          serving nearest-neighbour (<->) and radius queries
+
+Endpoints ask database_features() which path to take: /api/locations/nearby
+runs a KNN query on the GiST index when earthdistance is installed
+(NEARBY_BACKEND = 'auto'), and the in-memory grid index everywhere else.
+"""
+import logging
+import os
+import weakref
+from collections import namedtuple
+
+import numpy as np
+from sqlalchemy import bindparam, func, text
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+logger = logging.getLogger(__name__)
+
+Features = namedtuple('Features', ['name', 'trigram', 'earthdistance'])
+
+# Extensions init_db.py installs when available (earthdistance needs cube)
+EXTENSIONS = ('pg_trgm', 'cube', 'earthdistance')
+
+# earth_box() works on earthdistance's 6378.168 km sphere, ours is 6371.0088 km;
+# widen the box slightly and filter exactly afterwards
+EARTH_BOX_MARGIN = 1.002
+
+_features = {}
+
+
+def _installed_extensions(connection):
+    return {name for (name,) in connection.execute(text('SELECT extname FROM pg_extension'))}
+
+
+def database_features(bind):
+    """Features of the database behind an engine or connection, cached per database URL"""
+    key = bind.engine.url.render_as_string(hide_password=False)
+    features = _features.get(key)
+    if features is None:
+        name = bind.dialect.name
+        installed = set()
+        if name == 'postgresql':
+            if hasattr(bind, 'execute'):
+                installed = _installed_extensions(bind)
+            else:
+                with bind.connect() as connection:
+                    installed = _installed_extensions(connection)
+        features = Features(name, 'pg_trgm' in installed, 'earthdistance' in installed)
+        _features[key] = features
+    return features
+
+
+def ensure_extensions(db):
+    """Install the extensions the server ships but the database doesn't have yet; returns their names"""
+    if db.engine.dialect.name != 'postgresql':
+        return []
+    created = []
+    with db.engine.begin() as connection:
+        available = {name for (name,) in connection.execute(text('SELECT name FROM pg_available_extensions'))}
+        installed = _installed_extensions(connection)
+    for name in EXTENSIONS:
+        if name in installed:
+            continue
+        if name not in available:
+            logger.warning("PostgreSQL extension not available, falling back", extra={'extension': name})
+            continue
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(text(f'CREATE EXTENSION IF NOT EXISTS {name}'))
+            created.append(name)
+        except DBAPIError as e:
+            logger.warning("Could not create PostgreSQL extension",
+                           extra={'extension': name, 'error': str(e.orig)})
+    _features.clear()
+    return created
+
+
+def requires_extension(index, extension):
+    """Declare an index that only exists on PostgreSQL with the given extension installed"""
+    index.info['requires_extension'] = extension
+
+    def supported(ddl, target, bind, **kw):
+        return bind is not None and index_supported(index, bind)
+
+    return index.ddl_if(dialect='postgresql', callable_=supported)
+
+
+def index_supported(index, bind):
+    """False for extension indexes the database can't build"""
+    extension = index.info.get('requires_extension')
+    if extension is None:
+        return True
+    features = database_features(bind)
+    return features.name == 'postgresql' and {
+        'pg_trgm': features.trigram,
+        'earthdistance': features.earthdistance,
+    }[extension]
+
+
+def nearest_locations_sql(lat, lon, k=20, radius_km=None, types=None):
+    """
+    (location id, distance km) of the k closest locations, by KNN over the
+    ll_to_earth GiST index; same result shape as GeoIndex.query
+    """
+    from models import Location
+    from services.geo_index import haversine_km
+
+    point = func.ll_to_earth(lat, lon)
+    location_point = func.ll_to_earth(Location.latitude, Location.longitude)
+    query = Location.query.with_entities(Location.id, Location.latitude, Location.longitude)
+    if types:
+        query = query.filter(Location.type.in_(types))
+    if radius_km is not None:
+        query = query.filter(func.earth_box(point, radius_km * 1000 * EARTH_BOX_MARGIN).op('@>')(location_point))
+    rows = query.order_by(location_point.op('<->')(point)).limit(k).all()
+    if not rows:
+        return []
+
+    ids, lats, lons = zip(*rows)
+    distances = haversine_km(lat, lon, np.array(lats), np.array(lons))
+    # Chord order equals great-circle order, distances just use our earth radius
+    nearest = [(loc_id, float(distance)) for loc_id, distance in zip(ids, distances)]
+    if radius_km is not None:
+        nearest = [(loc_id, distance) for loc_id, distance in nearest if distance <= radius_km]
+    return nearest
+
+
+def _native_insert(dialect_name):
+    """Dialect INSERT supporting .on_conflict_do_update(), or None"""
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
+
+
+def add_to_rows(session, table, key_columns, rows):
+    """
+    Add each row's values to the table row with the same key_columns, creating missing rows
+
+    rows are dicts of the key columns and the counter columns to add to. One
+    INSERT ... ON CONFLICT DO UPDATE on SQLite and PostgreSQL; other databases
+    get an UPDATE per row, then an INSERT of the rows no UPDATE matched (each
+    in a savepoint, retried as an UPDATE if a concurrent writer got there first).
+    """
+    if not rows:
+        return
+    keys = [table.c[name] for name in key_columns]
+    counters = [name for name in rows[0] if name not in key_columns]
+    insert = _native_insert(session.get_bind().dialect.name)
+    if insert is not None:
+        statement = insert(table)
+        session.execute(statement.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: table.c[name] + statement.excluded[name] for name in counters},
+        ), rows)
+        return
+
+    update = table.update().where(*(column == bindparam(f'key_{column.name}') for column in keys)).values(
+        {name: table.c[name] + bindparam(f'add_{name}') for name in counters})
+
+    def add(row):
+        params = {f'key_{name}': row[name] for name in key_columns}
+        params.update({f'add_{name}': row[name] for name in counters})
+        return session.execute(update, params).rowcount
+
+    for row in rows:
+        if add(row):
+            continue
+        try:
+            with session.begin_nested():
+                session.execute(table.insert(), row)
+        except IntegrityError:
+            add(row)
+
+
+def use_database_nearby(app, bind):
+    """Whether /api/locations/nearby should query the database instead of the in-memory index"""
+    backend = app.config.get('NEARBY_BACKEND', 'auto')
+    if backend == 'index':
+        return False
+    if backend == 'database':
+        return True
+    return database_features(bind).earthdistance
+
+
+def _is_sqlite(app):
+    from sqlalchemy.engine import make_url
+
+    return make_url(app.config['SQLALCHEMY_DATABASE_URI']).drivername.startswith('sqlite')
+
+
+def apply_pool_settings(app):
+    """Connection pool settings for server databases (SQLite keeps Flask-SQLAlchemy's defaults)"""
+    if _is_sqlite(app):
+        return
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    options.setdefault('pool_size', app.config.get('DB_POOL_SIZE', 5))
+    options.setdefault('max_overflow', app.config.get('DB_MAX_OVERFLOW', 10))
+    options.setdefault('pool_timeout', app.config.get('DB_POOL_TIMEOUT', 30))
+    options.setdefault('pool_recycle', app.config.get('DB_POOL_RECYCLE', 1800))
+    options.setdefault('pool_pre_ping', app.config.get('DB_POOL_PRE_PING', True))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+# The app (and its Flask-SQLAlchemy extension) whose engines a forked child disposes
+_fork_app = None
+_fork_db = None
+
+
+def _dispose_pools_in_child():
+    app = _fork_app() if _fork_app is not None else None
+    if app is None:
+        return
+    with app.app_context():
+        engines = list(_fork_db.engines.values())
+    for engine in engines:
+        # Drop pooled connections inherited from the parent without closing
+        # them, which would also close the parent's socket/file
+        engine.dispose(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_dispose_pools_in_child)
+
+
+def reset_pools_after_fork(app, db):
+    """
+    Give forked gunicorn workers fresh pools for every engine (primary and
+    replicas) of app: connections the preloaded master opened (warm-up) must
+    not be shared by several processes. One fork hook serves the process, it
+    follows the most recently created app.
+    """
+    global _fork_app, _fork_db
+    _fork_app = weakref.ref(app)
+    _fork_db = db
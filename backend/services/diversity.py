@@ -0,0 +1,78 @@
+import numpy as np
+
+from services.geo_index import EARTH_RADIUS_KM, to_unit_vectors
+
+DEFAULT_PRICE_LEVEL = 3  # unknown price levels count as mid-range
+
+
+def mmr_order(scores, types, prices, lats, lons, limit, diversity=0.3,
+              type_weight=0.5, price_weight=0.2, distance_weight=0.3, distance_scale_km=300.0):
+    """
+    Maximal Marginal Relevance: greedily pick the candidate with the best
+    (1 - diversity) * relevance - diversity * max similarity to anything already picked
+
+    Similarity between two places is a weighted mix of same type, closeness in
+    price level and exp(-distance / distance_scale_km). Only the similarity of every
+    candidate to the newest pick is computed per step, so the cost is O(limit * n).
+    Scores must be non-negative. Returns indices into the inputs in the chosen order.
+    """
+    n = len(scores)
+    limit = min(limit, n)
+    if limit <= 0:
+        return []
+
+    scores = np.asarray(scores, dtype=np.float64)
+    if diversity <= 0 or n == 1:
+        return list(np.argsort(-scores, kind='stable')[:limit])
+
+    # Relevance on a 0-1 scale so it is comparable with similarity. Scaled by the best score rather
+    # than min-max: a pool whose scores all sit within a few percent would otherwise be stretched
+    # to 0-1 and the runner-up types would never outweigh the similarity penalty
+    top = scores.max()
+    relevance = scores / top if top > 0 else np.ones(n)
+
+    _, type_codes = np.unique(np.asarray([t or '' for t in types], dtype=str), return_inverse=True)
+    prices = np.array([DEFAULT_PRICE_LEVEL if p is None else p for p in prices], dtype=np.float64)
+    vectors = to_unit_vectors(np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64))
+
+    max_similarity = np.zeros(n)
+    available = np.ones(n, dtype=bool)
+    chosen = []
+    pick = int(np.argmax(relevance))
+
+    while True:
+        chosen.append(pick)
+        available[pick] = False
+        if len(chosen) == limit:
+            break
+
+        angle = np.arccos(np.clip(vectors @ vectors[pick], -1.0, 1.0))
+        similarity = (
+            type_weight * (type_codes == type_codes[pick])
+            + price_weight * (1 - np.abs(prices - prices[pick]) / 4)
+            + distance_weight * np.exp(-angle * EARTH_RADIUS_KM / distance_scale_km)
+        )
+        np.maximum(max_similarity, similarity, out=max_similarity)
+
+        marginal = (1 - diversity) * relevance - diversity * max_similarity
+        marginal[~available] = -np.inf
+        pick = int(np.argmax(marginal))
+
+    return chosen
+
+
+def diversify(locations, scores, limit, config):
+    """Re-rank Location objects (best first) with MMR using the DIVERSITY_* config; returns indices"""
+    return mmr_order(
+        scores,
+        [location.type for location in locations],
+        [location.price_level for location in locations],
+        [location.latitude for location in locations],
+        [location.longitude for location in locations],
+        limit,
+        diversity=config.get('DIVERSITY_WEIGHT', 0.3),
+        type_weight=config.get('DIVERSITY_TYPE_WEIGHT', 0.5),
+        price_weight=config.get('DIVERSITY_PRICE_WEIGHT', 0.2),
+        distance_weight=config.get('DIVERSITY_DISTANCE_WEIGHT', 0.3),
+        distance_scale_km=config.get('DIVERSITY_DISTANCE_SCALE_KM', 300.0),
+    )
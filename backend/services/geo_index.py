@@ -0,0 +1,308 @@
+import math
+import threading
+import time
+
+import numpy as np
+
+from services.catalog import on_catalog_change
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km, broadcasting over numpy arrays"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def pick_cell_size(count, target_per_cell=16):
+    """Pick a grid cell size (degrees) giving roughly target_per_cell points per occupied cell"""
+    if count <= 0:
+        return 10.0
+    # Land covers ~30% of the sphere, so real catalogs are denser than a uniform spread
+    cells = max(1.0, count / target_per_cell / 0.3)
+    size = math.sqrt(180 * 360 / cells)
+    # Keep the cell count reasonable and cells divisible into the globe
+    return min(10.0, max(0.1, 180 / math.ceil(180 / size)))
+
+
+class GeoIndex:
+    """
+    Fixed lat/lon grid index for k-nearest-neighbour queries by haversine distance
+
+    Points are sorted by grid cell, so each row of neighbouring cells is one
+    contiguous slice. A query scans rings of cells around the target and stops
+    once the k-th best distance is closer than anything outside the scanned block.
+
+    Far from the data (mid-ocean, near a pole) that takes many mostly empty
+    rings, and ring r costs O(r) in Python; past max_scan_rings the query
+    switches to a vectorised scan of every point instead.
+    """
+
+    def __init__(self, ids, lats, lons, types=None, cell_deg=None):
+        ids = np.asarray(ids, dtype=np.int64)
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+
+        self.cell_deg = cell_deg or pick_cell_size(len(ids))
+        self.n_lat = int(math.ceil(180 / self.cell_deg - 1e-9))
+        self.n_lon = int(math.ceil(360 / self.cell_deg - 1e-9))
+
+        cells = self._cell_rows(lats) * self.n_lon + self._cell_cols(lons)
+        order = np.argsort(cells, kind='stable')
+
+        self.ids = ids[order]
+        self.lats = lats[order]
+        self.lons = lons[order]
+        self.size = len(ids)
+
+        counts = np.bincount(cells, minlength=self.n_lat * self.n_lon)
+        self.cell_starts = np.concatenate(([0], np.cumsum(counts)))
+
+        # Scanning r rings costs ~r^2 Python steps, brute force ~size NumPy work;
+        # this keeps the ring overhead at a fraction of one brute-force scan
+        self.max_scan_rings = max(4, int(0.1 * math.sqrt(self.size)))
+
+        # Location types are stored as small integer codes for fast masking
+        if types is not None:
+            types = np.asarray([t or '' for t in types], dtype=object)[order]
+            self.type_names, self.type_codes = np.unique(types.astype(str), return_inverse=True)
+        else:
+            self.type_names, self.type_codes = np.array([], dtype=str), None
+
+    def __len__(self):
+        return self.size
+
+    def _cell_rows(self, lats):
+        return np.clip(((lats + 90) // self.cell_deg).astype(np.int64), 0, self.n_lat - 1)
+
+    def _cell_cols(self, lons):
+        return ((lons + 180) // self.cell_deg).astype(np.int64) % self.n_lon
+
+    def _ring_slices(self, row, col, r):
+        """Index ranges into the sorted arrays for the cells exactly r steps from (row, col)"""
+        slices = []
+
+        def add_cells(cell_row, first_col, count):
+            if cell_row < 0 or cell_row >= self.n_lat or count <= 0:
+                return
+            count = min(count, self.n_lon)
+            first_col %= self.n_lon
+            last_col = first_col + count - 1
+            if last_col >= self.n_lon:
+                ranges = [(first_col, self.n_lon - 1), (0, last_col - self.n_lon)]
+            else:
+                ranges = [(first_col, last_col)]
+            base = cell_row * self.n_lon
+            for lo, hi in ranges:
+                start, end = self.cell_starts[base + lo], self.cell_starts[base + hi + 1]
+                if end > start:
+                    slices.append((start, end))
+
+        if r == 0:
+            add_cells(row, col, 1)
+            return slices
+
+        # Top and bottom rows in full, middle rows only at the left/right edge
+        add_cells(row - r, col - r, 2 * r + 1)
+        add_cells(row + r, col - r, 2 * r + 1)
+        for cell_row in range(row - r + 1, row + r):
+            if 2 * r + 1 >= self.n_lon:
+                # The ring wraps round the globe, only the gap left by ring r-1 is new
+                add_cells(cell_row, col + r, self.n_lon - 2 * r + 1)
+            else:
+                add_cells(cell_row, col - r, 1)
+                add_cells(cell_row, col + r, 1)
+        return slices
+
+    def _unscanned_bound_km(self, lat, row, col, lon, r):
+        """Lower bound on the distance to any point outside the block of rings 0..r"""
+        bounds = []
+
+        south_edge = (row - r) * self.cell_deg - 90
+        north_edge = (row + r + 1) * self.cell_deg - 90
+        if south_edge > -90:
+            bounds.append((lat - south_edge) * KM_PER_DEGREE)
+        if north_edge < 90:
+            bounds.append((north_edge - lat) * KM_PER_DEGREE)
+
+        if 2 * r + 1 < self.n_lon:
+            west_edge = (col - r) * self.cell_deg - 180
+            east_edge = (col + r + 1) * self.cell_deg - 180
+            delta = min(lon - west_edge, east_edge - lon)
+            # Distance from the point to the nearest edge meridian (or the pole past 90 degrees)
+            delta = math.radians(min(delta, 90.0))
+            cos_lat = max(math.cos(math.radians(lat)), 0.0)
+            bounds.append(EARTH_RADIUS_KM * math.asin(min(1.0, math.sin(delta) * cos_lat)))
+
+        return min(bounds) if bounds else math.inf
+
+    def type_mask_codes(self, types):
+        if not types or self.type_codes is None:
+            return None
+        return np.flatnonzero(np.isin(self.type_names, list(types)))
+
+    def _brute_force(self, lat, lon, k, radius_km, wanted_codes):
+        ids, lats, lons = self.ids, self.lats, self.lons
+        if wanted_codes is not None:
+            keep = np.isin(self.type_codes, wanted_codes)
+            ids, lats, lons = ids[keep], lats[keep], lons[keep]
+        return brute_force_nearest(ids, lats, lons, lat, lon, k=k, radius_km=radius_km)
+
+    def query(self, lat, lon, k=20, radius_km=None, types=None):
+        """
+        Return up to k (id, distance_km) pairs sorted by distance
+        Optionally limited to radius_km and to the given location types
+        """
+        if self.size == 0 or k <= 0:
+            return []
+
+        wanted_codes = self.type_mask_codes(types)
+        if wanted_codes is not None and len(wanted_codes) == 0:
+            return []
+
+        row = int(self._cell_rows(np.float64(lat)))
+        col = int(self._cell_cols(np.float64(lon)))
+        max_ring = max(self.n_lat, self.n_lon // 2 + 1)
+
+        best_idx = np.empty(0, dtype=np.int64)
+        best_dist = np.empty(0, dtype=np.float64)
+
+        for r in range(max_ring + 1):
+            slices = self._ring_slices(row, col, r)
+            if slices:
+                idx = np.concatenate([np.arange(start, end) for start, end in slices])
+                if wanted_codes is not None:
+                    idx = idx[np.isin(self.type_codes[idx], wanted_codes)]
+                if len(idx):
+                    dist = haversine_km(lat, lon, self.lats[idx], self.lons[idx])
+                    if radius_km is not None:
+                        keep = dist <= radius_km
+                        idx, dist = idx[keep], dist[keep]
+                    best_idx = np.concatenate((best_idx, idx))
+                    best_dist = np.concatenate((best_dist, dist))
+                    if len(best_dist) > k:
+                        top = np.argpartition(best_dist, k - 1)[:k]
+                        best_idx, best_dist = best_idx[top], best_dist[top]
+
+            bound = self._unscanned_bound_km(lat, row, col, lon, r)
+            if radius_km is not None and bound > radius_km:
+                break
+            if len(best_dist) >= k and best_dist.max() <= bound:
+                break
+            if bound == math.inf:
+                break
+            if r >= self.max_scan_rings:
+                return self._brute_force(lat, lon, k, radius_km, wanted_codes)
+
+        order = np.argsort(best_dist, kind='stable')
+        return [(int(self.ids[i]), float(d)) for i, d in zip(best_idx[order], best_dist[order])]
+
+
+def to_unit_vectors(lats, lons):
+    lats, lons = np.radians(lats), np.radians(lons)
+    cos_lat = np.cos(lats)
+    return np.column_stack((cos_lat * np.cos(lons), cos_lat * np.sin(lons), np.sin(lats)))
+
+
+def kmeans_centroids(lats, lons, k, weights=None, iterations=20):
+    """
+    Cluster coordinates into at most k centroids (spherical k-means on unit vectors,
+    so clusters spanning the antimeridian work). Returns (centroid_lats, centroid_lons, sizes)
+    """
+    points = to_unit_vectors(np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64))
+    n = len(points)
+    if n == 0:
+        return np.empty(0), np.empty(0), np.empty(0, dtype=np.int64)
+    weights = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64)
+    k = max(1, min(k, n))
+
+    # Deterministic k-means++ style seeding: start from the heaviest point,
+    # then repeatedly take the point farthest from the chosen centres
+    centres = [points[int(np.argmax(weights))]]
+    for _ in range(1, k):
+        similarity = np.max(points @ np.array(centres).T, axis=1)
+        candidate = int(np.argmin(similarity))
+        if similarity[candidate] >= 1 - 1e-12:
+            break  # fewer distinct locations than k
+        centres.append(points[candidate])
+    centres = np.array(centres)
+
+    for _ in range(iterations):
+        labels = np.argmax(points @ centres.T, axis=1)
+        updated = np.zeros_like(centres)
+        np.add.at(updated, labels, points * weights[:, None])
+        norms = np.linalg.norm(updated, axis=1)
+        # Keep the old centre for empty (or perfectly antipodal) clusters
+        empty = norms < 1e-12
+        updated[empty] = centres[empty]
+        norms[empty] = 1.0
+        updated /= norms[:, None]
+        if np.allclose(updated, centres):
+            break
+        centres = updated
+
+    labels = np.argmax(points @ centres.T, axis=1)
+    sizes = np.bincount(labels, minlength=len(centres))
+    keep = sizes > 0
+    centres, sizes = centres[keep], sizes[keep]
+    centre_lats = np.degrees(np.arcsin(np.clip(centres[:, 2], -1.0, 1.0)))
+    centre_lons = np.degrees(np.arctan2(centres[:, 1], centres[:, 0]))
+    return centre_lats, centre_lons, sizes
+
+
+def brute_force_nearest(ids, lats, lons, lat, lon, k=20, radius_km=None):
+    """Reference k-NN: haversine to every point, then partial sort"""
+    dist = haversine_km(lat, lon, lats, lons)
+    if radius_km is not None:
+        within = np.flatnonzero(dist <= radius_km)
+    else:
+        within = np.arange(len(dist))
+    if len(within) > k:
+        within = within[np.argpartition(dist[within], k - 1)[:k]]
+    within = within[np.argsort(dist[within], kind='stable')]
+    return [(int(ids[i]), float(dist[i])) for i in within]
+
+
+# Per-process index over the Location table
+
+_index = None
+_index_built_at = 0.0
+_index_lock = threading.Lock()
+
+
+def build_location_index():
+    from models import db, Location
+
+    rows = db.session.query(
+        Location.id, Location.latitude, Location.longitude, Location.type
+    ).all()
+    if not rows:
+        return GeoIndex([], [], [], [])
+    ids, lats, lons, types = zip(*rows)
+    return GeoIndex(ids, lats, lons, types)
+
+
+def get_location_index(app):
+    """Return the cached location index, rebuilding it if invalidated or too old"""
+    global _index, _index_built_at
+
+    max_age = app.config.get('GEO_INDEX_MAX_AGE', 300)
+    index = _index
+    if index is not None and (not max_age or time.monotonic() - _index_built_at < max_age):
+        return index
+
+    with _index_lock:
+        if _index is None or (max_age and time.monotonic() - _index_built_at >= max_age):
+            _index = build_location_index()
+            _index_built_at = time.monotonic()
+        return _index
+
+
+@on_catalog_change
+def invalidate_location_index(app=None):
+    global _index
+    _index = None
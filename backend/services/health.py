@@ -0,0 +1,99 @@
+"""
+Health probes and cached catalog statistics
+
+Liveness never touches the database. Readiness runs a single `SELECT 1` on
+its own connection with a timeout, so a wedged pool or database fails the
+probe instead of hanging it; concurrent probes share the check in flight. The row counts shown by /api/health are
+expensive on a large visits table, so they are served from a per-process
+cache and refreshed on a background thread at most every
+HEALTH_STATS_INTERVAL seconds; requests never wait for a count except the
+very first one in a process.
+"""
+import logging
+import threading
+import time
+
+from sqlalchemy import func, select, text
+
+from models import db, User, Location, Visit
+
+logger = logging.getLogger(__name__)
+
+_stats = None
+_stats_lock = threading.Lock()
+_refreshing = False
+_check_lock = threading.Lock()
+
+
+def check_database(app, timeout):
+    """
+    Run SELECT 1 on a fresh checkout and wait at most timeout seconds
+    Returns None when the database answered, otherwise the reason it didn't
+
+    Probes arriving while a check is still running wait on that check instead
+    of starting another, so a hung database holds at most one thread per process.
+    """
+    with _check_lock:
+        check = app.extensions.get('readiness_check')
+        if check is None or not check[0].is_alive():
+            outcome = {}
+
+            def ping():
+                try:
+                    with app.app_context(), db.engine.connect() as connection:
+                        connection.execute(text('SELECT 1'))
+                    outcome['ok'] = True
+                except Exception as e:
+                    outcome['error'] = str(e)
+
+            # A daemon thread so a hung connection can't keep the worker from exiting
+            check = (threading.Thread(target=ping, name='readiness-check', daemon=True), outcome)
+            check[0].start()
+            app.extensions['readiness_check'] = check
+    thread, outcome = check
+    thread.join(timeout)
+    if outcome.get('ok'):
+        return None
+    return outcome.get('error', f'no answer within {timeout:g} s')
+
+
+def _count_rows():
+    start = time.perf_counter()
+    counts = {
+        'users_count': db.session.scalar(select(func.count(User.id))),
+        'locations_count': db.session.scalar(select(func.count(Location.id))),
+        'visits_count': db.session.scalar(select(func.count(Visit.id))),
+    }
+    counts['refreshed_at'] = time.time()
+    counts['refresh_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return counts, time.monotonic()
+
+
+def _refresh_in_background(app):
+    global _stats, _refreshing
+    try:
+        with app.app_context():
+            _stats = _count_rows()
+            db.session.remove()
+    except Exception:
+        logger.exception("Refreshing health stats failed")
+    finally:
+        _refreshing = False
+
+
+def get_stats(app):
+    """
+    Cached row counts, refreshed in the background once older than HEALTH_STATS_INTERVAL
+    Returns (counts, age in seconds)
+    """
+    global _stats, _refreshing
+    interval = app.config.get('HEALTH_STATS_INTERVAL', 60)
+    with _stats_lock:
+        if _stats is None:
+            _stats = _count_rows()
+        elif not _refreshing and time.monotonic() - _stats[1] >= interval:
+            _refreshing = True
+            threading.Thread(target=_refresh_in_background, args=(app,),
+                             name='health-stats-refresh', daemon=True).start()
+        counts, refreshed = _stats
+    return counts, time.monotonic() - refreshed
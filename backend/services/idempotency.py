@@ -0,0 +1,206 @@
+"""
+Idempotency-Key support for unsafe endpoints
+
+A client that retries a POST after a timeout sends the same Idempotency-Key
+header both times. Views decorated with @idempotent run once per (user,
+endpoint, key): the first request claims the key, runs, and its response
+(status, body, content type) is stored for IDEMPOTENCY_TTL seconds; retries
+get the stored response back with `Idempotent-Replayed: true`, without
+touching the database.
+
+    409  the first request with this key is still running
+    422  the key was already used with a different request body
+
+5xx responses aren't stored, so a failed request can be retried with the
+same key. A claim left behind by a crashed worker expires after
+IDEMPOTENCY_LOCK_TIMEOUT seconds.
+
+Keys live in process memory (a bounded LRU), or in a shared SQLite file
+(IDEMPOTENCY_BACKEND = 'sqlite') so a retry landing on another gunicorn
+worker is recognised too.
+"""
+import hashlib
+import os
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+
+from services.lru import BoundedLRU
+from services.sqlite_store import SQLiteStore
+
+MAX_KEY_LENGTH = 255
+
+# claim() outcomes
+NEW = 'new'
+IN_PROGRESS = 'in_progress'
+MISMATCH = 'mismatch'
+DONE = 'done'
+
+
+class MemoryBackend:
+    """Per-process keys in a bounded LRU dict"""
+
+    def __init__(self, max_keys=10000):
+        self.entries = BoundedLRU(max_keys)  # key -> [fingerprint, created, response or None]
+
+    def claim(self, key, fingerprint, ttl, lock_timeout):
+        """Claim key for this request; returns (outcome, stored (status, body, content type) or None)"""
+        now = time.time()
+        with self.entries.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                stored_fingerprint, created, response = entry
+                expired = now - created > (ttl if response is not None else lock_timeout)
+                if not expired:
+                    if stored_fingerprint != fingerprint:
+                        return MISMATCH, None
+                    return (DONE, response) if response is not None else (IN_PROGRESS, None)
+            self.entries.put(key, [fingerprint, now, None])
+        return NEW, None
+
+    def complete(self, key, status, body, content_type):
+        with self.entries.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry[1] = time.time()
+                entry[2] = (status, body, content_type)
+
+    def release(self, key):
+        self.entries.pop(key)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    created REAL NOT NULL,
+    status INTEGER,
+    body BLOB,
+    content_type TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_idempotency_keys_created ON idempotency_keys (created);
+"""
+
+
+class SQLiteBackend(SQLiteStore):
+    """Keys shared between processes through a small SQLite file (WAL mode)"""
+
+    # Every this many claims, drop expired keys and cap the table at max_keys
+    PURGE_EVERY = 1000
+
+    def __init__(self, path, max_keys=100000):
+        super().__init__(path, SCHEMA)
+        self.max_keys = max_keys
+        self.calls = 0
+
+    def claim(self, key, fingerprint, ttl, lock_timeout):
+        now = time.time()  # wall clock, comparable across processes
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT fingerprint, created, status, body, content_type FROM idempotency_keys WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None:
+                stored_fingerprint, created, status, body, content_type = row
+                if now - created <= (ttl if status is not None else lock_timeout):
+                    connection.execute('COMMIT')
+                    if stored_fingerprint != fingerprint:
+                        return MISMATCH, None
+                    return (DONE, (status, body, content_type)) if status is not None else (IN_PROGRESS, None)
+            connection.execute(
+                'INSERT OR REPLACE INTO idempotency_keys (key, fingerprint, created) VALUES (?, ?, ?)',
+                (key, fingerprint, now)
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+        self.calls += 1
+        if self.calls % self.PURGE_EVERY == 0:
+            self.purge(ttl)
+        return NEW, None
+
+    def complete(self, key, status, body, content_type):
+        self._connection().execute(
+            'UPDATE idempotency_keys SET created = ?, status = ?, body = ?, content_type = ? WHERE key = ?',
+            (time.time(), status, body, content_type, key)
+        )
+
+    def release(self, key):
+        self._connection().execute('DELETE FROM idempotency_keys WHERE key = ?', (key,))
+
+    def purge(self, older_than):
+        """Drop keys older than older_than seconds, then the oldest beyond max_keys"""
+        connection = self._connection()
+        connection.execute('DELETE FROM idempotency_keys WHERE created < ?', (time.time() - older_than,))
+        connection.execute(
+            'DELETE FROM idempotency_keys WHERE created < ('
+            'SELECT created FROM idempotency_keys ORDER BY created DESC LIMIT 1 OFFSET ?)',
+            (self.max_keys,)
+        )
+
+
+def init_idempotency(app):
+    """Create the configured idempotency key store for this app"""
+    app.config.setdefault('IDEMPOTENCY_ENABLED', True)
+    app.config.setdefault('IDEMPOTENCY_BACKEND', 'memory')
+    app.config.setdefault('IDEMPOTENCY_SQLITE_PATH', None)
+    app.config.setdefault('IDEMPOTENCY_TTL', 86400)
+    app.config.setdefault('IDEMPOTENCY_LOCK_TIMEOUT', 30)
+    app.config.setdefault('IDEMPOTENCY_MAX_KEYS', 10000)
+    if app.config['IDEMPOTENCY_BACKEND'] == 'sqlite':
+        path = app.config['IDEMPOTENCY_SQLITE_PATH'] or os.path.join(app.instance_path, 'idempotency.db')
+        store = SQLiteBackend(path, app.config['IDEMPOTENCY_MAX_KEYS'])
+    else:
+        store = MemoryBackend(app.config['IDEMPOTENCY_MAX_KEYS'])
+    app.extensions['idempotency'] = store
+    return store
+
+
+def _replay(stored):
+    status, body, content_type = stored
+    response = current_app.response_class(body, status=status, content_type=content_type)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """
+    Run the view once per Idempotency-Key and replay its response to retries
+    Goes below @jwt_required so keys are scoped to the caller; requests without the header run normally
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        config = current_app.config
+        store = current_app.extensions.get('idempotency')
+        header = request.headers.get('Idempotency-Key')
+        if not header or not config.get('IDEMPOTENCY_ENABLED', True) or store is None:
+            return view(*args, **kwargs)
+        if len(header) > MAX_KEY_LENGTH:
+            return jsonify({'message': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+        key = f'{get_jwt_identity()}:{request.endpoint}:{header}'
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+        outcome, stored = store.claim(key, fingerprint, config['IDEMPOTENCY_TTL'], config['IDEMPOTENCY_LOCK_TIMEOUT'])
+        if outcome == DONE:
+            return _replay(stored)
+        if outcome == IN_PROGRESS:
+            return jsonify({'message': 'A request with this Idempotency-Key is still being processed'}), 409
+        if outcome == MISMATCH:
+            return jsonify({'message': 'Idempotency-Key was already used with a different request'}), 422
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BaseException:
+            store.release(key)
+            raise
+        if response.status_code >= 500 or response.is_streamed:
+            store.release(key)  # let the client retry for real
+        else:
+            store.complete(key, response.status_code, response.get_data(), response.content_type)
+        return response
+    return wrapper
@@ -0,0 +1,211 @@
+"""
+Structured, non-blocking logging
+
+Request handlers log through the standard `logging` module. Records are put on
+a bounded in-memory queue and formatted/written by a background listener
+thread, so a request never waits on stdout. When the queue is full, records
+are dropped and counted rather than blocking the request.
+
+Config:
+    LOG_LEVEL          root level, e.g. 'INFO'
+    LOG_LEVELS         per-module overrides, e.g. 'api.visits=DEBUG,auth=WARNING'
+    LOG_SAMPLE_RATES   keep only a fraction of sub-WARNING records from hot loggers,
+                       e.g. 'api.visits=0.1'
+    LOG_FORMAT         'json' (one object per line) or 'text'
+    LOG_ASYNC          false writes synchronously (useful when debugging)
+    LOG_QUEUE_SIZE     records buffered before dropping
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+# Attributes every LogRecord has; anything else came in through `extra=` and is a field
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the message and any extra= fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 6),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human readable lines, extra= fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = ' '.join(
+            f'{key}={value}' for key, value in vars(record).items()
+            if key not in _STANDARD_ATTRS and not key.startswith('_')
+        )
+        return f'{line} {fields}' if fields else line
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of DEBUG/INFO records from the configured loggers; warnings always pass"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        name = record.name
+        while name:
+            rate = self.rates.get(name)
+            if rate is not None:
+                return rate >= 1 or random.random() < rate
+            name = name.rpartition('.')[0]
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: records are dropped (and counted) when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Format the message now (arguments may change later) but leave formatting
+        # of the full line, which is the expensive part, to the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_mapping(value, cast):
+    """Parse 'a=1,b.c=2' into {'a': cast('1'), 'b.c': cast('2')}"""
+    mapping = {}
+    for item in (value or '').split(','):
+        name, sep, setting = item.partition('=')
+        if sep and name.strip():
+            mapping[name.strip()] = cast(setting.strip())
+    return mapping
+
+
+_configured = False
+_listener = None
+_queue_handler = None
+_listener_lock = threading.Lock()
+
+
+def _start_listener(log_queue, handler):
+    global _listener
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_listener_after_fork():
+    # The listener thread does not survive fork(); gunicorn preload forks after init.
+    # The child also needs a fresh queue: the parent's listener was waiting on the
+    # old one, and its stale waiter would swallow the child's wakeups.
+    if _queue_handler is not None and _listener is not None:
+        _queue_handler.queue = queue.Queue(maxsize=_queue_handler.queue.maxsize)
+        _start_listener(_queue_handler.queue, _listener.handlers[0])
+
+
+def _stop_listener():
+    # Flush what is still queued when the process exits
+    if _listener is not None and _listener._thread is not None:
+        try:
+            _listener.stop()
+        except queue.Full:
+            pass
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
+atexit.register(_stop_listener)
+
+
+def init_logging(app):
+    """Configure logging once per process from the app config"""
+    global _configured, _queue_handler
+    from services.metrics import register_collector
+
+    config = app.config
+    register_collector(logging_metrics, {
+        'log_records_dropped_total': 'Log records dropped because the log queue was full',
+        'log_queue_depth': 'Log records waiting to be written',
+    })
+
+    with _listener_lock:
+        if _configured:
+            return
+        _configured = True
+        root = logging.getLogger()
+
+        handler = logging.StreamHandler(sys.stdout)
+        formatter = JsonFormatter() if config.get('LOG_FORMAT', 'json') == 'json' else TextFormatter()
+        handler.setFormatter(formatter)
+
+        sampling = SamplingFilter(parse_mapping(config.get('LOG_SAMPLE_RATES'), float))
+
+        root.setLevel(config.get('LOG_LEVEL', 'INFO').upper())
+        for name, level in parse_mapping(config.get('LOG_LEVELS'), str.upper).items():
+            logging.getLogger(name).setLevel(level)
+
+        if config.get('LOG_ASYNC', True):
+            log_queue = queue.Queue(maxsize=config.get('LOG_QUEUE_SIZE', 10000))
+            _queue_handler = DroppingQueueHandler(log_queue)
+            _queue_handler.addFilter(sampling)
+            root.addHandler(_queue_handler)
+            _start_listener(log_queue, handler)
+        else:
+            handler.addFilter(sampling)
+            root.addHandler(handler)
+
+
+def dropped_log_records():
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def logging_metrics():
+    values = [('log_records_dropped_total', 'counter', {}, dropped_log_records())]
+    if _queue_handler is not None:
+        values.append(('log_queue_depth', 'gauge', {}, _queue_handler.queue.qsize()))
+    return values
+
+
+def flush_logging(timeout=5.0):
+    """Wait (up to timeout) until queued records have been written"""
+    if _queue_handler is None:
+        return
+    deadline = time.monotonic() + timeout
+    while not _queue_handler.queue.empty() and time.monotonic() < deadline:
+        time.sleep(0.01)
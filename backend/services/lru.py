@@ -0,0 +1,52 @@
+"""
+Bounded least-recently-used map for per-process caches
+
+Rate limit buckets, idempotency keys and cached identities each keep at most
+a fixed number of entries in memory. BoundedLRU's methods are thread-safe;
+a read-modify-write that must be atomic holds `lru.lock` (reentrant) around
+the calls.
+"""
+import threading
+from collections import OrderedDict
+
+
+class BoundedLRU:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.RLock()
+
+    def get(self, key, default=None):
+        """Value for key (now the most recently used), or default"""
+        with self.lock:
+            if key not in self.entries:
+                return default
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        """Store value as the most recently used, evicting the least recently used beyond max_size"""
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self.lock:
+            return self.entries.pop(key, default)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __iter__(self):
+        # A snapshot, least recently used first, so callers may iterate while others write
+        with self.lock:
+            return iter(list(self.entries))
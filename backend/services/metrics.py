@@ -0,0 +1,389 @@
+"""
+Prometheus metrics
+
+Each process keeps its counters and histograms in memory (a dict update per
+request). When METRICS_DIR is set, every process also dumps its values to
+METRICS_DIR/metrics-<pid>.json every METRICS_FLUSH_INTERVAL seconds, and
+/metrics adds up the files of all gunicorn workers. Files of workers that
+have exited are folded into an archive file so counters never go backwards.
+
+Exposed:
+    http_requests_total{endpoint,method,status}
+    http_request_duration_seconds{endpoint}          histogram
+    db_queries_per_request{endpoint}                 histogram
+    db_query_seconds_total{endpoint}
+    gunicorn_workers, per-worker memory/start time/requests (labelled by pid)
+    plus whatever register_collector() callbacks report (e.g. cache hits)
+"""
+import atexit
+import bisect
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, request
+
+from services.sql_timing import observe_statements
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+HELP = {
+    'http_requests_total': 'Requests handled, by endpoint, method and status',
+    'http_request_duration_seconds': 'Time from request start to response, by endpoint',
+    'db_queries_per_request': 'SQL statements executed per request',
+    'db_query_seconds_total': 'Time spent executing SQL, by endpoint',
+    'gunicorn_workers': 'Worker processes that reported metrics',
+}
+
+
+class Registry:
+    """Counters and fixed-bucket histograms for one process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self.request_series = {}  # (endpoint, method, status) -> what record_request updates
+
+    def _histogram(self, name, labels, buckets):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+        return histogram
+
+    def inc(self, name, labels, value=1.0):
+        with self.lock:
+            self.counters[(name, labels)] += value
+
+    def observe(self, name, labels, value, buckets):
+        with self.lock:
+            histogram = self._histogram(name, labels, buckets)
+            histogram[bisect.bisect_left(buckets, value)] += 1
+            histogram[-1] += value
+
+    def record_request(self, endpoint, method, status, seconds, queries, db_seconds):
+        """
+        Everything one request adds, under a single lock acquisition; label
+        tuples and histograms are looked up once per endpoint/method/status
+        """
+        key = (endpoint, method, status)
+        with self.lock:
+            series = self.request_series.get(key)
+            if series is None:
+                labels = (('endpoint', endpoint),)
+                series = self.request_series[key] = (
+                    ('http_requests_total', labels + (('method', method), ('status', str(status)))),
+                    self._histogram('http_request_duration_seconds', labels, LATENCY_BUCKETS),
+                    self._histogram('db_queries_per_request', labels, QUERY_COUNT_BUCKETS),
+                    ('db_query_seconds_total', labels),
+                )
+            count_key, latency, query_counts, db_key = series
+            self.counters[count_key] += 1
+            latency[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            latency[-1] += seconds
+            query_counts[bisect.bisect_left(QUERY_COUNT_BUCKETS, queries)] += 1
+            query_counts[-1] += queries
+            if db_seconds:
+                self.counters[db_key] += db_seconds
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(values)] for (name, labels), values in self.histograms.items()],
+            }
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.request_series.clear()
+
+
+registry = Registry()
+_collectors = []
+_buckets = {
+    'http_request_duration_seconds': LATENCY_BUCKETS,
+    'db_queries_per_request': QUERY_COUNT_BUCKETS,
+}
+
+
+def register_collector(callback, help_text=None):
+    """
+    Register callback() -> [(name, type, labels dict, value)] evaluated on each scrape/flush,
+    for values other modules already track (cache hits, queue drops, ...).
+    help_text maps metric name -> help string.
+    """
+    if callback not in _collectors:
+        _collectors.append(callback)
+    for name, text in (help_text or {}).items():
+        HELP.setdefault(name, text)
+    return callback
+
+
+# Per-request SQL statistics, filled in by the shared statement timer (services/sql_timing.py)
+
+class _RequestStats(threading.local):
+    active = False
+    start = 0.0
+    queries = 0
+    db_seconds = 0.0
+
+
+request_stats = _RequestStats()
+
+
+def _count_query(token, statement, parameters, executemany, seconds):
+    request_stats.queries += 1
+    request_stats.db_seconds += seconds
+
+
+# Multi-process aggregation
+
+def _metrics_path(directory, pid):
+    return os.path.join(directory, f'metrics-{pid}.json')
+
+
+def _collect_process_values():
+    """Values from the registered collectors, as snapshot-style lists"""
+    gauges, counters = [], []
+    for callback in _collectors:
+        for name, kind, labels, value in callback():
+            entry = [name, sorted(labels.items()), value]
+            (counters if kind == 'counter' else gauges).append(entry)
+    return gauges, counters
+
+
+def _process_snapshot():
+    snapshot = registry.snapshot()
+    gauges, counters = _collect_process_values()
+    snapshot['counters'].extend(counters)
+    snapshot['gauges'] = gauges
+    snapshot['pid'] = os.getpid()
+    return snapshot
+
+
+class _Flusher:
+    """Writes this process's snapshot to the shared directory now and then"""
+
+    def __init__(self, directory, interval):
+        self.directory = directory
+        self.interval = interval
+        self.next_flush = 0.0
+
+    def maybe_flush(self, now):
+        if now >= self.next_flush:
+            self.next_flush = now + self.interval
+            self.flush()
+
+    def flush(self):
+        path = _metrics_path(self.directory, os.getpid())
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(_process_snapshot(), f)
+        os.replace(tmp_path, path)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(total, snapshot, keep_gauges=True):
+    for name, labels, value in snapshot.get('counters', ()):
+        total['counters'][(name, tuple(map(tuple, labels)))] += value
+    for name, labels, values in snapshot.get('histograms', ()):
+        key = (name, tuple(map(tuple, labels)))
+        current = total['histograms'].get(key)
+        total['histograms'][key] = values if current is None else [a + b for a, b in zip(current, values)]
+    if keep_gauges:
+        pid = str(snapshot.get('pid', ''))
+        for name, labels, value in snapshot.get('gauges', ()):
+            total['gauges'][(name, tuple(map(tuple, labels)) + (('pid', pid),))] = value
+
+
+def _new_total():
+    return {'counters': defaultdict(float), 'histograms': {}, 'gauges': {}}
+
+
+def aggregate(directory):
+    """Add up the snapshots of every process that wrote to directory"""
+    total = _new_total()
+    archive_path = os.path.join(directory, 'archive.json')
+
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        archive = _new_total()
+        if os.path.exists(archive_path):
+            with open(archive_path) as f:
+                _merge(archive, json.load(f), keep_gauges=False)
+
+        archived = False
+        workers = 1  # this process
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            pid = int(os.path.basename(path)[len('metrics-'):-len('.json')])
+            if pid == os.getpid():
+                continue  # our own values are read live below
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if _pid_alive(pid):
+                _merge(total, snapshot)
+                workers += 1
+            else:
+                # Keep an exited worker's counters, drop its gauges and file
+                _merge(archive, snapshot, keep_gauges=False)
+                os.remove(path)
+                archived = True
+
+        if archived:
+            tmp_path = f'{archive_path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(_to_snapshot(archive), f)
+            os.replace(tmp_path, archive_path)
+
+    _merge(total, _to_snapshot(archive), keep_gauges=False)
+    _merge(total, _process_snapshot())
+    total['gauges'][('gunicorn_workers', ())] = workers
+    return total
+
+
+def _to_snapshot(total):
+    return {
+        'counters': [[name, list(labels), value] for (name, labels), value in total['counters'].items()],
+        'histograms': [[name, list(labels), values] for (name, labels), values in total['histograms'].items()],
+    }
+
+
+# Exposition
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(total):
+    """Prometheus text exposition (format 0.0.4) of aggregated values"""
+    families = defaultdict(list)
+    kinds = {}
+    for (name, labels), value in sorted(total['counters'].items()):
+        kinds[name] = 'counter'
+        families[name].append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+    for (name, labels), value in sorted(total['gauges'].items()):
+        kinds[name] = 'gauge'
+        families[name].append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+    for (name, labels), values in sorted(total['histograms'].items()):
+        kinds[name] = 'histogram'
+        buckets = _buckets.get(name, ())
+        cumulative = 0
+        for bound, count in zip(list(buckets) + [float('inf')], values[:-1]):
+            cumulative += count
+            le = (('le', _format_number(float(bound))),)
+            families[name].append(f'{name}_bucket{_format_labels(labels, le)} {cumulative}')
+        families[name].append(f'{name}_sum{_format_labels(labels)} {_format_number(values[-1])}')
+        families[name].append(f'{name}_count{_format_labels(labels)} {cumulative}')
+
+    lines = []
+    for name in sorted(families):
+        help_text = HELP.get(name, name)
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kinds[name]}')
+        lines.extend(families[name])
+    return '\n'.join(lines) + '\n'
+
+
+def process_collector():
+    """Per-process resource gauges"""
+    values = [('process_start_time_seconds', 'gauge', {}, _process_start)]
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        values.append(('process_resident_memory_bytes', 'gauge', {}, resident_pages * os.sysconf('SC_PAGE_SIZE')))
+    except (OSError, ValueError):
+        pass
+    values.append(('worker_requests_handled', 'gauge', {}, _requests_handled[0]))
+    return values
+
+
+_process_start = time.time()
+_requests_handled = [0]
+
+
+def init_metrics(app):
+    """Instrument requests and SQL, and serve /metrics"""
+    app.config.setdefault('METRICS_ENABLED', True)
+    app.config.setdefault('METRICS_DIR', None)
+    app.config.setdefault('METRICS_FLUSH_INTERVAL', 5)
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    observe_statements('metrics', lambda: request_stats.active, on_end=_count_query)
+    register_collector(process_collector, {
+        'process_start_time_seconds': 'Start time of the worker process (unix seconds)',
+        'process_resident_memory_bytes': 'Resident memory of the worker process',
+        'worker_requests_handled': 'Requests handled by this worker since it started',
+    })
+
+    directory = app.config['METRICS_DIR']
+    flusher = None
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        flusher = _Flusher(directory, app.config['METRICS_FLUSH_INTERVAL'])
+        atexit.register(flusher.flush)
+
+    perf_counter = time.perf_counter
+
+    @app.before_request
+    def start_timer():
+        stats = request_stats
+        stats.active = True
+        stats.queries = 0
+        stats.db_seconds = 0.0
+        stats.start = perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        now = perf_counter()
+        stats = request_stats
+        if not stats.active:
+            return response
+        stats.active = False
+        current = request._get_current_object()  # one context lookup instead of one per attribute
+        registry.record_request(current.endpoint or 'unmatched', current.method, response.status_code,
+                                now - stats.start, stats.queries, stats.db_seconds)
+        _requests_handled[0] += 1
+        if flusher is not None:
+            flusher.maybe_flush(now)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        if directory:
+            total = aggregate(directory)
+        else:
+            total = _new_total()
+            _merge(total, _process_snapshot())
+        return Response(render(total), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,148 @@
+"""
+Password hashing in a bounded process pool
+
+werkzeug's password hashes are deliberately slow (~0.2 s of CPU each). Running
+them in a small per-process pool caps how much CPU a login storm can take from
+the rest of the API, and the queue-depth limit makes excess attempts fail fast
+with PasswordHasherBusy instead of piling up behind each other.
+
+Under gevent workers the hash runs in gevent's native thread pool instead
+(pbkdf2 releases the GIL), so it neither blocks the event loop nor needs
+the process pool's helper threads to cooperate with greenlets.
+"""
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app, has_app_context, has_request_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULTS = {
+    'PASSWORD_HASH_WORKERS': 2,  # 0 hashes inline in the request thread
+    'PASSWORD_HASH_MAX_QUEUE': 8,  # hashes running or waiting before we reject
+    'PASSWORD_HASH_QUEUE_TIMEOUT': 0.05,  # seconds to wait for a queue slot
+    'PASSWORD_HASH_TIMEOUT': 10,  # seconds to wait for a queued hash to finish
+}
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full; callers should answer 503"""
+
+    def __init__(self, retry_after=1):
+        super().__init__('Password hashing queue is full')
+        self.retry_after = retry_after
+
+
+_pool = None
+_pool_pid = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+
+
+def _setting(name):
+    if has_app_context():
+        return current_app.config.get(name, DEFAULTS[name])
+    return DEFAULTS[name]
+
+
+def _get_pool():
+    """Create the pool lazily, and again after a fork (gunicorn workers each get their own)"""
+    global _pool, _pool_pid, _pool_slots
+    if _pool is not None and _pool_pid == os.getpid():
+        return _pool, _pool_slots
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # spawn, not fork: the children only need werkzeug, never our DB connections
+            _pool = ProcessPoolExecutor(
+                max_workers=_setting('PASSWORD_HASH_WORKERS'),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+            _pool_slots = threading.BoundedSemaphore(_setting('PASSWORD_HASH_MAX_QUEUE'))
+            _pool_pid = os.getpid()
+        return _pool, _pool_slots
+
+
+def _get_green_pool():
+    """
+    A gevent native-thread pool sized like the process pool when running in a
+    monkey-patched gevent worker, else None
+    """
+    global _pool, _pool_pid, _pool_slots
+    monkey = sys.modules.get('gevent.monkey')  # only ever imported to patch
+    if monkey is None or not monkey.is_module_patched('threading'):
+        return None
+
+    if _pool is None or _pool_pid != os.getpid():
+        from gevent.threadpool import ThreadPool
+        _pool = ThreadPool(_setting('PASSWORD_HASH_WORKERS'))
+        _pool_slots = threading.BoundedSemaphore(_setting('PASSWORD_HASH_MAX_QUEUE'))
+        _pool_pid = os.getpid()
+    return _pool, _pool_slots
+
+
+def _run_green(pool, slots, fn, *args):
+    if not slots.acquire(timeout=_setting('PASSWORD_HASH_QUEUE_TIMEOUT')):
+        raise PasswordHasherBusy()
+    try:
+        return pool.apply(fn, args)
+    finally:
+        slots.release()
+
+
+def _run(fn, *args):
+    # Scripts (seeding, CLI) hash inline; spawned children would re-import their __main__
+    if not has_request_context() or _setting('PASSWORD_HASH_WORKERS') <= 0:
+        return fn(*args)
+
+    green = _get_green_pool()
+    if green is not None:
+        return _run_green(*green, fn, *args)
+
+    pool, slots = _get_pool()
+    if not slots.acquire(timeout=_setting('PASSWORD_HASH_QUEUE_TIMEOUT')):
+        raise PasswordHasherBusy()
+    try:
+        future = pool.submit(fn, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM killed); start a fresh pool next time
+        slots.release()
+        shutdown_pool()
+        raise PasswordHasherBusy()
+    except BaseException:
+        slots.release()
+        raise
+
+    # The slot frees when the hash finishes, even if we stop waiting for it
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=_setting('PASSWORD_HASH_TIMEOUT'))
+    except FutureTimeoutError:
+        raise PasswordHasherBusy()
+    except BrokenProcessPool:
+        shutdown_pool()
+        raise PasswordHasherBusy()
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password)
+
+
+def verify_password(password_hash, password):
+    if not password_hash:
+        return False
+    return _run(check_password_hash, password_hash, password)
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            if isinstance(_pool, ProcessPoolExecutor):
+                _pool.shutdown(wait=False, cancel_futures=True)
+            else:
+                _pool.kill()
+        _pool = None
@@ -0,0 +1,174 @@
+"""
+Token-bucket rate limiting
+
+A limit like "10/minute" is a bucket holding up to 10 tokens that refills at
+10 tokens per minute; each request takes one token. Buckets live in process
+memory by default, or in a shared SQLite file so every gunicorn worker sees
+the same counts (RATE_LIMIT_BACKEND = 'sqlite').
+"""
+import math
+import os
+import time
+from functools import lru_cache, wraps
+
+from flask import current_app, jsonify, request
+
+from services.lru import BoundedLRU
+from services.sqlite_store import SQLiteStore
+
+PERIODS = {
+    'second': 1,
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400,
+}
+
+
+@lru_cache(maxsize=64)
+def parse_limit(limit):
+    """Parse '10/minute' (or '10/30 seconds') into (capacity, tokens per second)"""
+    count, _, period = limit.partition('/')
+    period = period.strip().lower()
+    amount, _, unit = period.rpartition(' ')
+    unit = unit.rstrip('s') if unit not in PERIODS else unit
+    if unit not in PERIODS:
+        raise ValueError(f'Invalid rate limit: {limit!r}')
+    seconds = PERIODS[unit] * (float(amount) if amount else 1)
+    capacity = float(count)
+    return capacity, capacity / seconds
+
+
+def _refill(tokens, updated, now, capacity, rate):
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+class MemoryBackend:
+    """Per-process buckets in a bounded LRU dict"""
+
+    def __init__(self, max_keys=100000):
+        self.buckets = BoundedLRU(max_keys)
+
+    def take(self, key, capacity, rate, cost=1.0):
+        """Take cost tokens; returns (allowed, seconds until enough tokens)"""
+        now = time.monotonic()
+        with self.buckets.lock:
+            tokens, updated = self.buckets.get(key, (capacity, now))
+            tokens = _refill(tokens, updated, now, capacity, rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self.buckets.put(key, (tokens, now))
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def reset(self):
+        self.buckets.clear()
+
+
+class SQLiteBackend(SQLiteStore):
+    """Buckets shared between processes through a small SQLite file (WAL mode)"""
+
+    # Every this many takes, drop buckets idle for a day so the table stays small
+    PURGE_EVERY = 10000
+
+    def __init__(self, path):
+        # synchronous=OFF: losing a few tokens on a crash is fine
+        super().__init__(path, 'CREATE TABLE IF NOT EXISTS buckets ('
+                               'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)',
+                         synchronous='OFF')
+        self.calls = 0
+
+    def take(self, key, capacity, rate, cost=1.0):
+        now = time.time()  # wall clock, comparable across processes
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT tokens, updated FROM buckets WHERE key = ?', (key,)
+            ).fetchone()
+            tokens = _refill(*row, now, capacity, rate) if row else capacity
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            connection.execute(
+                'INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                (key, tokens, now)
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+        self.calls += 1
+        if self.calls % self.PURGE_EVERY == 0:
+            self.purge(PERIODS['day'])
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def reset(self):
+        self._connection().execute('DELETE FROM buckets')
+
+    def purge(self, older_than):
+        """Drop buckets idle for longer than older_than seconds (they'd be full anyway)"""
+        self._connection().execute('DELETE FROM buckets WHERE updated < ?', (time.time() - older_than,))
+
+
+def init_rate_limiter(app):
+    """Create the configured rate limit backend for this app"""
+    if app.config.get('RATE_LIMIT_BACKEND', 'memory') == 'sqlite':
+        path = app.config.get('RATE_LIMIT_SQLITE_PATH') or os.path.join(app.instance_path, 'rate_limits.db')
+        backend = SQLiteBackend(path)
+    else:
+        backend = MemoryBackend(app.config.get('RATE_LIMIT_MAX_KEYS', 100000))
+    app.extensions['rate_limiter'] = backend
+    return backend
+
+
+def client_ip():
+    """Client address, honouring X-Forwarded-For only for the configured number of proxies"""
+    hops = current_app.config.get('RATE_LIMIT_PROXY_HOPS', 0)
+    forwarded = request.headers.get('X-Forwarded-For')
+    if hops and forwarded:
+        addresses = [address.strip() for address in forwarded.split(',')]
+        if len(addresses) >= hops:
+            return addresses[-hops]
+    return request.remote_addr or 'unknown'
+
+
+def json_field(name):
+    """Key function using a field of the JSON body, e.g. the username being logged into"""
+    def key():
+        data = request.get_json(silent=True)
+        value = data.get(name) if isinstance(data, dict) else None
+        return str(value).lower() if value else None
+    return key
+
+
+def rate_limit(scope, limit_setting, key=client_ip):
+    """
+    Decorator applying the token bucket named by the config setting limit_setting
+    (e.g. AUTH_RATE_LIMIT_IP = '20/minute') to the key returned by key().
+    Requests with no key (e.g. missing username) are not limited by this rule.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            config = current_app.config
+            limit = config.get(limit_setting)
+            backend = current_app.extensions.get('rate_limiter')
+            if not config.get('RATE_LIMIT_ENABLED', True) or not limit or backend is None:
+                return view(*args, **kwargs)
+
+            bucket_key = key()
+            if bucket_key is None:
+                return view(*args, **kwargs)
+
+            capacity, rate = parse_limit(limit)
+            allowed, retry_after = backend.take(
+                f'{request.endpoint}:{scope}:{bucket_key}', capacity, rate
+            )
+            if not allowed:
+                response = jsonify({'message': 'Too many requests, please try again later'})
+                response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+                return response, 429
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
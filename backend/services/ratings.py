@@ -0,0 +1,100 @@
+"""
+Visit-derived location ratings
+
+Each location keeps rating_count/rating_sum over the ratings in its visits and a
+Bayesian average that starts at the seeded (editorial) rating and moves towards
+the visitors' average as ratings accumulate:
+
+    bayesian_rating = (C * prior + rating_sum) / (C + rating_count)
+
+C is RATING_PRIOR_WEIGHT (how many visitor ratings the prior is worth) and the
+prior is Location.rating, or RATING_PRIOR_MEAN for unrated locations.
+"""
+from flask import current_app
+from sqlalchemy import bindparam, func
+
+from models import db, Location, Visit
+
+
+def _prior_settings():
+    config = current_app.config
+    return config.get('RATING_PRIOR_WEIGHT', 5), config.get('RATING_PRIOR_MEAN', 3.5)
+
+
+def bayesian_expression(count, total):
+    """SQL expression for the Bayesian average given count/sum expressions"""
+    weight, mean = _prior_settings()
+    return (weight * func.coalesce(Location.rating, mean) + total) / (weight + count)
+
+
+def rating_delta(old_rating=None, new_rating=None):
+    """(count delta, sum delta) of one visit rating being added, changed or removed"""
+    return (new_rating is not None) - (old_rating is not None), (new_rating or 0) - (old_rating or 0)
+
+
+def apply_rating_change(location_id, old_rating=None, new_rating=None):
+    """
+    Adjust a location's aggregates for one visit rating being added, changed or removed
+    Runs as a single UPDATE in the caller's transaction, so concurrent writers don't lose counts
+    """
+    count_delta, sum_delta = rating_delta(old_rating, new_rating)
+    if not count_delta and not sum_delta:
+        return
+
+    new_count = Location.rating_count + count_delta
+    new_sum = Location.rating_sum + sum_delta
+    # SET expressions see the pre-update values, so spell out the new totals
+    Location.query.filter(Location.id == location_id).update({
+        Location.rating_count: new_count,
+        Location.rating_sum: new_sum,
+        Location.bayesian_rating: bayesian_expression(new_count, new_sum),
+    }, synchronize_session=False)
+
+
+def apply_rating_deltas(deltas):
+    """
+    Adjust many locations' aggregates at once, deltas maps location id -> (count delta, sum delta)
+    One executemany UPDATE in the caller's transaction (see apply_rating_change)
+    """
+    rows = [{'location_id': location_id, 'count_delta': count_delta, 'sum_delta': sum_delta}
+            for location_id, (count_delta, sum_delta) in deltas.items() if count_delta or sum_delta]
+    if not rows:
+        return
+
+    table = Location.__table__
+    new_count = table.c.rating_count + bindparam('count_delta')
+    new_sum = table.c.rating_sum + bindparam('sum_delta')
+    db.session.execute(
+        table.update()
+        .where(table.c.id == bindparam('location_id'))
+        .values(rating_count=new_count, rating_sum=new_sum, bayesian_rating=bayesian_expression(new_count, new_sum)),
+        rows
+    )
+
+
+def rebuild_rating_aggregates():
+    """
+    Recompute every location's aggregates from the visits table
+    One grouped query over visits, then bulk updates; returns the number of rated locations
+    """
+    totals = db.session.query(
+        Visit.location_id,
+        func.count(Visit.rating),
+        func.coalesce(func.sum(Visit.rating), 0),
+    ).filter(Visit.rating.isnot(None)).group_by(Visit.location_id).all()
+
+    table = Location.__table__
+    db.session.execute(table.update().values(rating_count=0, rating_sum=0))
+    if totals:
+        db.session.execute(
+            table.update()
+            .where(table.c.id == bindparam('location_id'))
+            .values(rating_count=bindparam('count'), rating_sum=bindparam('total')),
+            [{'location_id': location_id, 'count': count, 'total': total}
+             for location_id, count, total in totals]
+        )
+    db.session.execute(table.update().values(
+        bayesian_rating=bayesian_expression(table.c.rating_count, table.c.rating_sum)
+    ))
+    db.session.commit()
+    return len(totals)
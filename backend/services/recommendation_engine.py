@@ -1,33 +1,102 @@
-from models import Location, Visit, User, db
+from models import Location, Visit, db
 from sqlalchemy import func
-from collections import Counter
+from collections import Counter, defaultdict
+from flask import current_app
+import numpy as np
+from auth.identity import load_user
+from services.diversity import diversify
+from services.geo_index import get_location_index, haversine_km, kmeans_centroids
+from services.tracing import span, traced
+
+def candidate_pool_size(limit):
+    """How many top candidates to pull before diversity re-ranking"""
+    config = current_app.config
+    if config.get('DIVERSITY_WEIGHT', 0.3) <= 0:
+        return limit
+    return max(limit, config.get('DIVERSITY_POOL_SIZE', 100))
+
+# Type preferences are average ratings smoothed twice: the user's overall average towards a
+# neutral 3 stars, then each type's average towards the user's. Types the user hasn't tried
+# get that (smoothed) overall average: someone who rates everything 4-5 isn't expected to
+# dislike what they haven't seen yet, and a few visits don't make a type a certainty.
+NEUTRAL_RATING = 3
+USER_PREFERENCE_PRIOR_WEIGHT = 10
+TYPE_PREFERENCE_PRIOR_WEIGHT = 2
+
+def rerank(locations, limit, scores):
+    """Diversify candidate locations with MMR, given their relevance scores"""
+    return [locations[i] for i in diversify(locations, scores, limit, current_app.config)]
+
+def type_preferences(rated):
+    """
+    Type preferences (0-1) from (type, rating) pairs, as a defaultdict so
+    types missing from rated get the user's overall preference
+    """
+    totals = {}
+    for loc_type, rating in rated:
+        total = totals.setdefault(loc_type, [0, 0])
+        total[0] += rating
+        total[1] += 1
+    rating_sum = sum(total for total, _ in totals.values())
+    count = sum(count for _, count in totals.values())
+    overall = (rating_sum + NEUTRAL_RATING * USER_PREFERENCE_PRIOR_WEIGHT) / (count + USER_PREFERENCE_PRIOR_WEIGHT)
+    preferences = defaultdict(lambda: overall / 5)
+    for loc_type, (type_sum, type_count) in totals.items():
+        preferences[loc_type] = (
+            (type_sum + overall * TYPE_PREFERENCE_PRIOR_WEIGHT) / (type_count + TYPE_PREFERENCE_PRIOR_WEIGHT) / 5
+        )
+    return preferences
+
+def content_score(location, preferences):
+    """Relevance of a location: preference for its type times its rating, both on 0-1"""
+    return preferences[location.type] * (location.bayesian_rating or 0) / 5
+
+def preference_quotas(preferences, all_types, pool_size):
+    """Split pool_size candidate slots over every location type in proportion to the user's preference"""
+    total = sum(preferences[loc_type] for loc_type in all_types) or 1
+    return {loc_type: max(1, round(pool_size * preferences[loc_type] / total)) for loc_type in all_types}
 
 def get_recommendations(limit=10):
     """
     Get general recommendations based on highest ratings
+    Ratings are Bayesian averages of the seeded rating and visitor ratings (see services/ratings.py)
     Returns a list of location dictionaries
     """
-    # Get the highest rated locations
-    top_locations = Location.query.order_by(Location.rating.desc()).limit(limit).all()
-    return [location.to_dict() for location in top_locations]
+    # Get the highest rated locations, then mix types/regions among the best
+    top_locations = Location.query.order_by(Location.bayesian_rating.desc()).limit(candidate_pool_size(limit)).all()
+    scores = [location.bayesian_rating or 0 for location in top_locations]
+    return [location.to_dict() for location in rerank(top_locations, limit, scores)]
 
-def get_personalized_recommendations(user_id, limit=10):
+@traced('recommendations.personalized')
+def get_personalized_recommendations(user_id, limit=10, mode='content'):
     """
     Get personalized recommendations for a user based on their visit history
     Uses a simple content-based filtering approach
     
     Think of this like a "if you liked this, you might also like..." approach
+    
+    mode='geo' additionally boosts places near where the user actually travels
     """
-    user = User.query.get(user_id)
+    user = load_user(user_id)  # cached identity lookup
     if not user:
         return get_recommendations(limit)  # Fallback to general recommendations
+    user_id = user.id
     
     # Get user's visits
-    user_visits = Visit.query.filter_by(user_id=user_id).all()
+    with span('recommendations.visits') as visits_span:
+        user_visits = Visit.query.filter_by(user_id=user_id).all()
+        visits_span.set_attribute('visit_count', len(user_visits))
     
     if not user_visits:
         return get_recommendations(limit)  # No visit history, use general recommendations
     
+    if mode == 'geo':
+        return get_geo_recommendations(user_visits, limit)
+    return get_content_recommendations(user_visits, limit)
+
+
+def get_content_recommendations(user_visits, limit=10):
+    """Best rated unvisited places, mixed by the user's type preferences"""
     # Extract locations the user has visited and their ratings
     visited_location_ids = [visit.location_id for visit in user_visits]
     
@@ -36,59 +105,127 @@ def get_personalized_recommendations(user_id, limit=10):
     
     if user_rated_visits:
         # Find location types that the user rates highly
-        location_preferences = {}
-        for visit in user_rated_visits:
-            location = Location.query.get(visit.location_id)
-            if location:
-                if location.type not in location_preferences:
-                    location_preferences[location.type] = {'count': 0, 'rating_sum': 0}
-                location_preferences[location.type]['count'] += 1
-                location_preferences[location.type]['rating_sum'] += visit.rating
+        with span('recommendations.preferences', rated_visits=len(user_rated_visits)):
+            visited_types = dict(
+                Location.query.with_entities(Location.id, Location.type)
+                .filter(Location.id.in_({visit.location_id for visit in user_rated_visits})).all()
+            )
+            preferences = type_preferences(
+                (visited_types[visit.location_id], visit.rating)
+                for visit in user_rated_visits if visit.location_id in visited_types
+            )
         
-        # Calculate average rating per type
-        for loc_type in location_preferences:
-            if location_preferences[loc_type]['count'] > 0:
-                location_preferences[loc_type]['avg_rating'] = (
-                    location_preferences[loc_type]['rating_sum'] / 
-                    location_preferences[loc_type]['count']
-                )
-            else:
-                location_preferences[loc_type]['avg_rating'] = 0
-        
-        # Sort types by preference
-        preferred_types = sorted(
-            location_preferences.keys(),
-            key=lambda x: location_preferences[x]['avg_rating'],
-            reverse=True
-        )
-        
-        # Find similar locations of preferred types that the user hasn't visited
+        # Candidates of every type, the best rated first, with more slots for preferred types;
+        # filling the pool with the favourite type alone would leave MMR nothing to mix in
+        pool_size = candidate_pool_size(limit)
+        all_types = [loc_type for (loc_type,) in db.session.query(Location.type).distinct()]
+        quotas = preference_quotas(preferences, all_types, pool_size)
         recommendations = []
-        for loc_type in preferred_types:
-            similar_locations = Location.query.filter(
-                Location.type == loc_type,
-                ~Location.id.in_(visited_location_ids)
-            ).order_by(Location.rating.desc()).limit(limit).all()
+        with span('recommendations.candidates', types=len(quotas), pool_size=pool_size):
+            for loc_type, quota in quotas.items():
+                recommendations.extend(Location.query.filter(
+                    Location.type == loc_type,
+                    ~Location.id.in_(visited_location_ids)
+                ).order_by(Location.bayesian_rating.desc()).limit(quota).all())
             
-            recommendations.extend(similar_locations)
-            if len(recommendations) >= limit:
-                break
+            # Top up from any type when some types ran short of candidates
+            if len(recommendations) < pool_size:
+                additional = Location.query.filter(
+                    ~Location.id.in_(visited_location_ids),
+                    ~Location.id.in_([loc.id for loc in recommendations])
+                ).order_by(Location.bayesian_rating.desc()).limit(pool_size - len(recommendations)).all()
+                
+                recommendations.extend(additional)
         
-        # If we still need more recommendations, add some top-rated ones
-        if len(recommendations) < limit:
-            additional = Location.query.filter(
-                ~Location.id.in_(visited_location_ids),
-                ~Location.id.in_([loc.id for loc in recommendations])
-            ).order_by(Location.rating.desc()).limit(limit - len(recommendations)).all()
-            
-            recommendations.extend(additional)
-        
-        return [location.to_dict() for location in recommendations[:limit]]
+        with span('recommendations.rerank', candidates=len(recommendations)):
+            scores = [content_score(location, preferences) for location in recommendations]
+            return [location.to_dict() for location in rerank(recommendations, limit, scores)]
     
     # If no ratings, recommend top-rated locations user hasn't visited
-    return [
-        location.to_dict() 
-        for location in Location.query.filter(
-            ~Location.id.in_(visited_location_ids)
-        ).order_by(Location.rating.desc()).limit(limit).all()
-    ]
\ No newline at end of file
+    top_unvisited = Location.query.filter(
+        ~Location.id.in_(visited_location_ids)
+    ).order_by(Location.bayesian_rating.desc()).limit(candidate_pool_size(limit)).all()
+    scores = [location.bayesian_rating or 0 for location in top_unvisited]
+    return [location.to_dict() for location in rerank(top_unvisited, limit, scores)]
+
+
+@traced('recommendations.geo')
+def get_geo_recommendations(user_visits, limit=10):
+    """
+    Content-based recommendations blended with proximity to the user's travel footprint
+    
+    The visited coordinates are clustered into a few centroids (e.g. "home" and
+    "the usual holiday spot"). Candidates come from the spatial index around each
+    centroid plus the best matches of the user's preferred types anywhere, and are
+    scored as (1 - w) * content score + w * exp(-distance / decay).
+    """
+    config = current_app.config
+    visited_ids = {visit.location_id for visit in user_visits}
+    visited = {
+        location.id: location
+        for location in Location.query.filter(Location.id.in_(visited_ids)).all()
+    }
+    
+    # Type preference from the ratings the user gives each type, unrated visits count as neutral
+    type_preference = type_preferences(
+        (visited[visit.location_id].type, visit.rating if visit.rating is not None else 3)
+        for visit in user_visits if visit.location_id in visited
+    )
+    
+    # Weight centroids towards places the user liked
+    coords = [
+        (location.latitude, location.longitude, visit.rating or 3)
+        for visit in user_visits
+        for location in [visited.get(visit.location_id)] if location
+    ]
+    if not coords:
+        # Every visited place is gone, so there is no footprint to be near
+        return get_content_recommendations(user_visits, limit)
+    lats, lons, weights = (np.array(values, dtype=np.float64) for values in zip(*coords))
+    centre_lats, centre_lons, _ = kmeans_centroids(
+        lats, lons, config.get('GEO_RECOMMENDATION_CENTROIDS', 3), weights=weights
+    )
+    
+    # Candidate pool: nearest places around each centroid...
+    pool_size = max(limit * 5, config.get('GEO_RECOMMENDATION_POOL', 100))
+    index = get_location_index(current_app)
+    candidate_ids = set()
+    for lat, lon in zip(centre_lats, centre_lons):
+        candidate_ids.update(loc_id for loc_id, _ in index.query(lat, lon, k=pool_size + len(visited_ids)))
+    
+    # ...plus the best rated places of every type wherever they are, more of the preferred types
+    all_types = [loc_type for (loc_type,) in db.session.query(Location.type).distinct()]
+    for loc_type, quota in preference_quotas(type_preference, all_types, pool_size).items():
+        top_of_type = Location.query.with_entities(Location.id).filter(
+            Location.type == loc_type,
+            ~Location.id.in_(visited_ids)
+        ).order_by(Location.bayesian_rating.desc()).limit(quota).all()
+        candidate_ids.update(loc_id for (loc_id,) in top_of_type)
+    candidate_ids -= visited_ids
+    
+    if not candidate_ids:
+        return get_recommendations(limit)
+    
+    candidates = Location.query.filter(Location.id.in_(candidate_ids)).all()
+    cand_lats = np.array([location.latitude for location in candidates])
+    cand_lons = np.array([location.longitude for location in candidates])
+    
+    # Distance from every candidate to its closest centroid
+    distances = haversine_km(
+        cand_lats[:, None], cand_lons[:, None], centre_lats[None, :], centre_lons[None, :]
+    ).min(axis=1)
+    proximity = np.exp(-distances / config.get('GEO_RECOMMENDATION_DECAY_KM', 500))
+    
+    content = np.array([content_score(location, type_preference) for location in candidates])
+    weight = config.get('GEO_RECOMMENDATION_WEIGHT', 0.5)
+    scores = (1 - weight) * content + weight * proximity
+    
+    # Diversify among the best scoring candidates
+    pool = np.argsort(-scores, kind='stable')[:candidate_pool_size(limit)]
+    pool_locations = [candidates[i] for i in pool]
+    recommendations = []
+    for i in (pool[j] for j in diversify(pool_locations, scores[pool], limit, config)):
+        location_data = candidates[i].to_dict()
+        location_data['distance_km'] = round(float(distances[i]), 1)
+        recommendations.append(location_data)
+    return recommendations
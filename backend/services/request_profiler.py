@@ -0,0 +1,261 @@
+"""
+Sampled CPU profiles of live requests
+
+A REQUEST_PROFILE_RATE fraction of requests (optionally only those of the
+blueprints in REQUEST_PROFILE_BLUEPRINTS) is profiled from before_request to
+the end of after_request, so the view, to_dict() calls, JSON encoding and
+compression are all included. Each profile is written to its own file in
+REQUEST_PROFILE_DIR after the response has been sent; the oldest files are
+deleted beyond REQUEST_PROFILE_MAX_FILES.
+
+Two modes (REQUEST_PROFILE_MODE):
+
+    sampler   a native thread reads the request thread's stack every
+              REQUEST_PROFILE_INTERVAL_MS and counts identical stacks
+              (*.collapsed, one "frame;frame;frame count" line per stack).
+              Cheap enough to leave on at a low rate.
+    cprofile  deterministic cProfile of the request (*.prof, pstats format).
+              Exact call counts, but slows the profiled request down a lot.
+
+Aggregate the files into flamegraph.pl / speedscope collapsed-stack input:
+
+    flask profile-collapse [--endpoint visits.get_user_visits] [-o out.collapsed]
+    python -m services.request_profiler ...   (same options, no flask CLI needed)
+
+cProfile only records caller -> callee edges, not whole stacks, so .prof
+files contribute two-frame "caller;callee" stacks weighted by own time.
+
+Under gevent the sampler sees whichever greenlet is running on the worker
+thread, so samples taken while the profiled request waits on I/O may show
+other requests' work.
+"""
+import cProfile
+import glob
+import os
+import pstats
+import random
+import sys
+import time
+from collections import Counter
+from functools import lru_cache
+
+from flask import request
+
+MODES = ('sampler', 'cprofile')
+
+
+def _native(module, name):
+    """The unpatched _thread/time primitive when running under gevent's monkey patching"""
+    monkey = sys.modules.get('gevent.monkey')  # only ever imported to patch
+    if monkey is not None and monkey.is_module_patched(module):
+        return monkey.get_original(module, name)
+    return getattr(__import__(module), name)
+
+
+@lru_cache(maxsize=4096)
+def _frame_name(filename, function):
+    """'api/visits.py:get_user_visits', i.e. the file relative to its sys.path entry"""
+    for path in sorted(map(os.path.abspath, sys.path), key=len, reverse=True):
+        if filename.startswith(path + os.sep):
+            filename = filename[len(path) + 1:]
+            break
+    return f'{filename}:{function}'
+
+
+def collapse_stack(frame):
+    """'root;...;leaf' for a frame and its callers"""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code.co_filename, frame.f_code.co_name))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """
+    Samples the stacks of registered threads from one native background thread
+    The thread runs only while at least one thread is registered
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = _native('_thread', 'allocate_lock')()  # shared with a native thread, even under gevent
+        self.targets = {}  # native thread ident -> Counter of collapsed stacks
+        self.running = False
+
+    def start(self, ident):
+        with self.lock:
+            self.targets[ident] = Counter()
+            if not self.running:
+                self.running = True
+                # A bare OS thread: threading.Thread would wait on gevent primitives to start
+                _native('_thread', 'start_new_thread')(self._run, ())
+
+    def stop(self, ident):
+        with self.lock:
+            return self.targets.pop(ident, Counter())
+
+    def _run(self):
+        sleep = _native('time', 'sleep')
+        while True:
+            sleep(self.interval)
+            frames = sys._current_frames()
+            with self.lock:
+                if not self.targets:
+                    self.running = False
+                    return
+                for ident, stacks in self.targets.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[collapse_stack(frame)] += 1
+
+
+def _profile_path(directory, endpoint, extension):
+    return os.path.join(directory, f'{time.time():.6f}-{os.getpid()}-{endpoint}.{extension}')
+
+
+def _profile_files(directory):
+    return glob.glob(os.path.join(directory, '*.collapsed')) + glob.glob(os.path.join(directory, '*.prof'))
+
+
+def _rotate(directory, max_files):
+    files = sorted(_profile_files(directory), key=os.path.basename)
+    for path in files[:max(0, len(files) - max_files)]:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass  # another worker rotated it first
+
+
+def _write_collapsed(path, stacks):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+    os.replace(tmp_path, path)
+
+
+def profile_dir(app):
+    return app.config.get('REQUEST_PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+
+
+def init_request_profiler(app):
+    """Profile a sample of requests when REQUEST_PROFILE_RATE > 0"""
+    app.config.setdefault('REQUEST_PROFILE_RATE', 0.0)
+    app.config.setdefault('REQUEST_PROFILE_BLUEPRINTS', '')
+    app.config.setdefault('REQUEST_PROFILE_MODE', 'sampler')
+    app.config.setdefault('REQUEST_PROFILE_DIR', None)
+    app.config.setdefault('REQUEST_PROFILE_MAX_FILES', 500)
+    app.config.setdefault('REQUEST_PROFILE_INTERVAL_MS', 2)
+    rate = app.config['REQUEST_PROFILE_RATE']
+    if rate <= 0:
+        return
+
+    mode = app.config['REQUEST_PROFILE_MODE']
+    if mode not in MODES:
+        raise ValueError(f"REQUEST_PROFILE_MODE must be one of {', '.join(MODES)}, not {mode!r}")
+    blueprints = {name.strip() for name in app.config['REQUEST_PROFILE_BLUEPRINTS'].split(',') if name.strip()}
+    directory = profile_dir(app)
+    os.makedirs(directory, exist_ok=True)
+    max_files = app.config['REQUEST_PROFILE_MAX_FILES']
+    sampler = StackSampler(app.config['REQUEST_PROFILE_INTERVAL_MS'] / 1000)
+    native_ident = _native('_thread', 'get_ident')
+
+    @app.before_request
+    def start_request_profile():
+        if blueprints and request.blueprint not in blueprints:
+            return
+        if random.random() >= rate:
+            return
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            request.environ['request_profile'] = profiler
+            profiler.enable()
+        else:
+            ident = native_ident()
+            request.environ['request_profile'] = ident
+            sampler.start(ident)
+
+    @app.after_request
+    def finish_request_profile(response):
+        profile = request.environ.pop('request_profile', None)
+        if profile is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        if mode == 'cprofile':
+            profile.disable()
+            path = _profile_path(directory, endpoint, 'prof')
+            write = lambda: profile.dump_stats(path)
+        else:
+            stacks = sampler.stop(profile)
+            if not stacks:
+                return response  # finished before the first sample
+            path = _profile_path(directory, endpoint, 'collapsed')
+            write = lambda: _write_collapsed(path, stacks)
+
+        def save():
+            write()
+            _rotate(directory, max_files)
+
+        response.call_on_close(save)
+        return response
+
+
+def _prof_stacks(path):
+    """Two-frame caller;callee stacks from a pstats file, weighted by own time in microseconds"""
+    stacks = Counter()
+    for (filename, _, name), (_, _, _, _, callers) in pstats.Stats(path).stats.items():
+        callee = _frame_name(filename, name)
+        for (caller_file, _, caller_name), edge in callers.items():
+            caller = _frame_name(caller_file, caller_name)
+            weight = int(edge[2] * 1e6)
+            if weight:
+                stacks[f'{caller};{callee}'] += weight
+    return stacks
+
+
+def collapse_profiles(directory, endpoint=None):
+    """Sum the profiles in directory (optionally of one endpoint) into one Counter of stacks"""
+    total = Counter()
+    files = 0
+    for path in sorted(_profile_files(directory)):
+        if endpoint and os.path.basename(path).split('-', 2)[2].rsplit('.', 1)[0] != endpoint:
+            continue
+        files += 1
+        if path.endswith('.prof'):
+            total.update(_prof_stacks(path))
+            continue
+        with open(path) as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack:
+                    total[stack] += int(count)
+    return total, files
+
+
+def run(directory, endpoint=None, output=None, echo=print):
+    """Write the collapsed stacks to output (or echo them); returns the process exit code"""
+    stacks, files = collapse_profiles(directory, endpoint)
+    if not files:
+        echo(f'No profiles found in {directory}')
+        return 1
+    lines = [f'{stack} {count}' for stack, count in stacks.most_common()]
+    if output:
+        with open(output, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        echo(f'{len(lines)} stacks from {files} profiles written to {output}')
+    else:
+        for line in lines:
+            echo(line)
+    return 0
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Aggregate request profiles into collapsed stacks')
+    parser.add_argument('directory', help='REQUEST_PROFILE_DIR to read')
+    parser.add_argument('--endpoint', help='only profiles of this endpoint, e.g. visits.get_user_visits')
+    parser.add_argument('-o', '--output', help='write to this file instead of stdout')
+    args = parser.parse_args()
+    sys.exit(run(args.directory, args.endpoint, args.output))
@@ -0,0 +1,84 @@
+import hashlib
+import json
+
+from sqlalchemy import inspect, text
+
+from services.dialect import index_supported
+
+
+def ensure_columns(db):
+    """
+    Add columns declared on the models that are missing from existing tables
+    New columns must be nullable or carry a server_default so existing rows stay valid
+    """
+    inspector = inspect(db.engine)
+    preparer = db.engine.dialect.identifier_preparer
+    added = []
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = (f"ALTER TABLE {preparer.format_table(table)} "
+                       f"ADD COLUMN {preparer.format_column(column)} "
+                       f"{column.type.compile(dialect=db.engine.dialect)}")
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+                connection.execute(text(ddl))
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def ensure_indexes(db):
+    """
+    Create any indexes declared on the models that are missing from the database
+    db.create_all() only creates indexes together with brand new tables
+    Extension indexes (pg_trgm, earthdistance) are skipped where the database can't build them
+    """
+    inspector = inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing and index_supported(index, db.engine):
+                index.create(bind=db.engine)
+                created.append(index.name)
+    return created
+
+
+def schema_fingerprint(db):
+    """Hash of the tables, columns and indexes declared on the models"""
+    tables = []
+    for table in db.metadata.sorted_tables:
+        tables.append([
+            table.name,
+            [[column.name, str(column.type), column.nullable] for column in table.columns],
+            sorted(index.name for index in table.indexes),
+        ])
+    return hashlib.sha256(json.dumps(tables).encode('utf-8')).hexdigest()
+
+
+def get_state(db, key):
+    """Value stored under key in app_state, or None (also when the table doesn't exist yet)"""
+    from models import AppState
+
+    if not inspect(db.engine).has_table(AppState.__tablename__):
+        return None
+    state = db.session.get(AppState, key)
+    return state.value if state else None
+
+
+def set_state(db, key, value):
+    from models import AppState
+
+    state = db.session.get(AppState, key) or AppState(key=key)
+    state.value = value
+    db.session.add(state)
+    db.session.commit()
@@ -0,0 +1,154 @@
+"""
+Opt-in per-request SQL profiling
+
+With SQL_PROFILING_ENABLED, every SQL statement a request runs is timed
+by the shared statement timer (services/sql_timing.py). The response gets a
+Server-Timing header (visible in the browser's network panel):
+
+    Server-Timing: db;dur=12.4;desc="9 statements, 3 duplicate", app;dur=31.0
+
+A statement is a duplicate when the same SQL already ran with the same
+parameters in the request. Statements run more than once (the N+1 pattern)
+are logged at DEBUG with their counts.
+
+Statements slower than SQL_SLOW_QUERY_MS are written to the slow-query log
+(the `sql.slow` logger, plus SQL_SLOW_QUERY_LOG as JSON lines when set) with
+their EXPLAIN plan. The plan is fetched on a separate connection to the
+database the statement ran on (a read replica for @read_replica views)
+after the response has been sent. Parameters are never logged, they may hold
+credentials.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import request
+
+from services.sql_timing import observe_statements
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger('sql.slow')
+
+EXPLAINABLE = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+
+
+class _Profile(threading.local):
+    active = False
+    statements = None  # [(statement, parameters, seconds, engine)]
+
+
+profile = _Profile()
+_slow_log_paths = set()
+
+
+def _statement_engine(conn, statement):
+    return conn.engine
+
+
+def _record_statement(engine, statement, parameters, executemany, seconds):
+    profile.statements.append((statement, None if executemany else parameters, seconds, engine))
+
+
+def summarize(statements):
+    """Statement count, total seconds, duplicate count and per-SQL repeat counts"""
+    seen = set()
+    duplicates = 0
+    for statement, parameters, _, _ in statements:
+        key = (statement, repr(parameters))
+        if key in seen:
+            duplicates += 1
+        seen.add(key)
+    repeated = Counter(statement for statement, _, _, _ in statements)
+    return {
+        'statements': len(statements),
+        'db_seconds': sum(elapsed for _, _, elapsed, _ in statements),
+        'duplicates': duplicates,
+        'repeated': {sql: count for sql, count in repeated.most_common() if count > 1},
+    }
+
+
+def server_timing(summary, total_seconds):
+    return (f'db;dur={summary["db_seconds"] * 1000:.1f};'
+            f'desc="{summary["statements"]} statements, {summary["duplicates"]} duplicate", '
+            f'app;dur={total_seconds * 1000:.1f}')
+
+
+def explain(engine, statement, parameters):
+    """Query plan of a SELECT as a list of lines, or None for statements we don't explain"""
+    if parameters is None or not EXPLAINABLE.match(statement):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN ' if engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    try:
+        with engine.connect() as connection:
+            rows = connection.exec_driver_sql(prefix + statement, parameters).fetchall()
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+    return [' | '.join(str(value) for value in row) for row in rows]
+
+
+def _log_slow_statements(endpoint, slow):
+    for statement, parameters, elapsed, engine in slow:
+        slow_logger.warning("Slow SQL statement", extra={
+            'endpoint': endpoint,
+            'duration_ms': round(elapsed * 1000, 2),
+            'statement': statement,
+            'database': engine.url.render_as_string(hide_password=True),
+            'plan': explain(engine, statement, parameters),
+        })
+
+
+def _add_slow_log_file(path):
+    if path in _slow_log_paths:
+        return
+    from services.logging_config import JsonFormatter
+    handler = logging.FileHandler(path)
+    handler.setFormatter(JsonFormatter())
+    slow_logger.addHandler(handler)
+    _slow_log_paths.add(path)
+
+
+def init_sql_profiler(app):
+    """Add Server-Timing headers and the slow-query log when SQL_PROFILING_ENABLED"""
+    app.config.setdefault('SQL_PROFILING_ENABLED', False)
+    app.config.setdefault('SQL_SLOW_QUERY_MS', 100)
+    app.config.setdefault('SQL_SLOW_QUERY_LOG', None)
+    if not app.config['SQL_PROFILING_ENABLED']:
+        return
+
+    observe_statements('sql_profiler', lambda: profile.active, on_start=_statement_engine, on_end=_record_statement)
+    threshold = app.config['SQL_SLOW_QUERY_MS'] / 1000
+    if app.config['SQL_SLOW_QUERY_LOG']:
+        _add_slow_log_file(app.config['SQL_SLOW_QUERY_LOG'])
+
+    @app.before_request
+    def start_profile():
+        profile.active = True
+        profile.statements = []
+        request.environ['sql_profile.start'] = time.perf_counter()
+
+    @app.after_request
+    def finish_profile(response):
+        start = request.environ.get('sql_profile.start')
+        if start is None or not profile.active:
+            return response
+        profile.active = False
+        statements, profile.statements = profile.statements, None
+        summary = summarize(statements)
+        response.headers['Server-Timing'] = server_timing(summary, time.perf_counter() - start)
+
+        endpoint = request.endpoint or 'unmatched'
+        if summary['repeated']:
+            logger.debug("Repeated SQL statements", extra={
+                'endpoint': endpoint,
+                'statements': summary['statements'],
+                'duplicates': summary['duplicates'],
+                'repeated': summary['repeated'],
+            })
+
+        slow = [entry for entry in statements if entry[2] >= threshold]
+        if slow:
+            # EXPLAIN after the response is sent, so the client doesn't wait for it
+            response.call_on_close(lambda: _log_slow_statements(endpoint, slow))
+        return response
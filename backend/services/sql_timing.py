@@ -0,0 +1,75 @@
+"""
+One timer for every SQL statement
+
+A single before/after_cursor_execute listener pair (plus handle_error)
+times each statement and hands the duration to every registered observer
+that is active at the time: the request metrics, the SQL profiler, tracing.
+An observer is added once per process with observe_statements():
+
+    observe_statements('metrics', active=lambda: request_stats.active, on_end=count_query)
+
+on_start(conn, statement) runs before the statement and its return value
+is passed back to on_end(token, statement, parameters, executemany, seconds)
+or, when the statement fails, on_error(token, exception).
+"""
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class StatementObserver:
+    __slots__ = ('active', 'on_start', 'on_end', 'on_error')
+
+    def __init__(self, active, on_start, on_end, on_error):
+        self.active = active
+        self.on_start = on_start
+        self.on_end = on_end
+        self.on_error = on_error
+
+
+_observers = {}
+_lock = threading.Lock()
+_engine_hooks_installed = False
+
+
+def observe_statements(name, active, on_end=None, on_start=None, on_error=None):
+    """Register (or replace) the observer called name; active() is checked before every statement"""
+    with _lock:
+        _observers[name] = StatementObserver(active, on_start, on_end, on_error)
+        _install_engine_hooks()
+
+
+def _install_engine_hooks():
+    global _engine_hooks_installed
+    if _engine_hooks_installed:
+        return
+    _engine_hooks_installed = True
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def start_statement(conn, cursor, statement, parameters, context, executemany):
+        watching = [observer for observer in _observers.values() if observer.active()]
+        if watching:
+            tokens = [observer.on_start(conn, statement) if observer.on_start else None for observer in watching]
+            conn.info.setdefault('sql_timing', []).append((time.perf_counter(), watching, tokens))
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def end_statement(conn, cursor, statement, parameters, context, executemany):
+        timings = conn.info.get('sql_timing')
+        if timings:
+            start, watching, tokens = timings.pop()
+            seconds = time.perf_counter() - start
+            for observer, token in zip(watching, tokens):
+                if observer.on_end:
+                    observer.on_end(token, statement, parameters, executemany, seconds)
+
+    @event.listens_for(Engine, 'handle_error')
+    def fail_statement(context):
+        # after_cursor_execute never fires for a failed statement; pop its timer so the stack stays balanced
+        timings = context.connection.info.get('sql_timing') if context.connection is not None else None
+        if timings:
+            _, watching, tokens = timings.pop()
+            for observer, token in zip(watching, tokens):
+                if observer.on_error:
+                    observer.on_error(token, context.original_exception)
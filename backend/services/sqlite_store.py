@@ -0,0 +1,46 @@
+"""
+Small SQLite files shared by every gunicorn worker
+
+Rate limit buckets, idempotency keys, replica stickiness marks and the
+write-behind visit journal each keep their state in a SQLite file of their
+own next to the main database. SQLiteStore opens it in WAL mode (readers
+never wait for the writer) and hands out one connection per thread and per
+process, since sqlite3 connections must not cross a fork.
+"""
+import os
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """Base for stores in one SQLite file; schema is run (executescript) when the store is created"""
+
+    def __init__(self, path, schema=None, synchronous='NORMAL', timeout=5):
+        self.path = path
+        self.synchronous = synchronous
+        self.timeout = timeout
+        self.local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if schema:
+            connection = self._connect()
+            try:
+                connection.executescript(schema)
+            finally:
+                connection.close()
+
+    def _connect(self):
+        # Autocommit: stores run BEGIN IMMEDIATE themselves when they need a transaction
+        connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(f'PRAGMA synchronous={self.synchronous}')
+        return connection
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():
+            connection = self._connect()
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
@@ -0,0 +1,139 @@
+"""
+Where does backend start-up time go?
+
+Runs a fresh interpreter with `-X importtime` that imports the app and calls
+create_app() under cProfile, then reports the import tree (cumulative time
+per module) and the time spent in each call create_app() makes.
+
+    flask profile-startup [--min-ms 5] [--json] [--budget-ms 1500]
+    python -m services.startup_profile ...   (same options, no flask CLI needed)
+
+With --budget-ms the command exits non-zero when import + create_app()
+takes longer, so CI can track cold-start time.
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child: profile create_app() and print its direct callees as JSON
+CHILD_SCRIPT = '''
+import cProfile, json, pstats, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+profiler = cProfile.Profile()
+profiler.enable()
+app.create_app()
+profiler.disable()
+done = time.perf_counter()
+
+stats = pstats.Stats(profiler).stats
+factory = next(key for key in stats if key[2] == 'create_app' and key[0].endswith('app.py'))
+phases = []
+for (filename, line, name), (_, _, _, _, callers) in stats.items():
+    edge = callers.get(factory)
+    if edge:
+        module = filename.rsplit('/', 1)[-1] if filename != '~' else 'builtin'
+        phases.append({'name': f'{module}:{name}', 'ms': edge[3] * 1000})
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (done - imported) * 1000,
+    'phases': phases,
+}))
+'''
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+
+def parse_importtime(output):
+    """Parse -X importtime output into (depth, module, self ms, cumulative ms), in import order"""
+    entries = []
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((len(indent) // 2, module, int(self_us) / 1000, int(cumulative_us) / 1000))
+    return entries
+
+
+def import_tree(entries, min_ms=5.0):
+    """
+    Nest the importtime entries (children are printed before their parent) and
+    keep modules whose cumulative time is at least min_ms
+    """
+    roots = []
+    pending = {}  # depth -> children waiting for their parent
+    for depth, module, self_ms, cumulative_ms in entries:
+        node = {
+            'module': module,
+            'self_ms': round(self_ms, 2),
+            'cumulative_ms': round(cumulative_ms, 2),
+            'children': pending.pop(depth + 1, []),
+        }
+        if cumulative_ms < min_ms:
+            continue
+        if depth > 0:
+            pending.setdefault(depth, []).append(node)
+        else:
+            roots.append(node)
+    return roots
+
+
+def profile_startup(min_ms=5.0):
+    """Profile importing the app and create_app() in a fresh interpreter"""
+    child = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD_SCRIPT],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+        env={**os.environ, 'WARMUP_ON_START': os.environ.get('WARMUP_ON_START', 'false')},
+    )
+    if child.returncode != 0:
+        raise RuntimeError(f'Profiling child failed:\n{child.stderr[-2000:]}')
+
+    report = json.loads(child.stdout.strip().splitlines()[-1])
+    report['phases'].sort(key=lambda phase: -phase['ms'])
+    report['imports'] = import_tree(parse_importtime(child.stderr), min_ms)
+    report['total_ms'] = report['import_ms'] + report['create_app_ms']
+    return report
+
+
+def format_report(report, min_ms=5.0):
+    lines = [f"Imports ({report['import_ms']:.1f} ms, modules >= {min_ms:g} ms cumulative):"]
+
+    def add(nodes, depth):
+        for node in sorted(nodes, key=lambda n: -n['cumulative_ms']):
+            lines.append(f"  {'  ' * depth}{node['module']:<{50 - 2 * depth}} "
+                         f"{node['cumulative_ms']:8.1f} ms  (self {node['self_ms']:.1f})")
+            add(node['children'], depth + 1)
+
+    add(report['imports'], 0)
+    lines.append(f"create_app() ({report['create_app_ms']:.1f} ms):")
+    for phase in report['phases']:
+        if phase['ms'] >= 0.1:
+            lines.append(f"  {phase['name']:<50} {phase['ms']:8.1f} ms")
+    lines.append(f"Total: {report['total_ms']:.1f} ms")
+    return '\n'.join(lines)
+
+
+def run(min_ms=5.0, as_json=False, budget_ms=None, echo=print):
+    """Print the report; returns the process exit code (1 when over budget)"""
+    report = profile_startup(min_ms)
+    echo(json.dumps(report, indent=2) if as_json else format_report(report, min_ms))
+    if budget_ms is not None and report['total_ms'] > budget_ms:
+        echo(f"Start-up took {report['total_ms']:.1f} ms, over the {budget_ms:g} ms budget")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Profile backend start-up time')
+    parser.add_argument('--min-ms', type=float, default=5.0, help='hide imports faster than this')
+    parser.add_argument('--json', action='store_true', help='machine readable output')
+    parser.add_argument('--budget-ms', type=float, help='fail when start-up is slower than this')
+    args = parser.parse_args()
+    sys.exit(run(args.min_ms, args.json, args.budget_ms))
@@ -0,0 +1,276 @@
+"""
+Lightweight in-process request tracing
+
+A TRACING_SAMPLE_RATE fraction of requests is traced, plus, with
+TRACING_HONOR_TRACEPARENT, any request whose W3C `traceparent` header has
+the sampled flag (continuing the caller's trace). The request gets a
+root span, every SQL statement a `db.query` child span, and code can add
+its own:
+
+    with span('recommendations.candidates', types=len(preferred_types)):
+        ...
+
+    @traced('visits.list')
+    def handler(): ...
+
+Spans follow the OpenTelemetry model (trace/span ids, parent, kind, start/end
+in unix nanoseconds, attributes, status). When the response has been sent,
+the trace is written as one OTLP/JSON line (an ExportTraceServiceRequest,
+what the collector's otlpjsonfile receiver reads) to stdout or to the file
+in TRACING_EXPORT. The response carries a `traceparent` header with the
+trace id so a slow call can be looked up.
+
+The root span's own time (not covered by children) is mostly the
+before_request hooks and JWT verification.
+
+When a request isn't traced, span() returns a shared no-op object after one
+thread-local lookup, and the SQL hooks return after the same check.
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from functools import wraps
+
+from flask import request
+
+from services.sql_timing import observe_statements
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+MAX_STATEMENT_LENGTH = 2000
+
+
+class Span:
+    __slots__ = ('trace', 'name', 'kind', 'span_id', 'parent_id', 'start_ns', 'end_ns', 'attributes', 'status')
+
+    def __init__(self, trace, name, kind, parent_id, attributes):
+        self.trace = trace
+        self.name = name
+        self.kind = kind
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.status = STATUS_OK
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def end(self, error=None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.status = STATUS_ERROR
+            self.attributes['exception.type'] = type(error).__name__
+            self.attributes['exception.message'] = str(error)
+        self.trace.finished.append(self)
+
+    def __enter__(self):
+        self.trace.stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end(exc)
+        if self.trace.stack and self.trace.stack[-1] is self:
+            self.trace.stack.pop()
+        return False
+
+
+class _NoopSpan:
+    """Returned when the current request isn't traced"""
+
+    def set_attribute(self, key, value):
+        pass
+
+    def end(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.stack = []
+        self.finished = []
+
+
+class _Current(threading.local):
+    trace = None
+
+
+_current = _Current()
+_export_lock = threading.Lock()
+
+
+def current_trace():
+    return _current.trace
+
+
+def span(name, kind=SPAN_KIND_INTERNAL, **attributes):
+    """Child span of the innermost open span, or a no-op when the request isn't traced"""
+    trace = _current.trace
+    if trace is None:
+        return NOOP_SPAN
+    parent_id = trace.stack[-1].span_id if trace.stack else None
+    return Span(trace, name, kind, parent_id, attributes)
+
+
+def traced(name):
+    """Decorator running the function inside span(name)"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.trace is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# db.query spans, opened and closed by the shared statement timer (services/sql_timing.py)
+
+def _start_db_span(conn, statement):
+    return span('db.query', SPAN_KIND_CLIENT, **{
+        'db.system': conn.dialect.name,
+        'db.statement': statement[:MAX_STATEMENT_LENGTH],
+    })
+
+
+def _end_db_span(db_span, statement, parameters, executemany, seconds):
+    db_span.end()
+
+
+def _fail_db_span(db_span, error):
+    db_span.end(error)
+
+
+def _attribute_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _attributes(mapping):
+    return [{'key': key, 'value': _attribute_value(value)} for key, value in mapping.items()]
+
+
+def to_otlp(trace, service_name):
+    """The trace's finished spans as an OTLP/JSON ExportTraceServiceRequest"""
+    spans = []
+    for finished in trace.finished:
+        entry = {
+            'traceId': trace.trace_id,
+            'spanId': finished.span_id,
+            'name': finished.name,
+            'kind': finished.kind,
+            'startTimeUnixNano': str(finished.start_ns),
+            'endTimeUnixNano': str(finished.end_ns),
+            'attributes': _attributes(finished.attributes),
+            'status': {'code': finished.status},
+        }
+        if finished.parent_id:
+            entry['parentSpanId'] = finished.parent_id
+        spans.append(entry)
+    return {'resourceSpans': [{
+        'resource': {'attributes': _attributes({'service.name': service_name, 'process.pid': os.getpid()})},
+        'scopeSpans': [{'scope': {'name': 'chillquest.tracing'}, 'spans': spans}],
+    }]}
+
+
+def export(trace, destination, service_name):
+    """Append the trace as one JSON line to stdout or a file"""
+    line = json.dumps(to_otlp(trace, service_name), separators=(',', ':')) + '\n'
+    with _export_lock:
+        if destination == 'stdout':
+            sys.stdout.write(line)
+            sys.stdout.flush()
+        else:
+            # One write per line on an O_APPEND descriptor, so workers don't interleave lines
+            fd = os.open(destination, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode())
+            finally:
+                os.close(fd)
+
+
+def init_tracing(app):
+    """Trace sampled requests and export them after the response is sent"""
+    app.config.setdefault('TRACING_SAMPLE_RATE', 0.0)
+    app.config.setdefault('TRACING_EXPORT', 'stdout')
+    app.config.setdefault('TRACING_SERVICE_NAME', 'chillquest-backend')
+    app.config.setdefault('TRACING_HONOR_TRACEPARENT', False)
+    rate = app.config['TRACING_SAMPLE_RATE']
+    honor_parent = app.config['TRACING_HONOR_TRACEPARENT']
+    if rate <= 0 and not honor_parent:
+        return
+
+    observe_statements('tracing', lambda: _current.trace is not None,
+                       on_start=_start_db_span, on_end=_end_db_span, on_error=_fail_db_span)
+    destination = app.config['TRACING_EXPORT']
+    service_name = app.config['TRACING_SERVICE_NAME']
+
+    @app.before_request
+    def start_trace():
+        _current.trace = None
+        parent = TRACEPARENT.match(request.headers.get('traceparent', '')) if honor_parent else None
+        if parent and int(parent.group(3), 16) & 1:
+            trace, parent_id = Trace(parent.group(1)), parent.group(2)
+        elif rate > 0 and random.random() < rate:
+            trace, parent_id = Trace(), None
+        else:
+            return
+        route = request.url_rule.rule if request.url_rule else request.path
+        root = Span(trace, f'{request.method} {route}', SPAN_KIND_SERVER, parent_id, {
+            'http.method': request.method,
+            'http.route': route,
+            'http.target': request.full_path.rstrip('?'),
+        })
+        trace.stack.append(root)
+        request.environ['tracing.root'] = root
+        _current.trace = trace
+
+    @app.after_request
+    def finish_trace(response):
+        root = request.environ.get('tracing.root')
+        if root is None:
+            return response
+        trace = root.trace
+        root.set_attribute('http.status_code', response.status_code)
+        if response.status_code >= 500:
+            root.status = STATUS_ERROR
+        # Spans left open by an exception end with the request
+        for open_span in reversed(trace.stack):
+            open_span.end()
+        trace.stack.clear()
+        _current.trace = None
+        response.headers['traceparent'] = f'00-{trace.trace_id}-{root.span_id}-01'
+        response.call_on_close(lambda: export(trace, destination, service_name))
+        return response
+
+    @app.teardown_request
+    def clear_trace(error=None):
+        _current.trace = None
@@ -0,0 +1,246 @@
+"""
+Per-user travel statistics
+
+GET /api/visits/stats reads two small tables instead of the user's visits,
+so it costs the same for 10 or 100k visits:
+
+    user_stats          visit_count, rating_count, rating_sum, distance_km
+    user_visit_counts   visits per (kind, value): country, location type and
+                        rating given; rows are dropped when they reach zero
+
+Every visit write adjusts them in the writer's transaction, with
+increments (`SET n = n + delta`) so concurrent writers don't lose counts;
+the visit journal collects a whole batch in a StatsDeltas first.
+distance_km is the great-circle length of the user's trip through their
+visits in visit_date order, so adding a visit replaces the hop between its
+neighbours by the two hops through it (and deleting does the reverse).
+
+Seeded and imported visits bypass this, so backfill with
+`flask rebuild-user-stats` (init_db.py does it after seeding).
+"""
+from collections import defaultdict
+
+import numpy as np
+from sqlalchemy import bindparam, func, or_, select
+
+from models import db, Location, UserStats, UserVisitCount, Visit
+from services.dialect import add_to_rows
+from services.geo_index import haversine_km
+from services.ratings import rating_delta
+
+KINDS = ('country', 'type', 'rating')
+
+
+def _distance(a, b):
+    return float(haversine_km(a[0], a[1], b[0], b[1]))
+
+
+def _neighbour_query(before):
+    # Built once: the visit before/after (date, id) in the user's (visit_date, id) order
+    date, visit_id = bindparam('date'), bindparam('visit_id')
+    if before:
+        where = (Visit.visit_date <= date, or_(Visit.visit_date < date, Visit.id < visit_id))
+        order = (Visit.visit_date.desc(), Visit.id.desc())
+    else:
+        where = (Visit.visit_date >= date, or_(Visit.visit_date > date, Visit.id > visit_id))
+        order = (Visit.visit_date, Visit.id)
+    return (select(Location.latitude, Location.longitude)
+            .join(Visit, Visit.location_id == Location.id)
+            .where(Visit.user_id == bindparam('user_id'), *where)
+            .order_by(*order).limit(1))
+
+
+PREVIOUS_VISIT = _neighbour_query(before=True)
+NEXT_VISIT = _neighbour_query(before=False)
+
+
+def _detour_km(visit, location):
+    """How much longer the user's trip is with this visit in it"""
+    if location is None:
+        return 0.0
+    point = (location.latitude, location.longitude)
+    params = {'user_id': visit.user_id, 'date': visit.visit_date, 'visit_id': visit.id}
+    previous = db.session.execute(PREVIOUS_VISIT, params).first()
+    following = db.session.execute(NEXT_VISIT, params).first()
+    detour = 0.0
+    if previous is not None:
+        detour += _distance(previous, point)
+    if following is not None:
+        detour += _distance(point, following)
+    if previous is not None and following is not None:
+        detour -= _distance(previous, following)
+    return detour
+
+
+def _visit_counts(visit, location):
+    counts = []
+    if location is not None:
+        counts.append(('country', location.country))
+        if location.type:
+            counts.append(('type', location.type))
+    if visit.rating is not None:
+        counts.append(('rating', str(visit.rating)))
+    return counts
+
+
+class StatsDeltas:
+    """
+    Pending changes to users' statistics, written by apply() in two statements
+    Batch writers (the visit journal) collect a whole batch in one
+    """
+
+    def __init__(self):
+        self.totals = defaultdict(lambda: [0, 0, 0, 0.0])  # user id -> visits, ratings, rating sum, distance
+        self.counts = defaultdict(int)  # (user id, kind, value) -> visits
+
+    def add(self, user_id, visits=0, ratings=0, rating_total=0, distance_km=0.0, counts=()):
+        totals = self.totals[user_id]
+        totals[0] += visits
+        totals[1] += ratings
+        totals[2] += rating_total
+        totals[3] += distance_km
+        for kind, value, delta in counts:
+            self.counts[(user_id, kind, value)] += delta
+
+    def apply(self):
+        """Add the deltas to the aggregate rows (creating them as needed), in the current transaction"""
+        add_to_rows(db.session, UserStats.__table__, ['user_id'], [
+            {'user_id': user_id, 'visit_count': visits, 'rating_count': ratings, 'rating_sum': rating_total,
+             'distance_km': distance_km}
+            for user_id, (visits, ratings, rating_total, distance_km) in self.totals.items()
+        ])
+
+        counts = {key: delta for key, delta in self.counts.items() if delta}
+        if counts:
+            table = UserVisitCount.__table__
+            add_to_rows(db.session, table, ['user_id', 'kind', 'value'], [
+                {'user_id': user_id, 'kind': kind, 'value': value, 'count': delta}
+                for (user_id, kind, value), delta in counts.items()
+            ])
+            shrunk = {user_id for (user_id, _, _), delta in counts.items() if delta < 0}
+            if shrunk:
+                db.session.execute(table.delete().where(table.c.user_id.in_(shrunk), table.c['count'] <= 0))
+        self.totals.clear()
+        self.counts.clear()
+
+
+def _record(deltas, user_id, **changes):
+    if deltas is not None:
+        deltas.add(user_id, **changes)
+    else:
+        deltas = StatsDeltas()
+        deltas.add(user_id, **changes)
+        deltas.apply()
+
+
+def record_visit_added(visit, location, deltas=None):
+    """
+    Count a new visit (flushed, so it has an id) at location (None if it's missing)
+    Applied right away unless deltas (a StatsDeltas) collects it
+    """
+    count_delta, sum_delta = rating_delta(None, visit.rating)
+    _record(deltas, visit.user_id, visits=1, ratings=count_delta, rating_total=sum_delta,
+            distance_km=_detour_km(visit, location),
+            counts=[(kind, value, 1) for kind, value in _visit_counts(visit, location)])
+
+
+def record_visit_removed(visit, location, deltas=None):
+    """Uncount a visit about to be deleted (call before the DELETE is flushed)"""
+    count_delta, sum_delta = rating_delta(visit.rating, None)
+    _record(deltas, visit.user_id, visits=-1, ratings=count_delta, rating_total=sum_delta,
+            distance_km=-_detour_km(visit, location),
+            counts=[(kind, value, -1) for kind, value in _visit_counts(visit, location)])
+
+
+def record_rating_change(user_id, old_rating, new_rating, deltas=None):
+    """A visit's rating changed from old_rating to new_rating (either may be None)"""
+    if old_rating == new_rating:
+        return
+    count_delta, sum_delta = rating_delta(old_rating, new_rating)
+    counts = []
+    if old_rating is not None:
+        counts.append(('rating', str(old_rating), -1))
+    if new_rating is not None:
+        counts.append(('rating', str(new_rating), 1))
+    _record(deltas, user_id, ratings=count_delta, rating_total=sum_delta, counts=counts)
+
+
+def get_user_stats(user_id):
+    """Statistics of one user from the aggregate tables (two primary key lookups)"""
+    stats = db.session.get(UserStats, user_id)
+    counts = {kind: {} for kind in KINDS}
+    for row in UserVisitCount.query.filter_by(user_id=user_id):
+        counts[row.kind][row.value] = row.count
+    rating_count = stats.rating_count if stats else 0
+    return {
+        'visit_count': stats.visit_count if stats else 0,
+        'countries_visited': len(counts['country']),
+        'visits_by_country': counts['country'],
+        'visits_by_type': counts['type'],
+        'visits_by_rating': {str(rating): counts['rating'].get(str(rating), 0) for rating in range(1, 6)},
+        'rated_visits': rating_count,
+        'average_rating': round(stats.rating_sum / rating_count, 2) if rating_count else None,
+        'distance_km': round(stats.distance_km, 1) if stats else 0.0,
+    }
+
+
+def _trip_distances():
+    """user id -> length of the trip through their visits, from one windowed query"""
+    order = (Visit.visit_date, Visit.id)
+    rows = (db.session.query(
+        Visit.user_id,
+        Location.latitude,
+        Location.longitude,
+        func.lag(Location.latitude).over(partition_by=Visit.user_id, order_by=order),
+        func.lag(Location.longitude).over(partition_by=Visit.user_id, order_by=order),
+    ).join(Location, Location.id == Visit.location_id).all())
+    if not rows:
+        return {}
+    users, lats, lons, previous_lats, previous_lons = (
+        np.array(column, dtype=float) for column in zip(*rows)
+    )
+    hops = np.nan_to_num(haversine_km(previous_lats, previous_lons, lats, lons))  # first visits have no hop
+    user_ids, positions = np.unique(users, return_inverse=True)
+    totals = np.bincount(positions, weights=hops)
+    return {int(user_id): float(total) for user_id, total in zip(user_ids, totals)}
+
+
+def rebuild_user_stats():
+    """
+    Recompute every user's statistics from the visits table
+    A few grouped queries and bulk inserts; returns the number of users with visits
+    """
+    totals = db.session.query(
+        Visit.user_id,
+        func.count(Visit.id),
+        func.count(Visit.rating),
+        func.coalesce(func.sum(Visit.rating), 0),
+    ).group_by(Visit.user_id).all()
+    distances = _trip_distances()
+
+    counts = []
+    for kind, column in (('country', Location.country), ('type', Location.type)):
+        counts += [
+            {'user_id': user_id, 'kind': kind, 'value': value, 'count': count}
+            for user_id, value, count in db.session.query(Visit.user_id, column, func.count(Visit.id))
+            .join(Location, Location.id == Visit.location_id)
+            .filter(column.isnot(None)).group_by(Visit.user_id, column)
+        ]
+    counts += [
+        {'user_id': user_id, 'kind': 'rating', 'value': str(rating), 'count': count}
+        for user_id, rating, count in db.session.query(Visit.user_id, Visit.rating, func.count(Visit.id))
+        .filter(Visit.rating.isnot(None)).group_by(Visit.user_id, Visit.rating)
+    ]
+
+    db.session.execute(UserVisitCount.__table__.delete())
+    db.session.execute(UserStats.__table__.delete())
+    if totals:
+        db.session.execute(UserStats.__table__.insert(), [
+            {'user_id': user_id, 'visit_count': visits, 'rating_count': ratings, 'rating_sum': rating_total,
+             'distance_km': distances.get(user_id, 0.0)}
+            for user_id, visits, ratings, rating_total in totals
+        ])
+    if counts:
+        db.session.execute(UserVisitCount.__table__.insert(), counts)
+    db.session.commit()
+    return len(totals)
@@ -0,0 +1,106 @@
+"""
+Streaming export of a user's visit history
+
+GET /api/visits/export?format=csv|geojson writes the user's visits, newest
+first, straight from one visits-locations join read with yield_per: rows
+arrive VISITS_EXPORT_BATCH_SIZE at a time (a server-side cursor on
+PostgreSQL), each batch is formatted and sent before the next is fetched,
+and the response is gzip/brotli compressed on the fly. Memory stays flat
+whatever the history size.
+
+Upserts still waiting in the write-behind journal show up once applied.
+"""
+import csv
+import io
+import json
+import logging
+
+from sqlalchemy import select
+
+from models import db, Location, Visit
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'geojson': ('application/geo+json', 'geojson'),
+}
+
+CSV_HEADER = ('visit_id', 'visit_date', 'rating', 'notes', 'location_id', 'name', 'city', 'country', 'type',
+              'latitude', 'longitude')
+
+
+def export_query(user_id):
+    """The user's visits joined with their locations as plain rows, in CSV_HEADER order"""
+    return (select(Visit.id, Visit.visit_date, Visit.rating, Visit.notes, Visit.location_id, Location.name,
+                   Location.city, Location.country, Location.type, Location.latitude, Location.longitude)
+            .outerjoin(Location, Location.id == Visit.location_id)
+            .where(Visit.user_id == user_id)
+            .order_by(Visit.visit_date.desc(), Visit.id.desc()))
+
+
+def _batches(user_id, batch_size):
+    result = db.session.execute(export_query(user_id).execution_options(yield_per=batch_size))
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()
+
+
+def _csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for rows in batches:
+        writer.writerows(
+            (visit_id, visit_date.isoformat() if visit_date else '', *rest)
+            for visit_id, visit_date, *rest in rows
+        )
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _feature(row):
+    visit_id, visit_date, rating, notes, location_id, name, city, country, kind, latitude, longitude = row
+    geometry = None  # the location is gone
+    if latitude is not None and longitude is not None:
+        geometry = {'type': 'Point', 'coordinates': [longitude, latitude]}
+    return {
+        'type': 'Feature',
+        'geometry': geometry,
+        'properties': {
+            'visit_id': visit_id,
+            'visit_date': visit_date.isoformat() if visit_date else None,
+            'rating': rating,
+            'notes': notes,
+            'location_id': location_id,
+            'name': name,
+            'city': city,
+            'country': country,
+            'type': kind,
+        },
+    }
+
+
+def _geojson_chunks(batches):
+    yield b'{"type":"FeatureCollection","features":['
+    separator = ''
+    for rows in batches:
+        features = ','.join(json.dumps(_feature(row), separators=(',', ':')) for row in rows)
+        yield (separator + features).encode('utf-8')
+        separator = ','
+    yield b']}'
+
+
+def export_chunks(user_id, export_format, batch_size=1000):
+    """Encoded chunks of the user's visits in export_format (a FORMATS key), one per batch of rows"""
+    chunks = _csv_chunks if export_format == 'csv' else _geojson_chunks
+    try:
+        yield from chunks(_batches(user_id, batch_size))
+    except Exception:
+        # Headers are long gone; ending the stream early is all that's left (a gzip client sees it truncated)
+        logger.exception("Visit export failed", extra={'user_id': user_id, 'format': export_format})
+        raise
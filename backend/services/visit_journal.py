@@ -0,0 +1,299 @@
+"""
+Write-behind journal for visit upserts
+
+With VISIT_WRITE_BEHIND, POST /api/visits/ validates the request, appends the
+upsert to a local SQLite journal (WAL, synchronous=FULL by default, so an
+acknowledged write survives a crash) and answers 202 right away. A
+background thread in each worker applies pending entries to the main
+database in batched transactions of up to VISIT_JOURNAL_BATCH_SIZE.
+
+Entries carry a key, the client's Idempotency-Key header when it sends one:
+a retried request with the same key is acknowledged again without being
+journaled twice.
+
+Replaying is safe: an entry sets the visit's rating/notes to absolute values
+and the rating aggregates move by (new - old), so applying an entry again
+after a crash between the main commit and marking it applied changes
+nothing. Entries are applied in journal order by one process at a time (an
+flock on <journal>.lock, taken per batch), which keeps that order across
+gunicorn workers.
+
+Pending entries are replayed by whichever worker starts first, or
+explicitly with `flask apply-visit-journal`. GET /api/visits/ lists a
+user's pending entries too, so the client reads its own writes; deleting a
+visit first applies the upserts pending for that user and location (and only
+those) so a queued upsert can't bring it back.
+"""
+import fcntl
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+from models import db, Location, Visit
+from services.ratings import apply_rating_deltas, rating_delta
+from services.sqlite_store import SQLiteStore
+from services.user_stats import StatsDeltas, record_rating_change, record_visit_added
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    user_id INTEGER NOT NULL,
+    location_id INTEGER NOT NULL,
+    rating INTEGER,
+    notes TEXT,
+    has_notes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    applied_at REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_journal_pending ON journal (applied_at, seq);
+CREATE INDEX IF NOT EXISTS ix_journal_user ON journal (user_id, applied_at);
+"""
+
+COLUMNS = 'seq, key, user_id, location_id, rating, notes, has_notes, created_at'
+
+
+class VisitJournal(SQLiteStore):
+    """Durable queue of visit upserts shared by every worker through one SQLite file"""
+
+    def __init__(self, path, synchronous='FULL'):
+        super().__init__(path, SCHEMA, synchronous=synchronous, timeout=30)
+
+    def append(self, user_id, location_id, rating, notes=None, has_notes=False, key=None):
+        """Journal one upsert; returns (key, False) when the key was already journaled"""
+        key = key or uuid.uuid4().hex
+        cursor = self._connection().execute(
+            'INSERT OR IGNORE INTO journal (key, user_id, location_id, rating, notes, has_notes, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (key, user_id, location_id, rating, notes, int(has_notes), time.time()),
+        )
+        return key, cursor.rowcount == 1
+
+    def pending(self, limit=None, user_id=None, location_id=None):
+        """Unapplied entries in journal order, as dicts"""
+        sql = f'SELECT {COLUMNS} FROM journal WHERE applied_at IS NULL'
+        params = []
+        if user_id is not None:
+            sql += ' AND user_id = ?'
+            params.append(user_id)
+        if location_id is not None:
+            sql += ' AND location_id = ?'
+            params.append(location_id)
+        sql += ' ORDER BY seq'
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        names = COLUMNS.split(', ')
+        return [dict(zip(names, row)) for row in self._connection().execute(sql, params)]
+
+    def pending_count(self):
+        return self._connection().execute('SELECT COUNT(*) FROM journal WHERE applied_at IS NULL').fetchone()[0]
+
+    def mark_applied(self, seqs, error=None):
+        # One statement, so one fsync per batch
+        placeholders = ','.join('?' * len(seqs))
+        self._connection().execute(f'UPDATE journal SET applied_at = ?, error = ? WHERE seq IN ({placeholders})',
+                                   (time.time(), error, *seqs))
+
+    def purge(self, older_than):
+        """Forget applied entries (and their idempotency keys) applied more than older_than seconds ago"""
+        self._connection().execute('DELETE FROM journal WHERE applied_at < ?', (time.time() - older_than,))
+
+
+def _apply_entry(entry, visits, locations, deltas, stats):
+    """
+    Upsert one journaled visit; visits maps (user_id, location_id) -> Visit and locations
+    id -> Location for the batch, deltas collects the rating aggregate changes per location
+    and stats the users' statistics changes
+    """
+    pair = (entry['user_id'], entry['location_id'])
+    visit = visits.get(pair)
+    old_rating = None
+    if visit is None:
+        if entry['rating'] is None:
+            # The visit was deleted after this update was queued
+            logger.warning("Dropping journaled update of a missing visit", extra={'key': entry['key']})
+            return
+        visit = Visit(
+            user_id=entry['user_id'],
+            location_id=entry['location_id'],
+            rating=entry['rating'],
+            notes=entry['notes'] if entry['has_notes'] else '',
+            visit_date=datetime.utcfromtimestamp(entry['created_at']),
+        )
+        db.session.add(visit)
+        db.session.flush()
+        record_visit_added(visit, locations.get(entry['location_id']), stats)
+        visits[pair] = visit
+    else:
+        old_rating = visit.rating
+        if entry['rating'] is not None:
+            visit.rating = entry['rating']
+        if entry['has_notes']:
+            visit.notes = entry['notes']
+        record_rating_change(visit.user_id, old_rating, visit.rating, stats)
+    count_delta, sum_delta = rating_delta(old_rating, visit.rating)
+    count_total, sum_total = deltas.get(entry['location_id'], (0, 0))
+    deltas[entry['location_id']] = (count_total + count_delta, sum_total + sum_delta)
+
+
+def apply_batch(journal, entries):
+    """Apply entries in one transaction; on failure retry them one by one so a bad entry can't block the rest"""
+    pairs = {(entry['user_id'], entry['location_id']) for entry in entries}
+    try:
+        visits = {
+            (visit.user_id, visit.location_id): visit
+            for visit in Visit.query.filter(tuple_(Visit.user_id, Visit.location_id).in_(pairs))
+        }
+        locations = {
+            location.id: location
+            for location in Location.query.filter(Location.id.in_({entry['location_id'] for entry in entries}))
+        }
+        deltas, stats = {}, StatsDeltas()
+        for entry in entries:
+            _apply_entry(entry, visits, locations, deltas, stats)
+        apply_rating_deltas(deltas)
+        stats.apply()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        if len(entries) == 1:
+            # Set aside with its error so it can't block the entries behind it
+            logger.exception("Could not apply journaled visit", extra={'key': entries[0]['key']})
+            journal.mark_applied([entries[0]['seq']], error=str(e))
+            return
+        for entry in entries:
+            apply_batch(journal, [entry])
+        return
+    journal.mark_applied([entry['seq'] for entry in entries])
+
+
+class JournalApplier:
+    """Background thread draining the journal into the main database"""
+
+    def __init__(self, app, journal):
+        self.app = app
+        self.journal = journal
+        self.batch_size = app.config['VISIT_JOURNAL_BATCH_SIZE']
+        self.poll_interval = app.config['VISIT_JOURNAL_POLL_INTERVAL']
+        self.retention = app.config['VISIT_JOURNAL_RETENTION']
+        self.lock_path = f'{journal.path}.lock'
+        self.wakeup = threading.Event()
+        self.pid = None
+        self.last_purge = 0.0
+
+    def ensure_started(self):
+        # Threads don't survive a fork, so every worker starts its own
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            threading.Thread(target=self._run, name='visit-journal', daemon=True).start()
+
+    def notify(self):
+        self.ensure_started()
+        self.wakeup.set()
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+            try:
+                if not self.drain(block=False):
+                    # Another worker is draining; look again shortly in case it missed our entries
+                    time.sleep(min(0.05, self.poll_interval))
+                    self.wakeup.set()
+            except Exception:
+                logger.exception("Visit journal applier failed")
+                time.sleep(self.poll_interval)
+
+    @contextmanager
+    def _applying(self, block=True):
+        """Hold the journal lock; yields False instead when block is False and another process has it"""
+        with open(self.lock_path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if block else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def drain(self, block=True):
+        """Apply everything pending; False if another process holds the journal lock and block is False"""
+        with self.app.app_context():
+            while True:
+                # The lock is taken per batch so apply_pending() never waits for a whole backlog
+                with self._applying(block) as locked:
+                    if not locked:
+                        return False
+                    entries = self.journal.pending(limit=self.batch_size)
+                    if not entries:
+                        break
+                    apply_batch(self.journal, entries)
+        if time.time() - self.last_purge > self.retention:
+            self.journal.purge(self.retention)
+            self.last_purge = time.time()
+        return True
+
+    def apply_pending(self, user_id, location_id):
+        """
+        Apply the upserts pending for one user and location now (inside an app
+        context), waiting for at most the batch being applied elsewhere
+        """
+        with self._applying():
+            entries = self.journal.pending(user_id=user_id, location_id=location_id)
+            if entries:
+                apply_batch(self.journal, entries)
+
+
+def journal_path(app):
+    return app.config.get('VISIT_JOURNAL_PATH') or os.path.join(app.instance_path, 'visit_journal.db')
+
+
+def get_applier(app):
+    return app.extensions.get('visit_journal')
+
+
+def replay_journal(app):
+    """Apply whatever the journal file holds, even with write-behind since turned off; returns the entry count"""
+    path = journal_path(app)
+    if not os.path.exists(path):
+        return 0
+    applier = get_applier(app) or JournalApplier(app, VisitJournal(path, app.config['VISIT_JOURNAL_SYNCHRONOUS']))
+    pending = applier.journal.pending_count()
+    if pending:
+        applier.drain()
+    return pending
+
+
+def init_visit_journal(app):
+    """Set up the journal and its applier when VISIT_WRITE_BEHIND is on"""
+    app.config.setdefault('VISIT_WRITE_BEHIND', False)
+    app.config.setdefault('VISIT_JOURNAL_PATH', None)
+    app.config.setdefault('VISIT_JOURNAL_SYNCHRONOUS', 'FULL')
+    app.config.setdefault('VISIT_JOURNAL_BATCH_SIZE', 500)
+    app.config.setdefault('VISIT_JOURNAL_POLL_INTERVAL', 1.0)
+    app.config.setdefault('VISIT_JOURNAL_RETENTION', 86400)
+    if not app.config['VISIT_WRITE_BEHIND']:
+        return None
+
+    journal = VisitJournal(journal_path(app), app.config['VISIT_JOURNAL_SYNCHRONOUS'])
+    applier = JournalApplier(app, journal)
+    app.extensions['visit_journal'] = applier
+
+    @app.before_request
+    def start_journal_applier():
+        # Started by the first request of each worker, which also replays what a crash left pending
+        applier.ensure_started()
+
+    return applier
@@ -0,0 +1,68 @@
+"""
+Warm the app up before it serves traffic
+
+Without this, each worker configures SQLAlchemy mappers, compiles the hot
+queries and builds the location index on its first requests, so every deploy
+or worker recycle shows up as a latency spike. With gunicorn's preload the
+warmup runs once in the master and the forked workers share the result
+copy-on-write. No database connection is left open to cross the fork.
+"""
+import logging
+import time
+
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.orm import configure_mappers
+
+logger = logging.getLogger(__name__)
+
+
+def _warm_queries(app):
+    """Run the hot read paths once so their SQL is compiled into the engine's cache"""
+    from models import Location, User, Visit
+    from services.recommendation_engine import get_recommendations
+
+    location = Location.query.order_by(Location.id).first()
+    if location is not None:
+        location.to_dict()
+    Location.query.get(0)
+    User.query.get(0)
+    Visit.query.filter_by(user_id=0).all()
+    Visit.query.filter_by(user_id=0, location_id=0).first()
+    get_recommendations(app.config.get('WARMUP_RECOMMENDATION_LIMIT', 10))
+
+
+def _warm_location_index(app):
+    from services.geo_index import get_location_index
+
+    index = get_location_index(app)
+    if len(index):
+        index.query(0.0, 0.0, k=1)  # first query pulls in numpy's code paths
+
+
+def warm_up(app):
+    """Configure mappers, compile hot queries and load the location index; returns step timings (ms)"""
+    from models import db
+
+    steps = (
+        ('mappers', lambda: configure_mappers()),
+        ('queries', lambda: _warm_queries(app)),
+        ('location_index', lambda: _warm_location_index(app)),
+    )
+    timings = {}
+    with app.app_context():
+        try:
+            for name, step in steps:
+                start = time.perf_counter()
+                step()
+                timings[name] = round((time.perf_counter() - start) * 1000, 1)
+        except (OperationalError, ProgrammingError) as error:
+            # Tables don't exist yet (e.g. create_app() from init_db); workers warm lazily
+            logger.warning("Warmup skipped, database not ready", extra={'error': str(error.orig)})
+        finally:
+            # Forked workers also drop inherited pools (services/dialect.py reset_pools_after_fork)
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+    logger.info("Warmup finished", extra={'timings_ms': timings})
+    return timings
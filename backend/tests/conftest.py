@@ -0,0 +1,128 @@
+"""
+Shared fixtures
+
+Every test gets its own app on a throwaway SQLite database: a copy of one
+seeded with the demo catalog (and demo user) once per session. Run from the
+backend directory with `python -m pytest`.
+"""
+import contextlib
+import io
+import os
+import shutil
+
+import pytest
+
+from config import Config
+
+TEST_SETTINGS = {
+    'PASSWORD_HASH_WORKERS': 0,  # hash inline, no process pool per test
+    'LOG_LEVEL': 'WARNING',
+    'LOG_ASYNC': False,
+    'JWT_SECRET_KEY': 'test-jwt-secret-key-long-enough-for-hs256',
+    'METRICS_ENABLED': False,
+}
+
+
+def make_config(directory, **overrides):
+    """Config subclass keeping the database and every side store under directory"""
+    os.makedirs(directory, exist_ok=True)
+    attrs = {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(directory, 'app.db')}",
+        'CATALOG_SNAPSHOT_DIR': os.path.join(directory, 'catalog'),
+        'RATE_LIMIT_SQLITE_PATH': os.path.join(directory, 'rate_limits.db'),
+        'VISIT_JOURNAL_PATH': os.path.join(directory, 'visit_journal.db'),
+        'IDEMPOTENCY_SQLITE_PATH': os.path.join(directory, 'idempotency.db'),
+        'REPLICA_STICKY_SQLITE_PATH': os.path.join(directory, 'replica_sticky.db'),
+        **TEST_SETTINGS,
+    }
+    attrs.update(overrides)
+    return type('TestConfig', (Config,), attrs)
+
+
+@pytest.fixture(scope='session')
+def seeded_database(tmp_path_factory):
+    """Path of a database seeded with the demo catalog, copied by each test that wants one"""
+    from app import create_app
+    from models import db
+    from seeding import seed_locations
+    from services.ratings import rebuild_rating_aggregates
+    from services.user_stats import rebuild_user_stats
+
+    directory = str(tmp_path_factory.mktemp('seed'))
+    app = create_app(make_config(directory, CATALOG_SNAPSHOT_ENABLED=False))
+    with app.app_context():
+        db.create_all()
+        with contextlib.redirect_stdout(io.StringIO()):
+            seed_locations()
+        rebuild_rating_aggregates()
+        rebuild_user_stats()
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    return os.path.join(directory, 'app.db')
+
+
+@pytest.fixture(autouse=True)
+def reset_process_state():
+    """Forget per-process caches that would otherwise leak between test databases"""
+    from auth.identity import cache
+    from services import dialect, health
+    from services.geo_index import invalidate_location_index
+
+    cache.clear()
+    invalidate_location_index()
+    dialect._features.clear()
+    health._stats = None
+    yield
+    cache.clear()
+    invalidate_location_index()
+
+
+@pytest.fixture
+def make_app(tmp_path, seeded_database):
+    """Factory for apps on a fresh copy of the seeded database (or an empty one with seed=False)"""
+    from app import create_app
+    from models import db
+
+    apps = []
+
+    def factory(seed=True, **overrides):
+        directory = os.path.join(tmp_path, f'app{len(apps)}')
+        os.makedirs(directory)
+        if seed:
+            shutil.copy(seeded_database, os.path.join(directory, 'app.db'))
+        app = create_app(make_config(directory, **overrides))
+        with app.app_context():
+            db.create_all(bind_key=None)  # replicas are copies of the primary
+        apps.append(app)
+        return app
+
+    yield factory
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, username='demouser', password='password123'):
+    """Authorization header for a user, via the login endpoint"""
+    response = client.post('/api/auth/login', json={'username': username, 'password': password})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Authorization header for the seeded demo user"""
+    return login(client)
@@ -0,0 +1,112 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from services.compression import (
+    SNAPSHOT_NAME, SUPPORTED_ENCODINGS, brotli, choose_encoding, parse_accept_encoding, snapshot_dir,
+    write_catalog_snapshot,
+)
+
+requires_brotli = pytest.mark.skipif(brotli is None, reason='brotli is not installed')
+
+
+def test_parse_accept_encoding_reads_q_values():
+    assert parse_accept_encoding('gzip;q=0.5, br, *;q=0') == {'gzip': 0.5, 'br': 1.0, '*': 0.0}
+    assert parse_accept_encoding('gzip;q=oops') == {'gzip': 0.0}
+    assert parse_accept_encoding(None) == {}
+
+
+def test_choose_encoding_prefers_best_supported():
+    assert choose_encoding('gzip') == 'gzip'
+    assert choose_encoding('identity') is None
+    assert choose_encoding('gzip;q=0') is None
+    assert choose_encoding('*') == SUPPORTED_ENCODINGS[0]
+    assert choose_encoding('gzip, br;q=0') == 'gzip'
+
+
+@requires_brotli
+def test_choose_encoding_prefers_brotli():
+    assert choose_encoding('gzip, deflate, br') == 'br'
+    assert choose_encoding('gzip, br;q=0.5') == 'gzip'
+
+
+@pytest.fixture
+def live_catalog_client(make_app):
+    """Client whose /api/locations/ is rendered per request, so the after_request compressor applies"""
+    return make_app(CATALOG_SNAPSHOT_ENABLED=False).test_client()
+
+
+def test_large_json_is_gzipped(live_catalog_client):
+    plain = live_catalog_client.get('/api/locations/', headers={'Accept-Encoding': 'identity'})
+    compressed = live_catalog_client.get('/api/locations/', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert len(compressed.get_data()) < len(plain.get_data())
+    assert json.loads(gzip.decompress(compressed.get_data())) == plain.get_json()
+
+
+@requires_brotli
+def test_large_json_is_brotli_compressed_when_accepted(live_catalog_client):
+    plain = live_catalog_client.get('/api/locations/')
+    response = live_catalog_client.get('/api/locations/', headers={'Accept-Encoding': 'gzip, br'})
+
+    assert response.headers['Content-Encoding'] == 'br'
+    assert json.loads(brotli.decompress(response.get_data())) == plain.get_json()
+
+
+def test_small_responses_are_not_compressed(live_catalog_client):
+    response = live_catalog_client.get('/api/test', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_compression_can_be_disabled(make_app):
+    client = make_app(CATALOG_SNAPSHOT_ENABLED=False, COMPRESSION_ENABLED=False).test_client()
+
+    response = client.get('/api/locations/', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_catalog_snapshot_is_served_precompressed(app, client):
+    with app.app_context():
+        sizes = write_catalog_snapshot(app)
+    assert sizes[SNAPSHOT_NAME + '.gz'] < sizes[SNAPSHOT_NAME]
+
+    plain = client.get('/api/locations/')
+    compressed = client.get('/api/locations/', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.headers['Content-Type'] == 'application/json'
+    assert json.loads(gzip.decompress(compressed.get_data())) == plain.get_json()
+
+
+def test_catalog_snapshot_supports_conditional_requests(app, client):
+    with app.app_context():
+        write_catalog_snapshot(app)
+
+    first = client.get('/api/locations/', headers={'Accept-Encoding': 'gzip'})
+    again = client.get('/api/locations/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': first.headers['ETag']})
+
+    assert again.status_code == 304
+
+
+def test_catalog_snapshot_is_rebuilt_when_a_location_changes(app, client):
+    from models import db, Location
+
+    with app.app_context():
+        write_catalog_snapshot(app)
+        location = db.session.get(Location, 1)
+        location.name = 'Renamed For The Snapshot'
+        db.session.commit()
+
+    names = {location['name'] for location in client.get('/api/locations/').get_json()['locations']}
+    assert 'Renamed For The Snapshot' in names
+    with open(os.path.join(snapshot_dir(app), SNAPSHOT_NAME + '.gz'), 'rb') as f:
+        assert b'Renamed For The Snapshot' in gzip.decompress(f.read())
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+from sqlalchemy import text
+
+from services import dialect
+
+requires_fork = pytest.mark.skipif(not hasattr(os, 'register_at_fork'), reason='needs os.fork')
+
+
+def pooled_connections(app):
+    from models import db
+
+    with app.app_context():
+        return {key: engine.pool.checkedin() for key, engine in db.engines.items()}
+
+
+def open_connections(app):
+    """Check a connection out of every engine and back in, so each pool holds one"""
+    from models import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+
+
+def in_child(check):
+    """Run check() in a forked child; True when it returned truthy there"""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os._exit(0 if check() else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status) == 0
+
+
+@requires_fork
+def test_forked_child_drops_every_inherited_pool(make_app, tmp_path):
+    replica = tmp_path / 'replica.db'
+    app = make_app(SQLALCHEMY_REPLICA_URIS=f'sqlite:///{replica}')
+    open_connections(app)
+    before = pooled_connections(app)
+    assert len(before) == 2 and all(before.values())
+
+    assert in_child(lambda: not any(pooled_connections(app).values()))
+    # The parent keeps its connections
+    assert pooled_connections(app) == before
+
+
+@requires_fork
+def test_fork_hook_follows_the_latest_app(make_app):
+    first = make_app()
+    second = make_app()
+    open_connections(first)
+    open_connections(second)
+
+    assert dialect._fork_app() is second
+    assert in_child(lambda: not any(pooled_connections(second).values()) and all(pooled_connections(first).values()))
@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from services.geo_index import GeoIndex, brute_force_nearest, haversine_km
+
+TYPES = np.array(['nature', 'nightlife', 'culture', 'food'])
+
+
+def make_points(n, seed, lat_range=(-90, 90), lon_range=(-180, 180)):
+    rng = np.random.default_rng(seed)
+    lats = np.degrees(np.arcsin(rng.uniform(*np.sin(np.radians(lat_range)), n)))
+    lons = rng.uniform(*lon_range, n)
+    return np.arange(n) + 1, lats, lons, TYPES[rng.integers(0, len(TYPES), n)]
+
+
+def assert_same_neighbours(got, expected):
+    # Distances are continuous random values, so ties (and tie order) don't occur
+    assert [i for i, _ in got] == [i for i, _ in expected]
+    assert np.allclose([d for _, d in got], [d for _, d in expected])
+
+
+QUERIES = [
+    (48.1, 11.6),       # inside the data
+    (0.0, 179.999),     # on the antimeridian
+    (0.0, -180.0),
+    (-33.9, -179.5),    # just west of the antimeridian
+    (89.999, 0.0),      # north pole
+    (-90.0, 45.0),      # south pole
+    (90.0, -180.0),
+]
+
+
+@pytest.mark.parametrize('lat, lon', QUERIES)
+@pytest.mark.parametrize('n', [50, 5000, 50000])
+def test_matches_brute_force_globally(n, lat, lon):
+    ids, lats, lons, types = make_points(n, seed=n)
+    index = GeoIndex(ids, lats, lons, types)
+
+    for k in (1, 20, 100):
+        assert_same_neighbours(index.query(lat, lon, k=k), brute_force_nearest(ids, lats, lons, lat, lon, k=k))
+
+
+@pytest.mark.parametrize('lat, lon', QUERIES + [(0.0, -150.0), (-60.0, -100.0)])
+def test_matches_brute_force_far_from_clustered_data(lat, lon):
+    # Every point in Europe, so these queries cross many empty rings (and hit the fallback)
+    ids, lats, lons, types = make_points(50000, seed=1, lat_range=(36, 70), lon_range=(-10, 40))
+    index = GeoIndex(ids, lats, lons, types)
+
+    assert_same_neighbours(index.query(lat, lon, k=20), brute_force_nearest(ids, lats, lons, lat, lon, k=20))
+
+
+def test_points_straddling_the_antimeridian():
+    ids, lats, lons, types = make_points(2000, seed=3, lat_range=(-20, 20), lon_range=(175, 185))
+    lons = (lons + 180) % 360 - 180
+    index = GeoIndex(ids, lats, lons, types)
+
+    for lon in (179.9, -179.9, 180.0, -180.0):
+        assert_same_neighbours(index.query(0.0, lon, k=30), brute_force_nearest(ids, lats, lons, 0.0, lon, k=30))
+
+
+def test_radius_limits_results():
+    ids, lats, lons, types = make_points(20000, seed=4)
+    index = GeoIndex(ids, lats, lons, types)
+
+    got = index.query(10.0, 20.0, k=50, radius_km=300)
+
+    assert all(distance <= 300 for _, distance in got)
+    assert_same_neighbours(got, brute_force_nearest(ids, lats, lons, 10.0, 20.0, k=50, radius_km=300))
+    assert index.query(10.0, 20.0, k=50, radius_km=0.001) == []
+
+
+@pytest.mark.parametrize('lat, lon', [(48.1, 11.6), (0.0, -150.0), (-90.0, 0.0)])
+def test_type_filter(lat, lon):
+    ids, lats, lons, types = make_points(20000, seed=5, lat_range=(36, 70), lon_range=(-10, 40))
+    index = GeoIndex(ids, lats, lons, types)
+    nightlife = types == 'nightlife'
+
+    got = index.query(lat, lon, k=20, types=['nightlife'])
+
+    expected = brute_force_nearest(ids[nightlife], lats[nightlife], lons[nightlife], lat, lon, k=20)
+    assert_same_neighbours(got, expected)
+    assert index.query(lat, lon, k=20, types=['no-such-type']) == []
+
+
+def test_fewer_points_than_k_and_empty_index():
+    ids, lats, lons, types = make_points(7, seed=6)
+
+    assert len(GeoIndex(ids, lats, lons, types).query(0.0, 0.0, k=20)) == 7
+    assert GeoIndex([], [], [], []).query(0.0, 0.0) == []
+
+
+def test_haversine_known_distance():
+    # London -> Paris, about 344 km
+    assert haversine_km(51.5074, -0.1278, 48.8566, 2.3522) == pytest.approx(343.5, abs=1.0)
+    assert haversine_km(0.0, 179.5, 0.0, -179.5) == pytest.approx(111.2, abs=0.1)
+
+
+def test_nearby_endpoint_sorts_by_distance(client):
+    response = client.get('/api/locations/nearby?lat=48.8566&lon=2.3522&k=5')
+
+    distances = [location['distance_km'] for location in response.get_json()['locations']]
+    assert response.status_code == 200
+    assert len(distances) == 5
+    assert distances == sorted(distances)
+
+
+def test_nearby_endpoint_filters_by_type(client):
+    response = client.get('/api/locations/nearby?lat=0&lon=0&k=10&type=food')
+
+    assert {location['type'] for location in response.get_json()['locations']} == {'food'}
+
+
+@pytest.mark.parametrize('query', ['lat=0', 'lat=91&lon=0', 'lat=0&lon=0&k=0', 'lat=0&lon=0&k=1000',
+                                   'lat=0&lon=0&radius_km=-1', 'lat=x&lon=0'])
+def test_nearby_endpoint_rejects_bad_arguments(client, query):
+    assert client.get(f'/api/locations/nearby?{query}').status_code == 400
@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+from sqlalchemy import text
+
+from services import health
+
+
+def readiness_threads():
+    return [thread for thread in threading.enumerate() if thread.name == 'readiness-check']
+
+
+def test_live(client):
+    response = client.get('/api/health/live')
+
+    assert response.status_code == 200
+    assert response.get_json() == {'status': 'alive'}
+
+
+def test_ready_when_the_database_answers(client):
+    response = client.get('/api/health/ready')
+
+    assert response.status_code == 200
+    assert response.get_json() == {'status': 'ready'}
+
+
+def test_not_ready_when_the_check_fails(client, monkeypatch):
+    monkeypatch.setattr(health, 'text', lambda sql: text('SELECT * FROM no_such_table'))
+
+    response = client.get('/api/health/ready')
+
+    assert response.status_code == 503
+    body = response.get_json()
+    assert body['status'] == 'unavailable'
+    assert 'no_such_table' in body['error']
+
+
+def test_hung_database_holds_one_check_thread(make_app, monkeypatch):
+    app = make_app(HEALTH_READY_TIMEOUT=0.05)
+    client = app.test_client()
+    release = threading.Event()
+
+    def hang(sql):
+        release.wait(10)
+        return text(sql)
+    monkeypatch.setattr(health, 'text', hang)
+
+    try:
+        responses = [client.get('/api/health/ready') for _ in range(5)]
+
+        assert [response.status_code for response in responses] == [503] * 5
+        assert 'no answer within 0.05 s' in responses[-1].get_json()['error']
+        assert len(readiness_threads()) == 1
+    finally:
+        release.set()
+    app.extensions['readiness_check'][0].join(5)
+
+    assert client.get('/api/health/ready').status_code == 200
+
+
+@pytest.mark.parametrize('path', ['/api/health', '/api/health/stats'])
+def test_stats_shape(app, client, path):
+    from models import User, Location, Visit
+
+    response = client.get(path)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert set(body) == {'status', 'users_count', 'locations_count', 'visits_count', 'refreshed_at',
+                         'refresh_ms', 'stats_age_seconds', 'jwt_config'}
+    assert body['status'] == 'healthy'
+    assert set(body['jwt_config']) == {'token_location', 'header_name', 'header_type'}
+    with app.app_context():
+        assert (body['users_count'], body['locations_count'], body['visits_count']) == (
+            User.query.count(), Location.query.count(), Visit.query.count())
+    assert body['stats_age_seconds'] >= 0
+
+
+def test_stats_are_served_from_the_cache(make_app):
+    app = make_app(HEALTH_STATS_INTERVAL=3600)
+    client = app.test_client()
+    first = client.get('/api/health').get_json()
+    client.post('/api/auth/register', json={'username': 'newcomer', 'email': 'newcomer@example.com',
+                                            'password': 'password123'})
+
+    second = client.get('/api/health').get_json()
+
+    assert second['users_count'] == first['users_count']
+    assert second['refreshed_at'] == first['refreshed_at']
@@ -0,0 +1,120 @@
+import hashlib
+import json
+
+import pytest
+
+from services.idempotency import DONE, IN_PROGRESS, MAX_KEY_LENGTH, MISMATCH, NEW, MemoryBackend, SQLiteBackend
+from services.lru import BoundedLRU
+from tests.conftest import login
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def idempotent_client(request, make_app):
+    client = make_app(IDEMPOTENCY_BACKEND=request.param).test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = login(client)['Authorization']
+    return client
+
+
+def unvisited_location(client):
+    visited = {visit['location_id'] for visit in client.get('/api/visits/').get_json()['visits']}
+    locations = client.get('/api/locations/').get_json()['locations']
+    return next(location['id'] for location in locations if location['id'] not in visited)
+
+
+def post_visit(client, body, key='key-1'):
+    return client.post('/api/visits/', json=body, headers={'Idempotency-Key': key})
+
+
+def test_retry_replays_the_stored_response(idempotent_client):
+    body = {'location_id': unvisited_location(idempotent_client), 'rating': 4, 'notes': 'once'}
+
+    first = post_visit(idempotent_client, body)
+    retry = post_visit(idempotent_client, body)
+
+    assert first.status_code == retry.status_code == 201
+    assert 'Idempotent-Replayed' not in first.headers
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_json() == first.get_json()
+    visits = idempotent_client.get('/api/visits/').get_json()['visits']
+    assert sum(visit['location_id'] == body['location_id'] for visit in visits) == 1
+
+
+def test_key_reused_with_another_body_is_rejected(idempotent_client):
+    location_id = unvisited_location(idempotent_client)
+    post_visit(idempotent_client, {'location_id': location_id, 'rating': 4})
+
+    response = post_visit(idempotent_client, {'location_id': location_id, 'rating': 1})
+
+    assert response.status_code == 422
+
+
+def test_key_still_running_is_a_conflict(idempotent_client):
+    body = json.dumps({'location_id': unvisited_location(idempotent_client), 'rating': 4})
+    # The first request with the key is still running, e.g. on another worker
+    store = idempotent_client.application.extensions['idempotency']
+    store.claim('1:visits.add_visit:key-1', hashlib.sha256(body.encode()).hexdigest(), ttl=60, lock_timeout=30)
+
+    response = idempotent_client.post('/api/visits/', data=body, content_type='application/json',
+                                      headers={'Idempotency-Key': 'key-1'})
+
+    assert response.status_code == 409
+
+
+def test_keys_are_scoped_to_the_user(make_app):
+    app = make_app()
+    client = app.test_client()
+    client.post('/api/auth/register', json={'username': 'other', 'email': 'other@example.com',
+                                            'password': 'password123'})
+    demo, other = login(client), login(client, 'other')
+
+    first = client.post('/api/visits/', json={'location_id': 1, 'rating': 4},
+                        headers={**demo, 'Idempotency-Key': 'shared'})
+    second = client.post('/api/visits/', json={'location_id': 1, 'rating': 4},
+                         headers={**other, 'Idempotency-Key': 'shared'})
+
+    assert first.status_code == second.status_code == 201
+    assert 'Idempotent-Replayed' not in second.headers
+
+
+def test_long_key_is_rejected(idempotent_client):
+    response = post_visit(idempotent_client, {'location_id': 1, 'rating': 4}, key='k' * (MAX_KEY_LENGTH + 1))
+
+    assert response.status_code == 400
+
+
+def test_client_errors_are_replayed(idempotent_client):
+    body = {'location_id': 999999, 'rating': 4}
+
+    assert post_visit(idempotent_client, body).status_code == 404
+    # 4xx responses are stored like any other, only 5xx release the key
+    assert post_visit(idempotent_client, body).headers['Idempotent-Replayed'] == 'true'
+
+
+@pytest.mark.parametrize('make_store', [lambda tmp_path: MemoryBackend(),
+                                        lambda tmp_path: SQLiteBackend(str(tmp_path / 'keys.db'))])
+def test_store_claims(tmp_path, make_store):
+    store = make_store(tmp_path)
+
+    assert store.claim('a', 'fp', ttl=60, lock_timeout=10) == (NEW, None)
+    assert store.claim('a', 'fp', ttl=60, lock_timeout=10) == (IN_PROGRESS, None)
+    assert store.claim('a', 'other', ttl=60, lock_timeout=10) == (MISMATCH, None)
+    store.complete('a', 201, b'{}', 'application/json')
+    assert store.claim('a', 'fp', ttl=60, lock_timeout=10) == (DONE, (201, b'{}', 'application/json'))
+    # An abandoned claim expires after lock_timeout, a stored response after ttl
+    assert store.claim('b', 'fp', ttl=60, lock_timeout=10) == (NEW, None)
+    assert store.claim('b', 'fp', ttl=60, lock_timeout=-1) == (NEW, None)
+    store.release('a')
+    assert store.claim('a', 'fp', ttl=60, lock_timeout=10) == (NEW, None)
+
+
+def test_bounded_lru_evicts_least_recently_used():
+    lru = BoundedLRU(2)
+    lru.put('a', 1)
+    lru.put('b', 2)
+    assert lru.get('a') == 1  # 'a' is now the most recently used
+
+    lru.put('c', 3)
+
+    assert list(lru) == ['a', 'c']
+    assert lru.get('b', 'gone') == 'gone'
+    assert lru.pop('a') == 1 and len(lru) == 1
@@ -0,0 +1,68 @@
+import re
+
+import pytest
+
+from services import metrics
+from services.metrics import LATENCY_BUCKETS, QUERY_COUNT_BUCKETS, Registry
+
+
+@pytest.fixture
+def metrics_client(make_app):
+    app = make_app(METRICS_ENABLED=True)
+    metrics.registry.reset()
+    yield app.test_client()
+    metrics.registry.reset()
+
+
+def sample(text, name, **labels):
+    """Value of one sample in a /metrics body, 0 when absent"""
+    for line in text.splitlines():
+        match = re.fullmatch(rf'{name}(?:\{{(.*)\}})? (\S+)', line)
+        if match and dict(re.findall(r'(\w+)="([^"]*)"', match.group(1) or '')) == labels:
+            return float(match.group(2))
+    return 0.0
+
+
+def test_requests_are_counted_by_endpoint_and_status(metrics_client):
+    for _ in range(3):
+        metrics_client.get('/api/locations/1')
+    metrics_client.get('/api/locations/999999')
+
+    text = metrics_client.get('/metrics').get_data(as_text=True)
+
+    endpoint = 'locations.get_location'
+    assert sample(text, 'http_requests_total', endpoint=endpoint, method='GET', status='200') == 3
+    assert sample(text, 'http_requests_total', endpoint=endpoint, method='GET', status='404') == 1
+    assert sample(text, 'http_request_duration_seconds_count', endpoint=endpoint) == 4
+    assert sample(text, 'http_request_duration_seconds_bucket', endpoint=endpoint, le='+Inf') == 4
+    # Every lookup runs at least one SQL statement
+    assert sample(text, 'db_queries_per_request_sum', endpoint=endpoint) >= 4
+    assert sample(text, 'db_query_seconds_total', endpoint=endpoint) > 0
+
+
+def test_record_request_matches_separate_updates():
+    labels = (('endpoint', 'visits.add_visit'),)
+    batched, separate = Registry(), Registry()
+
+    for seconds, queries, db_seconds in ((0.004, 3, 0.001), (0.2, 0, 0.0), (0.004, 12, 0.05)):
+        batched.record_request('visits.add_visit', 'POST', 201, seconds, queries, db_seconds)
+        separate.inc('http_requests_total', labels + (('method', 'POST'), ('status', '201')))
+        separate.observe('http_request_duration_seconds', labels, seconds, LATENCY_BUCKETS)
+        separate.observe('db_queries_per_request', labels, queries, QUERY_COUNT_BUCKETS)
+        if db_seconds:
+            separate.inc('db_query_seconds_total', labels, db_seconds)
+
+    assert batched.snapshot() == separate.snapshot()
+    batched.reset()
+    batched.record_request('visits.add_visit', 'POST', 201, 0.004, 1, 0.0)
+    assert [name for name, _, _ in batched.snapshot()['histograms']] == [
+        'http_request_duration_seconds', 'db_queries_per_request']
+
+
+def test_disabled_metrics_add_no_request_hooks(make_app):
+    app = make_app(METRICS_ENABLED=False)
+
+    hooks = [f.__name__ for f in app.before_request_funcs.get(None, []) + app.after_request_funcs.get(None, [])]
+
+    assert 'start_timer' not in hooks and 'record_request' not in hooks
+    assert app.test_client().get('/metrics').status_code == 404
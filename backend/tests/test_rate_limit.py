@@ -0,0 +1,110 @@
+import types
+
+import pytest
+
+from services import rate_limit
+from services.rate_limit import MemoryBackend, SQLiteBackend, parse_limit
+
+
+def test_parse_limit():
+    assert parse_limit('10/minute') == (10.0, 10 / 60)
+    assert parse_limit('5/hours') == (5.0, 5 / 3600)
+    assert parse_limit('3/30 seconds') == (3.0, 0.1)
+    with pytest.raises(ValueError):
+        parse_limit('10/fortnight')
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake time for the rate limit module; advance it by adding to clock.now"""
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(rate_limit, 'time', types.SimpleNamespace(monotonic=lambda: clock.now,
+                                                                  time=lambda: clock.now))
+    return clock
+
+
+@pytest.mark.parametrize('make_backend', [lambda tmp_path: MemoryBackend(),
+                                          lambda tmp_path: SQLiteBackend(str(tmp_path / 'buckets.db'))])
+def test_bucket_empties_and_refills(tmp_path, clock, make_backend):
+    backend = make_backend(tmp_path)
+    capacity, rate = parse_limit('2/minute')
+
+    assert backend.take('key', capacity, rate) == (True, 0.0)
+    assert backend.take('key', capacity, rate) == (True, 0.0)
+    allowed, retry_after = backend.take('key', capacity, rate)
+    assert not allowed
+    assert retry_after == pytest.approx(30)
+    assert backend.take('other key', capacity, rate)[0]
+
+    clock.now += 30
+    assert backend.take('key', capacity, rate)[0]
+    assert not backend.take('key', capacity, rate)[0]
+
+
+def test_memory_backend_forgets_least_recently_used_keys(clock):
+    backend = MemoryBackend(max_keys=2)
+    capacity, rate = parse_limit('1/hour')
+
+    backend.take('a', capacity, rate)
+    backend.take('b', capacity, rate)
+    backend.take('c', capacity, rate)
+
+    assert list(backend.buckets) == ['b', 'c']
+    assert backend.take('a', capacity, rate)[0]
+
+
+def test_sqlite_buckets_are_shared(tmp_path, clock):
+    path = str(tmp_path / 'buckets.db')
+    first, second = SQLiteBackend(path), SQLiteBackend(path)
+    capacity, rate = parse_limit('1/minute')
+
+    assert first.take('key', capacity, rate)[0]
+    assert not second.take('key', capacity, rate)[0]
+
+
+def login_attempt(client, username='demouser', address='10.0.0.1'):
+    return client.post('/api/auth/login', json={'username': username, 'password': 'wrong password'},
+                       environ_base={'REMOTE_ADDR': address})
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_login_is_limited_per_account(make_app, backend):
+    client = make_app(RATE_LIMIT_BACKEND=backend, AUTH_RATE_LIMIT_ACCOUNT='3/minute').test_client()
+
+    statuses = [login_attempt(client, address=f'10.0.0.{i}').status_code for i in range(4)]
+    limited = login_attempt(client, address='10.0.0.9')
+
+    assert statuses == [401, 401, 401, 429]
+    assert limited.status_code == 429
+    assert int(limited.headers['Retry-After']) >= 1
+    # Other accounts are unaffected, and so is the username's case
+    assert login_attempt(client, username='someoneelse').status_code == 401
+    assert login_attempt(client, username='DemoUser').status_code == 429
+
+
+def test_login_is_limited_per_ip(make_app):
+    client = make_app(AUTH_RATE_LIMIT_IP='2/minute').test_client()
+
+    assert login_attempt(client, username='a').status_code == 401
+    assert login_attempt(client, username='b').status_code == 401
+    assert login_attempt(client, username='c').status_code == 429
+    assert login_attempt(client, username='d', address='10.0.0.2').status_code == 401
+
+
+def test_forwarded_for_is_only_trusted_behind_proxies(make_app):
+    direct = make_app(AUTH_RATE_LIMIT_IP='1/minute').test_client()
+    proxied = make_app(AUTH_RATE_LIMIT_IP='1/minute', RATE_LIMIT_PROXY_HOPS=1).test_client()
+
+    def attempt(client, forwarded_for):
+        return client.post('/api/auth/login', json={'username': forwarded_for, 'password': 'x'},
+                           headers={'X-Forwarded-For': forwarded_for}).status_code
+
+    # Spoofing the header doesn't get a direct client a fresh bucket
+    assert [attempt(direct, '1.1.1.1'), attempt(direct, '2.2.2.2')] == [401, 429]
+    assert [attempt(proxied, '1.1.1.1'), attempt(proxied, '2.2.2.2')] == [401, 401]
+
+
+def test_rate_limiting_can_be_disabled(make_app):
+    client = make_app(RATE_LIMIT_ENABLED=False, AUTH_RATE_LIMIT_ACCOUNT='1/minute').test_client()
+
+    assert [login_attempt(client).status_code for _ in range(3)] == [401, 401, 401]
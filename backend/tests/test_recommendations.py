@@ -0,0 +1,130 @@
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from services.diversity import mmr_order
+from services.recommendation_engine import type_preferences
+from tests.conftest import login
+
+TYPES = ('nature', 'recreational', 'nightlife', 'culture', 'food')
+
+
+def add_locations(count, seed):
+    """Bulk insert count highly rated locations of every type, scattered around the seeded ones"""
+    from models import db, Location
+    from services.ratings import rebuild_rating_aggregates
+
+    rng = random.Random(seed)
+    anchors = db.session.query(Location.latitude, Location.longitude).all()
+    rows = []
+    for i in range(count):
+        lat, lon = rng.choice(anchors)
+        rows.append({
+            'name': f'Extra place {i}',
+            'city': f'City {i % 97}',
+            'country': f'Country {i % 31}',
+            'description': 'Added by the recommendation tests.',
+            'price_level': rng.randint(1, 5),
+            'type': rng.choice(TYPES),
+            'rating': round(rng.uniform(3.0, 5.0), 1),
+            'latitude': max(-90.0, min(90.0, lat + rng.gauss(0, 1.5))),
+            'longitude': (lon + rng.gauss(0, 1.5) + 180) % 360 - 180,
+        })
+    db.session.execute(Location.__table__.insert(), rows)
+    db.session.commit()
+    rebuild_rating_aggregates()
+
+
+def test_type_preferences_smooth_towards_the_users_average():
+    preferences = type_preferences([('nightlife', 5)] * 8 + [('nightlife', 4)] * 9 + [('food', 1), ('food', 2)])
+
+    assert preferences['nightlife'] > preferences['culture'] > preferences['food']
+    # One visit doesn't make a type a certainty
+    assert type_preferences([('food', 5)])['food'] < 1
+    # Untried types get the user's overall preference, pulled towards 3 stars
+    assert type_preferences([])['culture'] == pytest.approx(3 / 5)
+
+
+def test_mmr_without_diversity_ranks_by_score():
+    scores = [0.2, 0.9, 0.5]
+
+    assert mmr_order(scores, ['food'] * 3, [1, 2, 3], [0] * 3, [0] * 3, 3, diversity=0) == [1, 2, 0]
+
+
+def test_mmr_mixes_types_when_scores_are_close():
+    # Nightlife a few percent ahead, every place in the same city at the same price level
+    rng = np.random.default_rng(0)
+    types = ['nightlife'] * 20 + ['food'] * 20
+    scores = np.concatenate((rng.uniform(0.88, 0.9, 20), rng.uniform(0.8, 0.82, 20)))
+
+    order = mmr_order(scores, types, [3] * 40, [48.1] * 40, [11.6] * 40, 10, diversity=0.3)
+
+    # Food comes in second despite ranking below every nightlife place
+    assert [types[i] for i in order[:2]] == ['nightlife', 'food']
+
+
+@pytest.mark.parametrize('mode', ['content', 'geo'])
+def test_personalized_recommendations_mix_types(make_app, mode):
+    # The demo user has only visited (and liked) nightlife; thousands of top rated
+    # places of every type are around, so a type-by-type pool would be all nightlife
+    app = make_app()
+    with app.app_context():
+        add_locations(5000, seed=1)
+    client = app.test_client()
+
+    response = client.get(f'/api/recommendations/personalized?mode={mode}', headers=login(client))
+
+    types = Counter(location['type'] for location in response.get_json()['recommendations'])
+    assert response.status_code == 200
+    assert sum(types.values()) == 10
+    assert len(types) >= 3
+    assert types['nightlife'] >= 1
+    assert max(types.values()) < 10
+
+
+def test_personalized_recommendations_favour_the_preferred_type(make_app):
+    app = make_app()
+    with app.app_context():
+        add_locations(5000, seed=2)
+    client = app.test_client()
+
+    response = client.get('/api/recommendations/personalized?mode=content', headers=login(client))
+
+    types = Counter(location['type'] for location in response.get_json()['recommendations'])
+    assert types.most_common(1)[0][0] == 'nightlife'
+
+
+def test_personalized_recommendations_skip_visited_places(app, client, auth_headers):
+    from models import Visit
+
+    with app.app_context():
+        visited = {visit.location_id for visit in Visit.query.filter_by(user_id=1)}
+
+    for mode in ('content', 'geo'):
+        response = client.get(f'/api/recommendations/personalized?mode={mode}', headers=auth_headers)
+        assert visited.isdisjoint(location['id'] for location in response.get_json()['recommendations'])
+
+
+def test_geo_recommendations_without_coordinates_fall_back_to_content(make_app):
+    from models import db, User, Visit
+
+    app = make_app()
+    client = app.test_client()
+    client.post('/api/auth/register', json={'username': 'wanderer', 'email': 'wanderer@example.com',
+                                            'password': 'password123'})
+    with app.app_context():
+        user_id = User.query.filter_by(username='wanderer').one().id
+        # Visits whose locations have since been removed: nothing to place on the map
+        db.session.add_all([Visit(user_id=user_id, location_id=location_id, rating=5)
+                            for location_id in (900001, 900002)])
+        db.session.commit()
+    headers = login(client, 'wanderer')
+
+    geo = client.get('/api/recommendations/personalized?mode=geo', headers=headers)
+    content = client.get('/api/recommendations/personalized?mode=content', headers=headers)
+
+    assert geo.status_code == 200
+    assert len(geo.get_json()['recommendations']) == 10
+    assert geo.get_json()['recommendations'] == content.get_json()['recommendations']
@@ -0,0 +1,48 @@
+import logging
+import shutil
+import sqlite3
+
+import pytest
+
+from services import sql_timing
+
+
+@pytest.fixture
+def slow_log(caplog):
+    caplog.set_level(logging.WARNING, logger='sql.slow')
+    yield caplog
+    sql_timing._observers.pop('sql_profiler', None)
+
+
+def slow_records(caplog):
+    return [record for record in caplog.records if record.name == 'sql.slow']
+
+
+def test_server_timing_header(make_app, slow_log):
+    client = make_app(SQL_PROFILING_ENABLED=True, SQL_SLOW_QUERY_MS=60000).test_client()
+
+    response = client.get('/api/locations/1')
+
+    assert response.headers['Server-Timing'].startswith('db;dur=')
+    assert '1 statements, 0 duplicate' in response.headers['Server-Timing']
+    assert slow_records(slow_log) == []
+
+
+def test_slow_statements_are_explained_on_the_database_they_ran_on(make_app, seeded_database, tmp_path, slow_log):
+    replica = tmp_path / 'replica.db'
+    shutil.copy(seeded_database, replica)
+    # The replica indexes location types differently, so its plan differs from the primary's
+    connection = sqlite3.connect(replica)
+    connection.executescript('DROP INDEX ix_locations_type_bayesian_rating;'
+                             'CREATE INDEX ix_replica_only_type ON locations (type);')
+    connection.close()
+    client = make_app(SQL_PROFILING_ENABLED=True, SQL_SLOW_QUERY_MS=0,
+                      SQLALCHEMY_REPLICA_URIS=f'sqlite:///{replica}').test_client()
+
+    response = client.get('/api/locations/search?type=food')
+    response.close()  # the slow-query log is written once the response is closed
+
+    records = slow_records(slow_log)
+    assert records
+    assert {record.database for record in records} == {f'sqlite:///{replica}'}
+    assert any('ix_replica_only_type' in line for record in records for line in record.plan or ())
@@ -0,0 +1,76 @@
+import re
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from services import sql_timing
+from services.sql_timing import observe_statements
+
+
+@pytest.fixture
+def recorder():
+    """An observer that is active while recorder.active is set, keeping what it saw"""
+    class Recorder:
+        active = True
+        started = []
+        ended = []
+        failed = []
+
+    observe_statements(
+        'test', lambda: Recorder.active,
+        on_start=lambda conn, statement: Recorder.started.append(statement) or len(Recorder.started),
+        on_end=lambda token, statement, parameters, executemany, seconds: Recorder.ended.append((token, seconds)),
+        on_error=lambda token, error: Recorder.failed.append((token, error)),
+    )
+    yield Recorder
+    Recorder.active = False
+    sql_timing._observers.pop('test')
+
+
+def test_observer_gets_token_and_duration(app, recorder):
+    from models import db
+
+    with app.app_context():
+        db.session.execute(text('SELECT 1')).all()
+        recorder.active = False
+        db.session.execute(text('SELECT 2')).all()
+
+    assert recorder.started == ['SELECT 1']
+    assert len(recorder.ended) == 1
+    token, seconds = recorder.ended[0]
+    assert token == 1
+    assert seconds >= 0
+
+
+def test_failed_statement_pops_its_timer(app, recorder):
+    from models import db
+
+    with app.app_context():
+        with pytest.raises(OperationalError):
+            db.session.execute(text('SELECT * FROM no_such_table'))
+        connection = db.session.connection()
+        assert not connection.info.get('sql_timing')
+        db.session.rollback()
+
+    assert recorder.ended == []
+    assert len(recorder.failed) == 1
+    assert isinstance(recorder.failed[0][1], Exception)
+
+
+def test_profiler_server_timing_counts_statements(make_app):
+    client = make_app(SQL_PROFILING_ENABLED=True).test_client()
+
+    header = client.get('/api/locations/1').headers['Server-Timing']
+
+    match = re.search(r'db;dur=([\d.]+);desc="(\d+) statements', header)
+    assert match and int(match.group(2)) >= 1
+
+
+def test_metrics_count_queries_per_request(make_app):
+    client = make_app(METRICS_ENABLED=True).test_client()
+    client.get('/api/locations/1')
+
+    body = client.get('/metrics').get_data(as_text=True)
+
+    assert re.search(r'db_queries_per_request_count\{endpoint="locations\.\w+"\} [1-9]', body)
@@ -0,0 +1,49 @@
+import json
+
+
+def exported_spans(path):
+    with open(path) as f:
+        traces = [json.loads(line) for line in f]
+    return [span for trace in traces for span in trace['resourceSpans'][0]['scopeSpans'][0]['spans']]
+
+
+def test_sampled_request_has_db_query_spans(make_app, tmp_path):
+    export_path = str(tmp_path / 'traces.jsonl')
+    client = make_app(TRACING_SAMPLE_RATE=1.0, TRACING_EXPORT=export_path).test_client()
+
+    response = client.get('/api/locations/1')
+    response.close()
+
+    spans = exported_spans(export_path)
+    root = next(span for span in spans if 'parentSpanId' not in span)
+    queries = [span for span in spans if span['name'] == 'db.query']
+    assert response.headers['traceparent'].split('-')[1] == root['traceId']
+    assert queries
+    for query in queries:
+        attributes = {attribute['key']: attribute['value'] for attribute in query['attributes']}
+        assert attributes['db.system'] == {'stringValue': 'sqlite'}
+        assert 'SELECT' in attributes['db.statement']['stringValue']
+        assert int(query['endTimeUnixNano']) >= int(query['startTimeUnixNano'])
+
+
+def test_unsampled_requests_are_not_traced(make_app, tmp_path):
+    export_path = tmp_path / 'traces.jsonl'
+    client = make_app(TRACING_SAMPLE_RATE=1e-12, TRACING_EXPORT=str(export_path)).test_client()
+
+    response = client.get('/api/locations/1')
+    response.close()
+
+    assert 'traceparent' not in response.headers
+    assert not export_path.exists()
+
+
+def test_traceparent_is_honoured(make_app, tmp_path):
+    export_path = str(tmp_path / 'traces.jsonl')
+    client = make_app(TRACING_HONOR_TRACEPARENT=True, TRACING_EXPORT=export_path).test_client()
+    trace_id, parent_id = 'a' * 32, 'b' * 16
+
+    client.get('/api/locations/1', headers={'traceparent': f'00-{trace_id}-{parent_id}-01'}).close()
+
+    spans = exported_spans(export_path)
+    assert {span['traceId'] for span in spans} == {trace_id}
+    assert any(span.get('parentSpanId') == parent_id for span in spans)
@@ -0,0 +1,207 @@
+import os
+
+import pytest
+
+from services.visit_journal import get_applier
+from tests.conftest import login, make_config
+
+
+def stats_after_rebuild(app, user_id=1):
+    from services.user_stats import get_user_stats, rebuild_user_stats
+
+    with app.app_context():
+        rebuild_user_stats()
+        return get_user_stats(user_id)
+
+
+def assert_same_stats(kept, rebuilt):
+    # Detours are summed as floats one write at a time, the rebuild adds the whole trip up at once
+    assert kept['distance_km'] == pytest.approx(rebuilt['distance_km'], abs=0.2)
+    assert {**kept, 'distance_km': None} == {**rebuilt, 'distance_km': None}
+
+
+def unvisited_locations(client, count):
+    visited = {visit['location_id'] for visit in client.get('/api/visits/').get_json()['visits']}
+    locations = client.get('/api/locations/').get_json()['locations']
+    return [location['id'] for location in locations if location['id'] not in visited][:count]
+
+
+@pytest.fixture(params=[False, True], ids=['direct', 'write-behind'])
+def stats_app(request, make_app):
+    app = make_app(VISIT_WRITE_BEHIND=request.param)
+    if request.param:
+        get_applier(app).pid = os.getpid()  # no applier thread, each test drains the journal
+    return app
+
+
+def write(app, send):
+    """Send a visit write and wait until it reaches the visits table"""
+    response = send()
+    assert response.status_code in (200, 201, 202)
+    applier = get_applier(app)
+    if applier is not None:
+        applier.drain()
+    return response
+
+
+def test_seeded_stats_match_a_rebuild(stats_app):
+    client = stats_app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = login(client)['Authorization']
+
+    kept = client.get('/api/visits/stats').get_json()
+
+    assert kept['visit_count'] > 0
+    assert_same_stats(kept, stats_after_rebuild(stats_app))
+
+
+def test_stats_follow_adds_updates_and_deletes(stats_app):
+    client = stats_app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = login(client)['Authorization']
+    before = client.get('/api/visits/stats').get_json()
+    first, second, third = unvisited_locations(client, 3)
+    seeded = client.get('/api/visits/').get_json()['visits']
+    # A visit from the middle of the trip, so the delete has neighbours on both sides
+    middle = sorted(seeded, key=lambda visit: (visit['visit_date'], visit['id']))[len(seeded) // 2]
+
+    write(stats_app, lambda: client.post('/api/visits/', json={'location_id': first, 'rating': 2}))
+    write(stats_app, lambda: client.post('/api/visits/', json={'location_id': second, 'rating': 5}))
+    write(stats_app, lambda: client.post('/api/visits/', json={'location_id': third, 'rating': 1}))
+    write(stats_app, lambda: client.post('/api/visits/', json={'location_id': first, 'rating': 4}))
+    write(stats_app, lambda: client.post('/api/visits/', json={'location_id': second, 'notes': 'notes only'}))
+    write(stats_app, lambda: client.delete(f'/api/visits/{middle["id"]}'))
+    third_id = next(visit['id'] for visit in client.get('/api/visits/').get_json()['visits']
+                    if visit['location_id'] == third)
+    write(stats_app, lambda: client.delete(f'/api/visits/{third_id}'))
+
+    kept = client.get('/api/visits/stats').get_json()
+
+    assert kept['visit_count'] == before['visit_count'] + 1
+    assert kept['rated_visits'] == before['rated_visits'] + 1
+    assert_same_stats(kept, stats_after_rebuild(stats_app))
+
+
+def test_rebuild_is_stable(make_app):
+    from services.user_stats import get_user_stats, rebuild_user_stats
+
+    app = make_app()
+    with app.app_context():
+        users = rebuild_user_stats()
+        once = get_user_stats(1)
+        assert rebuild_user_stats() == users
+        assert get_user_stats(1) == once
+
+
+def test_user_without_visits_has_empty_stats(make_app):
+    from models import User
+
+    app = make_app()
+    client = app.test_client()
+    client.post('/api/auth/register', json={'username': 'newcomer', 'email': 'newcomer@example.com',
+                                            'password': 'password123'})
+
+    stats = client.get('/api/visits/stats', headers=login(client, 'newcomer')).get_json()
+
+    assert stats == {
+        'visit_count': 0, 'countries_visited': 0, 'visits_by_country': {}, 'visits_by_type': {},
+        'visits_by_rating': {str(rating): 0 for rating in range(1, 6)},
+        'rated_visits': 0, 'average_rating': None, 'distance_km': 0.0,
+    }
+    with app.app_context():
+        user_id = User.query.filter_by(username='newcomer').one().id
+    assert stats_after_rebuild(app, user_id) == stats
+
+
+@pytest.mark.parametrize('rating', ['4', 4.0])
+def test_rating_is_stored_as_an_integer(stats_app, rating):
+    client = stats_app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = login(client)['Authorization']
+    first, second = unvisited_locations(client, 2)
+    before = client.get('/api/visits/stats').get_json()
+
+    added = write(stats_app, lambda: client.post('/api/visits/', json={'location_id': first, 'rating': rating}))
+    write(stats_app, lambda: client.post('/api/visits/', json={'location_id': second, 'rating': 2}))
+    updated = write(stats_app, lambda: client.post('/api/visits/', json={'location_id': second, 'rating': rating}))
+
+    assert added.get_json()['visit']['rating'] == updated.get_json()['visit']['rating'] == 4
+    kept = client.get('/api/visits/stats').get_json()
+    assert kept['visits_by_rating']['4'] == before['visits_by_rating']['4'] + 2
+    assert set(kept['visits_by_rating']) == {'1', '2', '3', '4', '5'}
+    assert_same_stats(kept, stats_after_rebuild(stats_app))
+
+
+@pytest.mark.parametrize('rating', ['four', '4.5', 0, 6, [4]])
+def test_bad_rating_is_rejected(stats_app, rating):
+    client = stats_app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = login(client)['Authorization']
+    new_location = unvisited_locations(client, 1)[0]
+    visited = client.get('/api/visits/').get_json()['visits'][0]['location_id']
+
+    assert client.post('/api/visits/', json={'location_id': new_location, 'rating': rating}).status_code == 400
+    assert client.post('/api/visits/', json={'location_id': visited, 'rating': rating}).status_code == 400
+
+
+def test_seed_all_data_builds_user_stats(tmp_path, capsys):
+    from app import create_app
+    from models import db, User
+    from seed_data import seed_all_data
+    from services.user_stats import get_user_stats
+
+    config = make_config(str(tmp_path), CATALOG_SNAPSHOT_ENABLED=False)
+    app = create_app(config)
+    with app.app_context():
+        db.create_all(bind_key=None)
+
+    # Seeded visits skip the per-write stats path, so the seed has to build the aggregates itself
+    seed_all_data(config)
+
+    with app.app_context():
+        user_id = User.query.filter_by(username='demouser').one().id
+        seeded = get_user_stats(user_id)
+
+    assert seeded['visit_count'] > 0
+    assert seeded == stats_after_rebuild(app, user_id)
+
+
+@pytest.mark.parametrize('native', [True, False], ids=['on-conflict', 'update-then-insert'])
+def test_add_to_rows(make_app, monkeypatch, native):
+    from models import db, UserVisitCount
+    from services import dialect
+
+    if not native:
+        # As on a database without INSERT ... ON CONFLICT
+        monkeypatch.setattr(dialect, '_native_insert', lambda name: None)
+    table = UserVisitCount.__table__
+    keys = ['user_id', 'kind', 'value']
+    app = make_app()
+    with app.app_context():
+        db.session.execute(table.delete())
+        dialect.add_to_rows(db.session, table, keys, [
+            {'user_id': 1, 'kind': 'type', 'value': 'food', 'count': 2},
+        ])
+        dialect.add_to_rows(db.session, table, keys, [
+            {'user_id': 1, 'kind': 'type', 'value': 'food', 'count': 3},
+            {'user_id': 1, 'kind': 'type', 'value': 'nature', 'count': 1},
+        ])
+        db.session.commit()
+
+        rows = {(row.value, row.count) for row in UserVisitCount.query}
+
+    assert rows == {('food', 5), ('nature', 1)}
+
+
+def test_visit_writes_without_native_upsert(make_app, monkeypatch):
+    from services import dialect
+
+    monkeypatch.setattr(dialect, '_native_insert', lambda name: None)
+    app = make_app()
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = login(client)['Authorization']
+    location_id, other_location = unvisited_locations(client, 2)
+
+    write(app, lambda: client.post('/api/visits/', json={'location_id': location_id, 'rating': 3}))
+    visit_id = next(visit['id'] for visit in client.get('/api/visits/').get_json()['visits']
+                    if visit['location_id'] == location_id)
+    write(app, lambda: client.delete(f'/api/visits/{visit_id}'))
+    write(app, lambda: client.post('/api/visits/', json={'location_id': other_location, 'rating': 5}))
+
+    assert_same_stats(client.get('/api/visits/stats').get_json(), stats_after_rebuild(app))
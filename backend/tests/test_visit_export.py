@@ -0,0 +1,108 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from services.visit_export import CSV_HEADER
+from tests.conftest import login
+
+
+@pytest.fixture
+def export_client(make_app):
+    # A small batch size so the export is streamed in several chunks
+    client = make_app(VISITS_EXPORT_BATCH_SIZE=4).test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = login(client)['Authorization']
+    return client
+
+
+def listed_visits(client):
+    return client.get('/api/visits/').get_json()['visits']
+
+
+def test_csv_export(export_client):
+    visits = listed_visits(export_client)
+
+    response = export_client.get('/api/visits/export?format=csv', headers={'Accept-Encoding': 'identity'})
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'] == 'attachment; filename="chillquest-visits.csv"'
+    assert 'Content-Encoding' not in response.headers
+    header, *rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert tuple(header) == CSV_HEADER
+    assert len(rows) == len(visits) > 4
+    # Newest first, like the visit list
+    assert [int(row[0]) for row in rows] == [visit['id'] for visit in visits]
+    exported = {int(row[0]): dict(zip(CSV_HEADER, row)) for row in rows}
+    for visit in visits:
+        row = exported[visit['id']]
+        assert int(row['location_id']) == visit['location_id']
+        assert row['rating'] == str(visit['rating'])
+        assert row['name'] == visit['location']['name']
+
+
+def test_geojson_export(export_client):
+    visits = {visit['id']: visit for visit in listed_visits(export_client)}
+
+    response = export_client.get('/api/visits/export?format=geojson', headers={'Accept-Encoding': 'identity'})
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/geo+json'
+    assert response.headers['Content-Disposition'] == 'attachment; filename="chillquest-visits.geojson"'
+    collection = json.loads(response.get_data())
+    assert collection['type'] == 'FeatureCollection'
+    assert len(collection['features']) == len(visits)
+    for feature in collection['features']:
+        visit = visits[feature['properties']['visit_id']]
+        assert feature['type'] == 'Feature'
+        assert feature['geometry']['type'] == 'Point'
+        # GeoJSON positions are [longitude, latitude]
+        assert feature['geometry']['coordinates'] == [visit['location']['longitude'], visit['location']['latitude']]
+        assert feature['properties']['rating'] == visit['rating']
+        assert feature['properties']['type'] == visit['location']['type']
+
+
+@pytest.mark.parametrize('export_format', ['csv', 'geojson'])
+def test_gzip_export_has_the_same_content(export_client, export_format):
+    plain = export_client.get(f'/api/visits/export?format={export_format}', headers={'Accept-Encoding': 'identity'})
+
+    response = export_client.get(f'/api/visits/export?format={export_format}', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.get_data()) == plain.get_data()
+
+
+def test_export_is_streamed_in_batches(export_client):
+    response = export_client.get('/api/visits/export?format=csv', headers={'Accept-Encoding': 'identity'})
+
+    chunks = list(response.response)
+
+    assert len(chunks) > 1
+    assert next(csv.reader(io.StringIO(chunks[0].decode('utf-8')))) == list(CSV_HEADER)
+
+
+def test_export_of_a_user_without_visits(make_app):
+    client = make_app().test_client()
+    client.post('/api/auth/register', json={'username': 'newcomer', 'email': 'newcomer@example.com',
+                                            'password': 'password123'})
+    headers = {**login(client, 'newcomer'), 'Accept-Encoding': 'identity'}
+
+    assert client.get('/api/visits/export?format=csv', headers=headers).get_data(as_text=True).strip() == \
+        ','.join(CSV_HEADER)
+    assert json.loads(client.get('/api/visits/export?format=geojson', headers=headers).get_data()) == \
+        {'type': 'FeatureCollection', 'features': []}
+
+
+def test_unknown_format_is_rejected(export_client):
+    response = export_client.get('/api/visits/export?format=xlsx')
+
+    assert response.status_code == 400
+    assert 'csv' in response.get_json()['message']
+
+
+def test_export_requires_login(client):
+    assert client.get('/api/visits/export').status_code == 401
@@ -0,0 +1,164 @@
+import os
+
+import pytest
+
+from services import visit_journal
+from services.visit_journal import apply_batch, get_applier
+from tests.conftest import login
+
+
+@pytest.fixture
+def journal_app(make_app):
+    """App with write-behind on and no applier thread: the tests drain the journal themselves"""
+    app = make_app(VISIT_WRITE_BEHIND=True)
+    get_applier(app).pid = os.getpid()  # as if this process had started its thread
+    return app
+
+
+@pytest.fixture
+def journal(journal_app):
+    return get_applier(journal_app).journal
+
+
+@pytest.fixture
+def journal_client(journal_app):
+    client = journal_app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = login(client)['Authorization']
+    return client
+
+
+def unvisited_location(app, user_id=1):
+    from models import Location, Visit
+
+    with app.app_context():
+        visited = {visit.location_id for visit in Visit.query.filter_by(user_id=user_id)}
+        return next(location.id for location in Location.query.order_by(Location.id) if location.id not in visited)
+
+
+def visit_and_aggregates(app, location_id, user_id=1):
+    """(rating of the user's visit or None, location rating_count, location rating_sum, user's visit count)"""
+    from models import db, Location, Visit
+    from services.user_stats import get_user_stats
+
+    with app.app_context():
+        visit = Visit.query.filter_by(user_id=user_id, location_id=location_id).first()
+        location = db.session.get(Location, location_id)
+        return (visit.rating if visit else None, location.rating_count, location.rating_sum,
+                get_user_stats(user_id)['visit_count'])
+
+
+def test_post_is_journaled_and_applied(journal_app, journal, journal_client):
+    location_id = unvisited_location(journal_app)
+    _, count, total, visits = visit_and_aggregates(journal_app, location_id)
+
+    response = journal_client.post('/api/visits/', json={'location_id': location_id, 'rating': 4})
+
+    assert response.status_code == 202
+    assert response.get_json()['visit']['pending']
+    assert visit_and_aggregates(journal_app, location_id)[0] is None
+    # Read your own writes before the journal is applied
+    listed = {visit['location_id']: visit for visit in journal_client.get('/api/visits/').get_json()['visits']}
+    assert listed[location_id]['pending'] and listed[location_id]['rating'] == 4
+
+    get_applier(journal_app).drain()
+
+    assert journal.pending_count() == 0
+    assert visit_and_aggregates(journal_app, location_id) == (4, count + 1, total + 4, visits + 1)
+
+
+def test_replay_after_crash_before_mark_applied(journal_app, journal, monkeypatch):
+    location_id = unvisited_location(journal_app)
+    before = visit_and_aggregates(journal_app, location_id)
+    journal.append(1, location_id, 5, 'first', True)
+    journal.append(1, location_id, 3, None, False)
+    applier = get_applier(journal_app)
+
+    # The main transaction commits, then the process dies before the journal hears about it
+    def crash(seqs, error=None):
+        raise SystemExit('crashed')
+    monkeypatch.setattr(journal, 'mark_applied', crash)
+    with pytest.raises(SystemExit):
+        applier.drain()
+    monkeypatch.undo()
+    applied_once = visit_and_aggregates(journal_app, location_id)
+    assert journal.pending_count() == 2
+
+    applier.drain()
+
+    assert journal.pending_count() == 0
+    assert visit_and_aggregates(journal_app, location_id) == applied_once
+    assert applied_once == (3, before[1] + 1, before[2] + 3, before[3] + 1)
+
+
+def test_duplicate_idempotency_key_is_journaled_once(journal_app, journal, journal_client):
+    location_id = unvisited_location(journal_app)
+    headers = {'Idempotency-Key': 'retry-me'}
+
+    first = journal_client.post('/api/visits/', json={'location_id': location_id, 'rating': 2}, headers=headers)
+    again = journal_client.post('/api/visits/', json={'location_id': location_id, 'rating': 2}, headers=headers)
+
+    assert first.status_code == again.status_code == 202
+    assert first.get_json()['journal_key'] == again.get_json()['journal_key'] == '1:retry-me'
+    assert journal.pending_count() == 1
+    # The journal dedupes on its own too, long after the idempotency store has forgotten the key
+    assert journal.append(1, location_id, 2, key='1:retry-me') == ('1:retry-me', False)
+    assert journal.pending_count() == 1
+
+
+def test_poisoned_entry_does_not_block_the_batch(journal_app, journal, monkeypatch):
+    first, poisoned, last = (unvisited_location(journal_app) + i for i in range(3))
+    for location_id in (first, poisoned, last):
+        journal.append(1, location_id, 4, '', True)
+    apply_entry = visit_journal._apply_entry
+
+    def failing(entry, *args):
+        if entry['location_id'] == poisoned:
+            raise ValueError('poisoned entry')
+        return apply_entry(entry, *args)
+    monkeypatch.setattr(visit_journal, '_apply_entry', failing)
+
+    with journal_app.app_context():
+        apply_batch(journal, journal.pending())
+
+    assert journal.pending_count() == 0
+    assert visit_and_aggregates(journal_app, first)[0] == 4
+    assert visit_and_aggregates(journal_app, last)[0] == 4
+    assert visit_and_aggregates(journal_app, poisoned)[0] is None
+    errors = dict(journal._connection().execute('SELECT location_id, error FROM journal'))
+    assert errors == {first: None, poisoned: 'poisoned entry', last: None}
+
+
+def test_delete_applies_only_that_visits_pending_updates(journal_app, journal, journal_client):
+    from models import Visit
+
+    with journal_app.app_context():
+        visit = Visit.query.filter_by(user_id=1).order_by(Visit.id).first()
+        visit_id, location_id = visit.id, visit.location_id
+    other_location = unvisited_location(journal_app)
+    old_rating, count, total, visits = visit_and_aggregates(journal_app, location_id)
+    journal_client.post('/api/visits/', json={'location_id': location_id, 'rating': 1})
+    journal.append(2, other_location, 5, '', True)  # someone else's backlog
+
+    response = journal_client.delete(f'/api/visits/{visit_id}')
+
+    assert response.status_code == 200
+    # The queued update (old rating -> 1) was applied first, then the delete took the 1 back out
+    assert visit_and_aggregates(journal_app, location_id) == (None, count - 1, total - old_rating, visits - 1)
+    assert [entry['user_id'] for entry in journal.pending()] == [2]
+
+
+def test_stale_update_after_delete_does_not_resurrect_the_visit(journal_app, journal, journal_client):
+    from models import Visit
+
+    with journal_app.app_context():
+        visit = Visit.query.filter_by(user_id=1).order_by(Visit.id).first()
+        visit_id, location_id = visit.id, visit.location_id
+    journal_client.delete(f'/api/visits/{visit_id}')
+    after_delete = visit_and_aggregates(journal_app, location_id)
+    # An update of the notes only, validated against the visit before it was deleted
+    journal.append(1, location_id, None, 'too late', True)
+
+    get_applier(journal_app).drain()
+
+    assert journal.pending_count() == 0
+    assert visit_and_aggregates(journal_app, location_id) == after_delete
@@ -0,0 +1,107 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from services.visit_journal import get_applier
+from tests.conftest import login
+
+
+def add_visits(app, count, user_id=1, ties=3):
+    """Add count visits to locations the user hasn't visited, every `ties` of them on the same date"""
+    from models import db, Location, Visit
+
+    with app.app_context():
+        visited = {visit.location_id for visit in Visit.query.filter_by(user_id=user_id)}
+        locations = [location for location in Location.query.order_by(Location.id) if location.id not in visited]
+        assert len(locations) >= count
+        start = datetime(2020, 1, 1)
+        for i, location in enumerate(locations[:count]):
+            db.session.add(Visit(user_id=user_id, location_id=location.id, rating=i % 5 + 1,
+                                 visit_date=start + timedelta(days=i // ties)))
+        db.session.commit()
+
+
+def all_pages(client, query=''):
+    """Visits of every page, following next_cursor, and the page sizes"""
+    visits, sizes = [], []
+    cursor = None
+    while True:
+        url = f'/api/visits/?{query}' + (f'&cursor={cursor}' if cursor else '')
+        page = client.get(url).get_json()
+        visits.extend(page['visits'])
+        sizes.append(len(page['visits']))
+        cursor = page['next_cursor']
+        if cursor is None:
+            return visits, sizes
+
+
+@pytest.fixture
+def visits_client(make_app):
+    app = make_app()
+    add_visits(app, 40)
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = login(client)['Authorization']
+    return client
+
+
+def newest_first(visits):
+    return sorted(visits, key=lambda visit: (visit['visit_date'], visit['id']), reverse=True)
+
+
+def test_pages_cover_every_visit_once_in_order(visits_client):
+    everything = visits_client.get('/api/visits/').get_json()
+
+    visits, sizes = all_pages(visits_client, 'limit=7')
+
+    assert everything['next_cursor'] is None
+    assert [visit['id'] for visit in visits] == [visit['id'] for visit in everything['visits']]
+    assert visits == newest_first(visits)
+    assert len({visit['id'] for visit in visits}) == len(visits)
+    assert all(size == 7 for size in sizes[:-1]) and 1 <= sizes[-1] <= 7
+
+
+def test_filters_apply_to_every_page(visits_client):
+    everything = visits_client.get('/api/visits/?min_rating=4&from=2020-01-03&to=2020-01-10').get_json()['visits']
+
+    visits, _ = all_pages(visits_client, 'min_rating=4&from=2020-01-03&to=2020-01-10&limit=2')
+
+    assert visits == everything
+    assert visits
+    assert all(visit['rating'] >= 4 for visit in visits)
+    # A date-only `to` includes that day
+    assert {visit['visit_date'][:10] for visit in visits} <= {f'2020-01-{day:02d}' for day in range(3, 11)}
+    assert any(visit['visit_date'].startswith('2020-01-10') for visit in visits)
+
+
+def test_type_filter(visits_client):
+    visits = visits_client.get('/api/visits/?type=nightlife').get_json()['visits']
+
+    assert visits
+    assert {visit['location']['type'] for visit in visits} == {'nightlife'}
+
+
+@pytest.mark.parametrize('query', ['cursor=not-a-cursor', 'limit=0', 'limit=100000', 'limit=ten',
+                                   'min_rating=x', 'from=yesterday'])
+def test_bad_arguments(visits_client, query):
+    assert visits_client.get(f'/api/visits/?{query}').status_code == 400
+
+
+def test_pending_upserts_stay_off_pages(make_app):
+    app = make_app(VISIT_WRITE_BEHIND=True)
+    get_applier(app).pid = os.getpid()  # no applier thread, the upsert stays pending
+    add_visits(app, 10)
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = login(client)['Authorization']
+    stored = client.get('/api/visits/').get_json()['visits']
+    location_id = next(location['id'] for location in client.get('/api/locations/').get_json()['locations']
+                       if location['id'] not in {visit['location_id'] for visit in stored})
+    assert client.post('/api/visits/', json={'location_id': location_id, 'rating': 5}).status_code == 202
+
+    everything = client.get('/api/visits/').get_json()['visits']
+    visits, sizes = all_pages(client, 'limit=5')
+
+    assert len(everything) == len(stored) + 1
+    assert any(visit.get('pending') for visit in everything)
+    assert max(sizes) == 5
+    assert [visit['id'] for visit in visits] == [visit['id'] for visit in stored]
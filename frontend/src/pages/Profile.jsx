@@ -1,12 +1,13 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { getUser } from '../services/auth';
-import { getUserVisits } from '../services/api';
+import { exportVisits, getUserVisits, getVisitStats } from '../services/api';
 import Navbar from '../components/Navbar';
 
 const Profile = () => {
   const [user, setUser] = useState(null);
   const [visits, setVisits] = useState([]);
+  const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const navigate = useNavigate();
@@ -36,9 +37,13 @@ const Profile = () => {
           }
         }
         
-        // Fetch user visits
-        const visitsData = await getUserVisits();
+        // Stats come precomputed; only the five latest visits are listed
+        const [visitsData, statsData] = await Promise.all([
+          getUserVisits({ limit: 5 }),
+          getVisitStats()
+        ]);
         console.log('Visits data:', visitsData);
+        setStats(statsData);
         
         if (visitsData && visitsData.visits) {
           setVisits(visitsData.visits);
@@ -62,6 +67,21 @@ const Profile = () => {
     fetchUserData();
   }, [navigate]);
   
+  const handleExport = async (format) => {
+    try {
+      const blob = await exportVisits(format);
+      const url = URL.createObjectURL(blob);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = `chillquest-visits.${format}`;
+      link.click();
+      URL.revokeObjectURL(url);
+    } catch (err) {
+      console.error('Failed to export visits:', err);
+      setError('Failed to export your visits. Please try again.');
+    }
+  };
+  
   if (loading) {
     return (
       <div>
@@ -92,15 +112,11 @@ const Profile = () => {
     );
   }
   
-  // Get unique countries from visits
-  const countries = [...new Set(
-    visits
-      .filter(visit => visit.location && visit.location.country) // Only include visits with location data
-      .map(visit => visit.location.country)
-  )];
+  const visitCount = stats ? stats.visit_count : visits.length;
+  const countryCount = stats ? stats.countries_visited : 0;
   
-  // Get highly rated visits (4-5 stars)
-  const highlyRated = visits.filter(visit => visit.rating >= 4);
+  // Highly rated visits (4-5 stars)
+  const highlyRated = stats ? stats.visits_by_rating['4'] + stats.visits_by_rating['5'] : 0;
   
   return (
     <div>
@@ -134,21 +150,39 @@ const Profile = () => {
         </div>
         
         <div className="bg-white shadow-md rounded-lg p-6">
-          <h2 className="text-2xl font-bold mb-4">Your Travel Stats</h2>
+          <div className="flex justify-between items-center mb-4">
+            <h2 className="text-2xl font-bold">Your Travel Stats</h2>
+            {visitCount > 0 && (
+              <div className="space-x-2">
+                <button
+                  className="bg-gray-200 hover:bg-gray-300 text-gray-800 px-3 py-1 rounded"
+                  onClick={() => handleExport('csv')}
+                >
+                  Export CSV
+                </button>
+                <button
+                  className="bg-gray-200 hover:bg-gray-300 text-gray-800 px-3 py-1 rounded"
+                  onClick={() => handleExport('geojson')}
+                >
+                  Export GeoJSON
+                </button>
+              </div>
+            )}
+          </div>
           
           <div className="grid grid-cols-1 md:grid-cols-3 gap-4 mb-6">
             <div className="bg-blue-100 p-4 rounded-lg text-center">
-              <p className="text-4xl font-bold text-blue-600">{visits.length}</p>
+              <p className="text-4xl font-bold text-blue-600">{visitCount}</p>
               <p className="text-gray-700">Places Visited</p>
             </div>
             
             <div className="bg-green-100 p-4 rounded-lg text-center">
-              <p className="text-4xl font-bold text-green-600">{countries.length}</p>
+              <p className="text-4xl font-bold text-green-600">{countryCount}</p>
               <p className="text-gray-700">Countries</p>
             </div>
             
             <div className="bg-purple-100 p-4 rounded-lg text-center">
-              <p className="text-4xl font-bold text-purple-600">{highlyRated.length}</p>
+              <p className="text-4xl font-bold text-purple-600">{highlyRated}</p>
               <p className="text-gray-700">Highly Rated (4-5★)</p>
             </div>
           </div>
@@ -159,8 +193,6 @@ const Profile = () => {
               <ul className="divide-y divide-gray-200">
                 {visits
                   .filter(visit => visit.location) // Only include visits with location data
-                  .sort((a, b) => new Date(b.visit_date) - new Date(a.visit_date))
-                  .slice(0, 5)
                   .map(visit => (
                     <li key={visit.id} className="py-3">
                       <div className="flex justify-between">
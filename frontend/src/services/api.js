@@ -49,10 +49,10 @@ export const getAllLocations = async () => {
 };
 
 // Visits
-export const getUserVisits = async () => {
+export const getUserVisits = async (params = {}) => {
   try {
-    // Let the interceptor handle the token
-    const response = await api.get('/visits/');
+    // Let the interceptor handle the token; pass { limit, cursor } to page
+    const response = await api.get('/visits/', { params });
     return response.data;
   } catch (error) {
     console.error('Error fetching user visits:', error);
@@ -60,6 +60,16 @@ export const getUserVisits = async () => {
   }
 };
 
+export const getVisitStats = async () => {
+  try {
+    const response = await api.get('/visits/stats');
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching visit stats:', error);
+    throw error;
+  }
+};
+
 export const addVisit = async (locationId, rating = null, notes = '') => {
   try {
     // Ensure we're passing exactly what the backend expects
@@ -92,6 +102,17 @@ export const deleteVisit = async (visitId) => {
   }
 };
 
+export const exportVisits = async (format = 'csv') => {
+  try {
+    // The body is streamed by the server; axios hands it over as one Blob to save
+    const response = await api.get('/visits/export', { params: { format }, responseType: 'blob' });
+    return response.data;
+  } catch (error) {
+    console.error(`Error exporting visits as ${format}:`, error);
+    throw error;
+  }
+};
+
 // Recommendations
 export const getRecommendations = async () => {
   try {
@@ -103,9 +124,9 @@ export const getRecommendations = async () => {
   }
 };
 
-export const getPersonalizedRecommendations = async (usePersonalization = true) => {
+export const getPersonalizedRecommendations = async (usePersonalization = true, mode = 'content') => {
   try {
-    const response = await api.get(`/recommendations/personalized?personalized=${usePersonalization}`);
+    const response = await api.get(`/recommendations/personalized?personalized=${usePersonalization}&mode=${mode}`);
     return response.data;
   } catch (error) {
     console.error('Error fetching personalized recommendations:', error);